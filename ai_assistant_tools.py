@@ -4,10 +4,15 @@ from langchain.chat_models import ChatOpenAI
 from langchain.tools import Tool, tool
 from typing import Optional, Type, List
 from pydantic import BaseModel, Field
-from netmiko import ConnectHandler
+import atexit
+
+from device_pool import DevicePool, result_text, run_on_devices
 
 llm = ChatOpenAI(temperature=0)
 
+pool = DevicePool()
+atexit.register(pool.close)
+
 
 class ConfigCommandsInput(BaseModel):
     hostname: str = Field(..., description="The hostname as a FQDN or IP Address.")
@@ -19,19 +24,8 @@ class ConfigCommandsInput(BaseModel):
 @tool
 def config_commands(hostname: str, username: str, password: str, commands, port: int=22) -> str:
     """Tool to ssh into a remote host and execute commands."""
-    net_connect = ConnectHandler(device_type='cisco_ios', host=hostname, username=username, password=password, port=port)
-    output = ''
-    try:
-        for command in commands:
-            output += net_connect.send_command_timing(
-                command, strip_prompt=False, strip_command=False, delay_factor=4
-                )
-    except Exception as e:
-        output += e
-    finally:
-        net_connect.disconnect()
-
-    return output
+    result = run_on_devices([hostname], commands, username, password, port=port, pool=pool)[0]
+    return result_text(result)
 
 # agent = initialize_agent([config_commands], llm, agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION, verbose=True)
 
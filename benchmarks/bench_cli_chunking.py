@@ -0,0 +1,134 @@
+"""Compare prompt size and latency of the ways redhat_one_demo builds the context of a question.
+
+For each question, runs the chain three ways: the old RecursiveCharacterTextSplitter()
+with the default retriever (k=4), CliOutputSplitter plus the metadata filter for the
+devices the question names, and the parsed fact sheet (context: facts). Reports
+the prompt tokens sent to the LLM and the end-to-end latency. Hash-based embeddings and
+an LLM whose latency grows with the prompt (--prefill-rate tokens/s) stand in for the
+real backends.
+
+    python benchmarks/bench_cli_chunking.py
+    python benchmarks/bench_cli_chunking.py --fleet-devices 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain.chains import create_retrieval_chain  # noqa: E402
+from langchain.chains.combine_documents import create_stuff_documents_chain  # noqa: E402
+from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
+from langchain_community.document_loaders import TextLoader  # noqa: E402
+from langchain_community.vectorstores import FAISS  # noqa: E402
+from langchain_core.output_parsers import StrOutputParser  # noqa: E402
+from langchain_core.prompts import ChatPromptTemplate  # noqa: E402
+
+from fakes import HashEmbeddings, PrefillLLM, count_tokens, synthesize_fleet_output  # noqa: E402
+from module_utils.cli_chunker import devices_in_prompt, metadata_filter  # noqa: E402
+from module_utils.cli_splitter import CliOutputSplitter  # noqa: E402
+from module_utils.ios_facts import check_facts, collect_facts, fact_sheet  # noqa: E402
+
+DEMO_QUESTIONS = [
+    'Why is R1 not advertising 1.1.1.0/24 to R2?',
+    'Is OSPF enabled on the loopback of R1?',
+    'Which routes does R2 learn from OSPF?',
+    'Compare the OSPF network statements of R1 and R2.',
+]
+
+PROMPT = ChatPromptTemplate.from_template('''
+{system_message}
+
+Your task is to utilize the information provided below to answer the question.
+If the context does not contain enough information to formulate a conclusive
+answer, your response should be "I don't know".
+
+<context>
+{context}
+</context>
+
+Question: {input}
+''')
+
+
+class RecordingLLM(PrefillLLM):
+    prompt_tokens: list = []
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prompt_tokens.append(count_tokens(prompt))
+        return super(RecordingLLM, self)._call(prompt, stop, run_manager, **kwargs)
+
+
+def run(name, documents, questions, embeddings, prefill_rate, filtered):
+    vector = FAISS.from_documents(documents, embeddings)
+    llm = RecordingLLM(prefill_rate=prefill_rate, prompt_tokens=[])
+    document_chain = create_stuff_documents_chain(llm, PROMPT)
+    latencies = []
+    for question in questions:
+        search_kwargs = {}
+        search_filter = metadata_filter(vector, question) if filtered else None
+        if search_filter:
+            search_kwargs.update(filter=search_filter, fetch_k=vector.index.ntotal)
+        chain = create_retrieval_chain(vector.as_retriever(search_kwargs=search_kwargs), document_chain)
+        started = time.perf_counter()
+        chain.invoke({'input': question, 'system_message': ''})
+        latencies.append(time.perf_counter() - started)
+    return dict(name=name, chunks=vector.index.ntotal, tokens=statistics.mean(llm.prompt_tokens),
+                latency=statistics.mean(latencies) * 1000)
+
+
+def run_facts(path, questions, prefill_rate):
+    llm = RecordingLLM(prefill_rate=prefill_rate, prompt_tokens=[])
+    chain = PROMPT | llm | StrOutputParser()
+    latencies = []
+    for question in questions:
+        started = time.perf_counter()
+        with open(path) as f:
+            devices = collect_facts(f)
+        context = fact_sheet(devices, check_facts(devices), devices_in_prompt(devices, question))
+        chain.invoke({'context': context, 'input': question, 'system_message': ''})
+        latencies.append(time.perf_counter() - started)
+    return dict(name='facts', chunks=0, tokens=statistics.mean(llm.prompt_tokens),
+                latency=statistics.mean(latencies) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--document', default=os.path.join(ROOT, 'commands_output.txt'))
+    parser.add_argument('--fleet-devices', type=int, default=0,
+                        help='Benchmark a synthetic fleet output of this many devices instead of --document.')
+    parser.add_argument('--prefill-rate', type=float, default=2000.0, help='Prompt tokens per second of the fake LLM.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, questions = args.document, DEMO_QUESTIONS
+        if args.fleet_devices:
+            path = os.path.join(tmp, 'fleet_output.txt')
+            synthesize_fleet_output(path, devices=args.fleet_devices)
+            hosts = ['store%04d-sw%d' % (device // 2, device % 2 + 1) for device in range(0, args.fleet_devices, 7)]
+            questions = ['Which OSPF routes does %s have?' % host for host in hosts[:8]]
+        docs = TextLoader(path).load()
+        embeddings = HashEmbeddings()
+        results = [
+            run('recursive k=4', RecursiveCharacterTextSplitter().split_documents(docs), questions, embeddings,
+                args.prefill_rate, filtered=False),
+            run('cli + filter', CliOutputSplitter().split_documents(docs), questions, embeddings,
+                args.prefill_rate, filtered=True),
+            run_facts(path, questions, args.prefill_rate),
+        ]
+
+    for result in results:
+        print('%(name)-14s %(chunks)6d chunks  %(tokens)8.0f prompt tokens  %(latency)8.1f ms' % result)
+    old = results[0]
+    for new in results[1:]:
+        print('%-14s prompt tokens -%.0f%%, latency -%.0f%%' % (new['name'], 100 * (1 - new['tokens'] / old['tokens']),
+                                                                100 * (1 - new['latency'] / old['latency'])))
+
+
+if __name__ == '__main__':
+    main()
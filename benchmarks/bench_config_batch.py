@@ -0,0 +1,116 @@
+"""Compare the time to push a VLAN change: per-line timing reads vs one prompt-driven batch.
+
+Against one ios_ssh_standin.py switch answering each line after --latency seconds, the
+same --lines line change (VLANs with names, plus one invalid line) is pushed over an
+open session with device_pool.send_commands, which reads for a fixed window after
+every line, and with send_config_batch, which writes all lines at once and reads
+until each has been answered by a prompt. Both must leave the same VLANs behind and
+the batch must report the invalid line.
+
+    python benchmarks/bench_config_batch.py --lines 20 --latency 0 0.05 0.2
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from netmiko import ConnectHandler  # noqa: E402
+
+from device_pool import send_commands, send_config_batch  # noqa: E402
+from ios_ssh_standin import PASSWORD, USERNAME, IosStandIn  # noqa: E402
+
+INVALID = 'vlan name AIBot'
+
+# (commands, rejected line numbers, VLANs that must exist afterwards, VLANs that must not)
+CHECKS = [
+    (['write memory'], [], [], []),
+    (['show vlan brief'], [], [], []),
+    (['configure terminal', 'no vlan 901', 'end', 'write memory'], [], [], [901]),
+    (['vlan 950', 'name AIBot-950', 'sh vlan brief', 'sho run', 'end', 'wr'], [], [950], []),
+    (['configure terminal', 'vlan 951', 'exit', 'configure terminal', 'no vlan 950'], [], [951], [950]),
+    (['end', 'no vlan 951', INVALID, 'sh vlan brief'], [3], [], [951]),
+]
+
+
+def change_set(lines):
+    commands = []
+    for vlan in range(100, 100 + lines // 2):
+        commands.extend(['vlan %d' % vlan, 'name AIBot-%d' % vlan])
+    commands.insert(len(commands) // 2, INVALID)
+    return commands
+
+
+def check(standin, port):
+    """Run the CHECKS command lists on one switch; exits with FAIL on the first mismatch."""
+    switch = standin.switches[standin.addresses[0]]
+    connection = ConnectHandler(device_type='cisco_ios', host=standin.addresses[0], username=USERNAME,
+                                password=PASSWORD, port=port)
+    try:
+        for commands, rejected, present, absent in CHECKS:
+            result = send_config_batch(connection, commands)
+            lines = [error['line'] for error in result['errors']]
+            if lines != rejected:
+                sys.exit('FAIL: %r rejected lines %r, expected %r' % (commands, result['errors'], rejected))
+            if any(vlan not in switch.vlans for vlan in present) or any(vlan in switch.vlans for vlan in absent):
+                sys.exit('FAIL: %r left VLANs %r' % (commands, sorted(switch.vlans)))
+            if connection.check_config_mode():
+                sys.exit('FAIL: %r left the session in configuration mode' % (commands,))
+    finally:
+        connection.disconnect()
+    print('%d command lists checked' % len(CHECKS))
+
+
+def measure(standin, commands, latency, port):
+    switch = standin.switches[standin.addresses[0]]
+    # A session takes the stand-in's latency when it opens
+    standin.latency = latency
+    connection = ConnectHandler(device_type='cisco_ios', host=standin.addresses[0], username=USERNAME,
+                                password=PASSWORD, port=port)
+    try:
+        timings = {}
+        vlans = {}
+        for name, run, sent in (('timing', send_commands, ['configure terminal'] + commands + ['end']),
+                                ('batch', send_config_batch, commands)):
+            with switch.lock:
+                switch.vlans = dict((vlan, name) for vlan, name in switch.vlans.items() if vlan < 100)
+            started = time.monotonic()
+            result = run(connection, sent)
+            timings[name] = time.monotonic() - started
+            vlans[name] = dict(switch.vlans)
+            if name == 'batch' and [error['command'] for error in result['errors']] != [INVALID]:
+                sys.exit('FAIL: the batch reported %r, expected the line %r' % (result['errors'], INVALID))
+        if vlans['timing'] != vlans['batch']:
+            sys.exit('FAIL: the two modes left different VLANs behind')
+        return timings
+    finally:
+        standin.latency = 0.0
+        connection.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--latency', type=float, nargs='+', default=[0.0, 0.05, 0.2],
+                        help='Seconds the switch takes to answer each line; one run per value.')
+    parser.add_argument('--port', type=int, default=2222)
+    args = parser.parse_args()
+
+    commands = change_set(args.lines)
+    standin = IosStandIn(1, args.port).start()
+    try:
+        check(standin, args.port)
+        print('%d-line change set' % len(commands))
+        for latency in args.latency:
+            timings = measure(standin, commands, latency, args.port)
+            print('latency %5.3fs  timing %7.2fs  batch %6.2fs  x%.1f'
+                  % (latency, timings['timing'], timings['batch'], timings['timing'] / timings['batch']))
+    finally:
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare config_commands across a fleet: one host at a time vs device_pool.run_on_devices.
+
+Starts ios_ssh_standin.py with --hosts switches whose logins take --login-delay seconds
+and runs the same commands on all of them three ways: serially with a fresh
+ConnectHandler per host (what config_commands did), fanned out over --workers threads
+with an empty pool, and again with the sessions the previous run left in the pool.
+
+    python benchmarks/bench_device_pool.py --hosts 50 --workers 16 --login-delay 0.5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from netmiko import ConnectHandler  # noqa: E402
+
+from device_pool import DevicePool, run_on_devices, send_commands  # noqa: E402
+from ios_ssh_standin import PASSWORD, USERNAME, IosStandIn  # noqa: E402
+
+
+def serial(hosts, commands, port):
+    """config_commands before the pool: connect, run, disconnect, next host."""
+    times = []
+    for host in hosts:
+        started = time.monotonic()
+        connection = ConnectHandler(device_type='cisco_ios', host=host, username=USERNAME, password=PASSWORD,
+                                    port=port)
+        try:
+            send_commands(connection, commands)
+        finally:
+            connection.disconnect()
+        times.append(time.monotonic() - started)
+    return times
+
+
+def report(name, wall, times, failed=0):
+    print('%-12s wall %7.2fs  per host: mean %5.2fs  p50 %5.2fs  max %5.2fs  failed %d'
+          % (name, wall, statistics.mean(times), statistics.median(times), max(times), failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--login-delay', type=float, default=0.5, help='Seconds a stand-in login takes.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before a stand-in command is answered.')
+    parser.add_argument('--skip-serial', action='store_true', help='Only run the pooled fan-out.')
+    args = parser.parse_args()
+
+    commands = ['show vlan brief']
+    standin = IosStandIn(args.hosts, args.port, login_delay=args.login_delay, latency=args.latency).start()
+    pool = DevicePool()
+    try:
+        print('%d hosts, %d workers, login %.2fs, command latency %.2fs'
+              % (args.hosts, args.workers, args.login_delay, args.latency))
+        if not args.skip_serial:
+            started = time.monotonic()
+            times = serial(standin.addresses, commands, args.port)
+            report('serial', time.monotonic() - started, times)
+        for name in ('pool-cold', 'pool-warm'):
+            started = time.monotonic()
+            results = run_on_devices(standin.addresses, commands, USERNAME, PASSWORD, port=args.port,
+                                     workers=args.workers, pool=pool)
+            report(name, time.monotonic() - started, [r['connect_time'] + r['run_time'] for r in results],
+                   sum(1 for r in results if not r['ok']))
+        print('pool: %(connects)d logins, %(reuses)d reused sessions' % pool.stats)
+    finally:
+        pool.close()
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Check the import time of the library/ modules' code paths against a budget.
+
+Each scenario is run in a fresh interpreter with `python -X importtime`; its import time
+is the sum of the top-level imports it triggers beyond interpreter startup. The best of
+--repeat runs is compared with BUDGETS_MS (times --scale, for slower machines) and,
+with --baseline, with a previously saved run plus --tolerance. Exits non-zero on a
+regression.
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --save baseline.json
+    python benchmarks/bench_import_time.py --baseline baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SCENARIOS = dict(
+    # What an Ansible module imports before it knows whether the gateway answers
+    module='import ansible.module_utils.basic; import module_utils.gateway_client',
+    # No gateway: the task code, before it picks a backend
+    tasks='import module_utils.llm_tasks',
+    # llm_ollama / llm_openai: what the provider's factories and the chain import
+    ollama='import module_utils.llm_tasks; import langchain_core.prompts, langchain_core.output_parsers; '
+           'import langchain_community.llms',
+    openai='import module_utils.llm_tasks; import langchain_core.prompts, langchain_core.output_parsers; '
+           'import langchain_openai',
+    # redhat_one_demo with Ollama and a cached index: no loader or splitter
+    document_hit='import module_utils.llm_tasks, module_utils.embedding_cache; '
+                 'import langchain_core.prompts, langchain_core.output_parsers; '
+                 'import langchain_community.llms, langchain_community.embeddings; '
+                 'import langchain_community.vectorstores, langchain.chains, langchain.chains.combine_documents',
+    # What redhat_one_demo imported at the top before imports were deferred; reported, not budgeted
+    eager_reference='import langchain_community.llms, langchain_community.embeddings, langchain_openai, '
+                    'langchain_core.prompts, langchain.text_splitter, langchain.chains, '
+                    'langchain.chains.combine_documents, langchain_community.vectorstores, '
+                    'langchain_community.document_loaders',
+)
+
+BUDGETS_MS = dict(module=250, tasks=100, ollama=1500, openai=3500, document_hit=2000)
+
+
+def import_ms(code, startup):
+    """Milliseconds spent importing the top-level modules `code` imports beyond `startup`."""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            env=dict(os.environ, PYTHONPATH=os.pathsep.join(
+                                filter(None, [ROOT, os.environ.get('PYTHONPATH')])))).stderr.decode()
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not name.startswith(' ' * 2) and name.strip() not in startup:
+            total += int(cumulative_us)
+    return total / 1000.0
+
+
+def startup_modules():
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'pass'], check=True,
+                            stderr=subprocess.PIPE).stderr.decode()
+    return set(line.split('|')[2].strip() for line in output.splitlines()
+               if line.startswith('import time:') and 'cumulative' not in line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply the budgets, e.g. 2 on a slow CI runner.')
+    parser.add_argument('--baseline', help='JSON of a previous --save to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed growth over --baseline.')
+    parser.add_argument('--save', help='Write the results to this JSON file.')
+    args = parser.parse_args()
+
+    startup = startup_modules()
+    results = dict((name, min(import_ms(code, startup) for _ in range(args.repeat)))
+                   for name, code in SCENARIOS.items())
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = []
+    for name, ms in results.items():
+        limits = []
+        if name in BUDGETS_MS:
+            limits.append(BUDGETS_MS[name] * args.scale)
+        if name in baseline and name in BUDGETS_MS:
+            limits.append(baseline[name] * (1 + args.tolerance))
+        limit = min(limits) if limits else None
+        status = '' if limit is None else 'ok' if ms <= limit else 'OVER'
+        print('%-16s %8.1f ms  %s' % (name, ms, '' if limit is None else 'limit %8.1f ms  %s' % (limit, status)))
+        if status == 'OVER':
+            failures.append(name)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if failures:
+        sys.exit('FAIL: import time regressed in %s' % ', '.join(failures))
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
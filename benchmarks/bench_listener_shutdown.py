@@ -0,0 +1,107 @@
+"""Check that stopping syslog_listener.py journals the events it could not forward.
+
+Starts the listener with --overflow-policy spill and a webhook that refuses connections,
+sends one CONFIG_I line from each of --devices devices (one burst, so one event, per
+device), and stops it with --signal while half of the bursts are still open and the
+forwarder is retrying the other half. Every event must then be pending in the workers' journals, and the
+listener's output must show no task that was destroyed while pending. Reports how
+long the shutdown took.
+
+    python benchmarks/bench_listener_shutdown.py --devices 20 --workers 2 --signal TERM
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, ROOT)
+
+from bench_syslog_e2e import listener_sockets  # noqa: E402
+from event_journal import EventJournal  # noqa: E402
+from syslog_loadgen import CONFIG_TEMPLATE, device_address, device_hostname  # noqa: E402
+
+# Lines in the listener's output that mean its shutdown was cut short
+FAILURES = ('Task was destroyed', 'Event loop is closed', 'Traceback', 'ignored GeneratorExit')
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def send_config_lines(port, devices):
+    for device in devices:
+        line = CONFIG_TEMPLATE.format(seq=device, hostname=device_hostname(device),
+                                      timestamp=time.strftime('%b %e %H:%M:%S.000'))
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+            sender.bind((device_address(device), 0))
+            sender.sendto(line.encode('utf-8'), ('127.0.0.1', port))
+
+
+def journal_pending(journal_dir):
+    pending = 0
+    for name in sorted(os.listdir(journal_dir)) if os.path.isdir(journal_dir) else []:
+        journal = EventJournal(os.path.join(journal_dir, name))
+        pending += journal.pending
+        journal.close()
+    return pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5524)
+    parser.add_argument('--signal', choices=('INT', 'TERM'), default='TERM')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal_dir = os.path.join(tmp, 'journal')
+        # Nothing listens there, so every post is refused and retried
+        command = [sys.executable, os.path.join(ROOT, 'syslog_listener.py'), '--listen-ip', '127.0.0.1',
+                   '--listen-port', str(args.port), '--workers', str(args.workers), '--forward',
+                   '--webhook-url', 'http://127.0.0.1:%d/endpoint' % free_port(), '--overflow-policy', 'spill',
+                   '--journal-dir', journal_dir, '--quiet-period', '0.5', '--max-wait', '60', '--state-cache', '',
+                   '--metrics-port', '0']
+        listener = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    universal_newlines=True)
+        try:
+            deadline = time.time() + 30
+            while listener_sockets(args.port)[0] < args.workers:
+                if time.time() > deadline or listener.poll() is not None:
+                    sys.exit('FAIL: the listener did not start')
+                time.sleep(0.1)
+            # The first half of the bursts are emitted and being retried by the forwarder when
+            # the signal comes, the second half are still open in the coalescer
+            half = args.devices // 2
+            send_config_lines(args.port, range(half))
+            time.sleep(1.0)
+            send_config_lines(args.port, range(half, args.devices))
+            time.sleep(0.1)
+            started = time.monotonic()
+            listener.send_signal(getattr(signal, 'SIG' + args.signal))
+            output, _ = listener.communicate(timeout=60)
+            elapsed = time.monotonic() - started
+        finally:
+            if listener.poll() is None:
+                listener.kill()
+        failures = [line for line in output.splitlines() if any(failure in line for failure in FAILURES)]
+        if failures:
+            sys.exit('FAIL: the shutdown was cut short:\n' + '\n'.join(failures))
+        pending = journal_pending(journal_dir)
+        if pending != args.devices:
+            sys.exit('FAIL: %d events pending in the journal after SIG%s, expected %d'
+                     % (pending, args.signal, args.devices))
+    print('SIG%s: %d of %d events journaled, listener exited %d after %.1fs'
+          % (args.signal, pending, args.devices, listener.returncode, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Compare llm_ollama task times across a fleet with and without llm_gateway.py.
+
+Runs a one-task playbook against --hosts local hosts with --forks forks twice: once with
+the module doing the work itself (gateway: false) and once answered by a running
+gateway. A fake Ollama server (fake_llm_server.py) answers the prompts after --latency
+seconds, so what differs is the cost of starting Python and importing LangChain per
+task. Per-host task times come from Ansible's junit callback.
+
+    python benchmarks/bench_llm_gateway.py --hosts 50 --forks 50
+"""
+import argparse
+import glob
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ElementTree
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+
+PLAYBOOK = '''
+- hosts: fleet
+  gather_facts: false
+  tasks:
+    - name: VLAN Configuration Assistant
+      llm_ollama:
+        model: llama2
+        temperature: 0.3
+        system_message: As an expert network architect, you're here to guide engineers through intricate design challenges and effectively resolve issues.
+        prompt: Could you provide the commands for configuring VLAN 99 named 'Management' and assigning port fa0/5 to this VLAN, without any explanations?
+        gateway: "{{ use_gateway | bool }}"
+        gateway_socket: "{{ gateway_socket }}"
+'''
+
+
+def wait_for(check, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if check():
+            return
+        time.sleep(0.1)
+    sys.exit('FAIL: timed out waiting for a helper process to start')
+
+
+def port_open(port):
+    with socket.socket() as sock:
+        return sock.connect_ex(('127.0.0.1', port)) == 0
+
+
+def run_playbook(tmp, use_gateway, socket_path, forks):
+    junit_dir = os.path.join(tmp, 'junit-%s' % use_gateway)
+    env = dict(os.environ, ANSIBLE_LIBRARY=os.path.join(ROOT, 'library'),
+               ANSIBLE_MODULE_UTILS=os.path.join(ROOT, 'module_utils'), ANSIBLE_CALLBACKS_ENABLED='junit',
+               JUNIT_OUTPUT_DIR=junit_dir, ANSIBLE_FORKS=str(forks), ANSIBLE_STDOUT_CALLBACK='minimal')
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    subprocess.run(['ansible-playbook', '-i', os.path.join(tmp, 'inventory.ini'), os.path.join(tmp, 'playbook.yml'),
+                    '-e', 'use_gateway=%s gateway_socket=%s' % (use_gateway, socket_path)],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    times = [float(case.get('time')) for report in glob.glob(os.path.join(junit_dir, '*.xml'))
+             for case in ElementTree.parse(report).iter('testcase')]
+    return dict(mode='gateway' if use_gateway else 'in-process', wall=wall, cpu=after.ru_utime + after.ru_stime -
+                before.ru_utime - before.ru_stime, mean=statistics.mean(times), p50=statistics.median(times),
+                max=max(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=50)
+    parser.add_argument('--forks', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds the fake Ollama takes per prompt.')
+    parser.add_argument('--ollama-port', type=int, default=11434,
+                        help='langchain_community.llms.Ollama only talks to localhost:11434 by default.')
+    args = parser.parse_args()
+
+    if port_open(args.ollama_port):
+        sys.exit('Port %d is taken; stop the local Ollama before benchmarking' % args.ollama_port)
+    helpers = []
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'inventory.ini'), 'w') as f:
+            f.write('[fleet]\n')
+            for i in range(args.hosts):
+                f.write('store%03d ansible_connection=local ansible_python_interpreter=%s\n' % (i, sys.executable))
+        with open(os.path.join(tmp, 'playbook.yml'), 'w') as f:
+            f.write(PLAYBOOK)
+        socket_path = os.path.join(tmp, 'gateway.sock')
+        try:
+            helpers.append(subprocess.Popen([sys.executable, os.path.join(HERE, 'fake_llm_server.py'), '--port',
+                                             str(args.ollama_port), '--latency', str(args.latency)],
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            wait_for(lambda: port_open(args.ollama_port))
+            results = [run_playbook(tmp, False, socket_path, args.forks)]
+            helpers.append(subprocess.Popen([sys.executable, os.path.join(ROOT, 'llm_gateway.py'), '--socket',
+                                             socket_path], cwd=ROOT, stdout=subprocess.DEVNULL))
+            wait_for(lambda: os.path.exists(socket_path))
+            results.append(run_playbook(tmp, True, socket_path, args.forks))
+        finally:
+            for helper in helpers:
+                helper.terminate()
+                helper.wait()
+
+    print('%d hosts, %d forks, fake LLM latency %.2fs' % (args.hosts, args.forks, args.latency))
+    for result in results:
+        print('%(mode)-10s play %(wall)6.2fs  cpu %(cpu)6.2fs  task per host: mean %(mean)5.2fs '
+              'p50 %(p50)5.2fs  max %(max)5.2fs' % result)
+    print('per-host task time -%.0f%%' % (100 * (1 - results[1]['mean'] / results[0]['mean'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Check that redhat_one_demo's streaming index build keeps peak memory bounded.
+
+Builds a FAISS index for a synthetic fleet CLI output file twice, each in a fresh
+process: the old way (read the whole file, split it into a list, embed everything at
+once) and the streaming way (iter_documents + build_index in batches). Hash-based
+embeddings stand in for the real backend. Fails if the streaming peak RSS growth
+exceeds the ceiling.
+
+    python benchmarks/bench_streaming_loader.py --devices 2000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CHUNK_SIZE = 4000
+CHUNK_OVERLAP = 200
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_mode(mode, path, batch_size):
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    from fakes import HashEmbeddings
+    from module_utils.cli_splitter import CliOutputSplitter
+    from module_utils.index_cache import build_index
+    from module_utils.streaming_loader import iter_documents
+
+    embeddings = HashEmbeddings()
+    baseline = peak_rss_mb()
+    started = time.time()
+    if mode == 'eager':
+        with open(path) as f:
+            docs = [Document(page_content=f.read(), metadata=dict(source=path))]
+        documents = CliOutputSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP).split_documents(docs)
+        vector = FAISS.from_documents(documents, embeddings)
+    else:
+        vector, counts = build_index(iter_documents(path, CHUNK_SIZE, CHUNK_OVERLAP), embeddings,
+                                     batch_size=batch_size)
+    return dict(mode=mode, chunks=vector.index.ntotal, seconds=round(time.time() - started, 2),
+                rss_growth_mb=round(peak_rss_mb() - baseline, 1))
+
+
+def measure(mode, path, batch_size):
+    output = subprocess.check_output([sys.executable, __file__, '--child', mode, '--path', path,
+                                      '--batch-size', str(batch_size)])
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=2000, help='Devices in the synthetic output file.')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--max-rss-growth', type=float, default=None,
+                        help='Ceiling in MB for the streaming build; defaults to 1.5x the file size + 64 MB.')
+    parser.add_argument('--child', choices=['eager', 'stream'], help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.child, args.path, args.batch_size)))
+        return
+
+    from fakes import synthesize_fleet_output
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'fleet_output.txt')
+        size_mb = synthesize_fleet_output(path, devices=args.devices) / (1024.0 * 1024.0)
+        # The index keeps every chunk's text in its docstore, so it grows with the file either way;
+        # what streaming removes is the whole-file string, the list of chunks and the embedding backlog.
+        ceiling = args.max_rss_growth if args.max_rss_growth is not None else 1.5 * size_mb + 64
+        print('file: %.1f MB, ceiling for streaming: %.1f MB' % (size_mb, ceiling))
+        results = [measure('eager', path, args.batch_size), measure('stream', path, args.batch_size)]
+    for result in results:
+        print('%(mode)-7s %(chunks)7d chunks  %(seconds)6.2fs  peak RSS growth %(rss_growth_mb)7.1f MB' % result)
+    stream = results[1]
+    if stream['rss_growth_mb'] > ceiling:
+        sys.exit('FAIL: streaming build grew RSS by %.1f MB, ceiling is %.1f MB' % (stream['rss_growth_mb'], ceiling))
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""Offline benchmark suite for the entry points; writes a JSON report to diff between versions.
+
+Starts fake_llm_server.py (Ollama and the OpenAI API, answering after --latency seconds
+at --tokens-per-second) and ios_ssh_standin.py, writes synthetic CLI output for a fleet of
+--devices devices and runs every scenario in a fresh interpreter. A scenario records the
+import time of its entry point's modules and its peak RSS, and per stage the wall time,
+first-token latency where the answer is streamed, and what the stand-in LLM saw: requests,
+prompt and completion tokens and embedded texts.
+
+    python benchmarks/bench_suite.py --devices 200 --report before.json
+    python benchmarks/bench_suite.py --devices 200 --report after.json --compare before.json
+
+Scenarios:
+    llm_ollama, llm_openai  the modules' task code: one prompt, a second one, a batch
+    redhat_one_demo         Ollama: index build, index cache hit as in the next run, device filter, facts
+    web_retrieval_app       the app's calls (Streamlit is not started): upload index, answer, follow-up
+    agent_tools             device_pool and device_state against the SSH stand-in
+
+redhat_one_demo and the web app use Ollama embeddings: OpenAIEmbeddings needs tiktoken's
+encoding file, which it downloads on first use.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+
+LLM_PORT = 11434
+SYSTEM_MESSAGE = "As an expert network architect, you're here to guide engineers through intricate design challenges."
+QUESTION = 'Which routes does store0001-sw1 learn from OSPF?'
+
+
+class Recorder:
+    """Collects the measurements of one scenario."""
+
+    def __init__(self, stats_url):
+        self.stats_url = stats_url
+        self.result = dict(import_ms=0.0, stages={})
+
+    def llm_stats(self):
+        with urllib.request.urlopen(self.stats_url) as response:
+            return json.load(response)
+
+    @contextmanager
+    def imports(self):
+        started = time.perf_counter()
+        yield
+        self.result['import_ms'] += round((time.perf_counter() - started) * 1000, 1)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block; it may fill in the dict it gets, e.g. with first_token."""
+        extra = {}
+        before = self.llm_stats()
+        started = time.perf_counter()
+        yield extra
+        wall = time.perf_counter() - started
+        after = self.llm_stats()
+        self.result['stages'][name] = dict(wall=round(wall, 3), rss_mb=peak_rss_mb(),
+                                           **dict((key, after[key] - before[key]) for key in after), **extra)
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def llm_params(context, **overrides):
+    """The parameters llm_openai/llm_ollama hand to llm_tasks, with their defaults."""
+    params = dict(model='llama2', temperature=0.7, system_message=SYSTEM_MESSAGE, prompt=None, prompts=None,
+                  prompt_template=None, variables=None, max_concurrency=8, rate_limit=None, cache=False,
+                  cache_path=os.path.join(context['workdir'], 'responses.sqlite'), cache_ttl=86400,
+                  cache_max_entries=10000, cache_similarity=None, progress_file=None)
+    params.update(overrides)
+    return params
+
+
+def ask_stages(recorder, context, ask, model):
+    with recorder.stage('first') as extra:
+        result = ask(llm_params(context, model=model, prompt='Configure VLAN 99 named Management on fa0/5.'))
+        extra['first_token'] = result['first_token_latency']
+    with recorder.stage('second') as extra:
+        result = ask(llm_params(context, model=model, prompt='Configure VLAN 98 named Voice on fa0/6.'))
+        extra['first_token'] = result['first_token_latency']
+    with recorder.stage('batch'):
+        result = ask(llm_params(context, model=model, prompt_template='Configure VLAN 99 on store{store:04d}-sw1.',
+                                variables=[dict(store=i) for i in range(context['batch'])]))
+    if result['failed']:
+        raise RuntimeError('%d prompts of the batch failed' % result['failed'])
+
+
+def scenario_llm_ollama(recorder, context):
+    with recorder.imports():
+        from module_utils.llm_tasks import ask_ollama
+    ask_stages(recorder, context, ask_ollama, 'llama2')
+
+
+def scenario_llm_openai(recorder, context):
+    with recorder.imports():
+        from module_utils.llm_tasks import ask_openai
+    ask_stages(recorder, context, ask_openai, 'gpt-4')
+
+
+def scenario_redhat_one_demo(recorder, context):
+    with recorder.imports():
+        from module_utils import llm_tasks
+
+    params = dict(model='llama2', temperature=0.7, system_message=SYSTEM_MESSAGE, prompt=QUESTION,
+                  document=context['document'], index_cache=True, cache_dir=os.path.join(context['workdir'], 'faiss'),
+                  cache_max_size=2048, embedding_cache=True,
+                  embedding_cache_path=os.path.join(context['workdir'], 'embeddings.sqlite'), devices=None,
+                  commands=None, top_k=4, context='retrieval')
+    with recorder.stage('index_build'):
+        llm_tasks.ask_document(dict(params, prompt='Summarize the OSPF networks of the fleet.'))
+    # The next module run starts without the index in memory
+    llm_tasks._indexes.clear()
+    with recorder.stage('index_hit'):
+        llm_tasks.ask_document(dict(params, prompt='Summarize the OSPF networks of the fleet.'))
+    with recorder.stage('device_filter'):
+        llm_tasks.ask_document(params)
+    with recorder.stage('facts'):
+        llm_tasks.ask_document(dict(params, context='facts'))
+
+
+def scenario_web_retrieval_app(recorder, context):
+    with recorder.imports():
+        import hashlib
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain.chains.combine_documents import create_stuff_documents_chain
+        from langchain.chains import create_retrieval_chain
+        from module_utils.cli_chunker import metadata_filter
+        from module_utils.embedding_cache import CachedEmbeddings
+        from module_utils.index_cache import build_index, embedding_model_name
+        from module_utils.llm_tasks import CHUNK_OVERLAP, CHUNK_SIZE, PROVIDERS, stream_text
+        from module_utils.streaming_loader import iter_documents
+
+    # The same calls web_retrieval_app.py makes for an upload and a question
+    llm = PROVIDERS['ollama']['llm']('llama2', 0.7)
+    embeddings = PROVIDERS['ollama']['embeddings']()
+    embeddings = CachedEmbeddings(embeddings, embedding_model_name(embeddings),
+                                  os.path.join(context['workdir'], 'embeddings.sqlite'))
+    with open(context['document'], 'rb') as f:
+        data = f.read()
+    name = os.path.basename(context['document'])
+
+    with recorder.stage('index'):
+        hashlib.sha256(data).hexdigest()
+        vector, _ = build_index(iter_documents(name, CHUNK_SIZE, CHUNK_OVERLAP, data), embeddings)
+
+    prompt = ChatPromptTemplate.from_template('''Answer the following question based only on the provided context:
+
+    <context>
+    {context}
+    </context>
+
+    Question: {input}''')
+
+    def answer(question, extra):
+        search_kwargs = {}
+        search_filter = metadata_filter(vector, question)
+        if search_filter:
+            search_kwargs.update(filter=search_filter, fetch_k=vector.index.ntotal)
+        chain = create_retrieval_chain(vector.as_retriever(search_kwargs=search_kwargs),
+                                       create_stuff_documents_chain(llm, prompt))
+        timing = {}
+        ''.join(stream_text(chain.stream({'input': question}), timing, key='answer'))
+        extra['first_token'] = timing['first_token']
+
+    with recorder.stage('answer') as extra:
+        answer(QUESTION, extra)
+    with recorder.stage('follow_up') as extra:
+        answer('And which of them have the highest cost?', extra)
+
+
+def scenario_agent_tools(recorder, context):
+    with recorder.imports():
+        from device_pool import DevicePool, run_on_devices
+        from device_state import DeviceStateCache, read_device_state
+
+    addresses = context['ssh_addresses']
+    pool = DevicePool()
+    cache = DeviceStateCache(os.path.join(context['workdir'], 'device_state.sqlite'))
+    devices = [dict(device_type='cisco_ios', host=address, username=context['ssh_username'],
+                    password=context['ssh_password'], port=context['ssh_port']) for address in addresses]
+    change = ['vlan 950', 'name AIBot-Bench', 'interface GigabitEthernet1/0/5', 'switchport access vlan 950']
+    try:
+        for name in ('fleet_config_cold', 'fleet_config_warm'):
+            with recorder.stage(name) as extra:
+                results = run_on_devices(addresses, change, context['ssh_username'], context['ssh_password'],
+                                         port=context['ssh_port'], pool=pool)
+                extra['failed'] = sum(1 for result in results if not result['ok'])
+        for address in addresses:
+            cache.invalidate(address)
+        for name in ('state_read', 'state_cached'):
+            with recorder.stage(name) as extra:
+                states = [read_device_state(cache, pool, device) for device in devices]
+                extra['from_cache'] = sum(len(state['cached']) for state in states)
+    finally:
+        pool.close()
+        cache.close()
+
+
+SCENARIOS = dict(
+    llm_ollama=scenario_llm_ollama,
+    llm_openai=scenario_llm_openai,
+    redhat_one_demo=scenario_redhat_one_demo,
+    web_retrieval_app=scenario_web_retrieval_app,
+    agent_tools=scenario_agent_tools,
+)
+
+
+def run_child(name, context):
+    """Entry point of the fresh interpreter running one scenario; prints its result as JSON."""
+    sys.path[:0] = [ROOT, HERE]
+    recorder = Recorder('http://127.0.0.1:%d/stats' % context['llm_port'])
+    started = time.perf_counter()
+    SCENARIOS[name](recorder, context)
+    recorder.result['wall'] = round(time.perf_counter() - started, 3)
+    recorder.result['peak_rss_mb'] = peak_rss_mb()
+    print(json.dumps(recorder.result))
+
+
+def port_open(port, host='127.0.0.1'):
+    with socket.socket() as sock:
+        return sock.connect_ex((host, port)) == 0
+
+
+def wait_for(check, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if check():
+            return
+        time.sleep(0.1)
+    sys.exit('FAIL: timed out waiting for a stand-in to start')
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL).stdout.decode().strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, check=True,
+                                    stdout=subprocess.PIPE).stdout.strip())
+        return dict(commit=commit, dirty=dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return dict(commit=None, dirty=None)
+
+
+def flatten(report):
+    """scenario.metric and scenario.stage.metric -> value, for the numbers of a report."""
+    values = {}
+    for scenario, result in report['scenarios'].items():
+        for key, value in result.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values['%s.%s' % (scenario, key)] = value
+        for stage, metrics in result.get('stages', {}).items():
+            for key, value in metrics.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values['%s.%s.%s' % (scenario, stage, key)] = value
+    return values
+
+
+def compare(old, new):
+    old_values, new_values = flatten(old), flatten(new)
+    print('\n%-52s %12s %12s %8s' % ('metric (vs %s)' % (old['meta'].get('commit') or '?')[:10], 'before', 'after',
+                                      'change'))
+    for key in sorted(set(old_values) & set(new_values)):
+        before, after = old_values[key], new_values[key]
+        if before == after:
+            continue
+        change = '%+.0f%%' % (100.0 * (after - before) / before) if before else ''
+        print('%-52s %12s %12s %8s' % (key, before, after, change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=200, help='Devices in the synthetic CLI output.')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds before the stand-in LLM answers.')
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--batch', type=int, default=16, help='Prompts in the batch stage.')
+    parser.add_argument('--ssh-devices', type=int, default=20, help='Switches the agent tools work on.')
+    parser.add_argument('--ssh-port', type=int, default=2222)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--report', default='bench_report.json')
+    parser.add_argument('--compare', help='A previous report to print the differences with.')
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--context', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        return run_child(args.scenario, json.loads(args.context))
+
+    if port_open(LLM_PORT):
+        sys.exit('Port %d is taken; stop the local Ollama before benchmarking' % LLM_PORT)
+    sys.path[:0] = [ROOT, HERE]
+    from fakes import count_tokens, synthesize_fleet_output, _encoding
+    from ios_ssh_standin import PASSWORD, USERNAME, device_address
+
+    count_tokens('')
+    report = dict(meta=dict(git_revision(), python=platform.python_version(), platform=platform.platform(),
+                            created=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                            tokenizer='tiktoken' if _encoding[0] is not None else 'chars/4',
+                            settings=dict(devices=args.devices, latency=args.latency,
+                                          tokens_per_second=args.tokens_per_second, batch=args.batch,
+                                          ssh_devices=args.ssh_devices)),
+                  scenarios={})
+    helpers = []
+    with tempfile.TemporaryDirectory() as tmp:
+        document = os.path.join(tmp, 'fleet_output.txt')
+        report['meta']['settings']['document_bytes'] = synthesize_fleet_output(document, args.devices)
+        env = dict(os.environ, OPENAI_BASE_URL='http://127.0.0.1:%d/v1' % LLM_PORT,
+                   OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'fake'))
+        try:
+            helpers.append(subprocess.Popen([sys.executable, os.path.join(HERE, 'fake_llm_server.py'), '--port',
+                                             str(LLM_PORT), '--latency', str(args.latency), '--tokens-per-second',
+                                             str(args.tokens_per_second)],
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            wait_for(lambda: port_open(LLM_PORT))
+            if 'agent_tools' in args.scenarios:
+                helpers.append(subprocess.Popen([sys.executable, os.path.join(HERE, 'ios_ssh_standin.py'),
+                                                 '--devices', str(args.ssh_devices), '--port', str(args.ssh_port)],
+                                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+                wait_for(lambda: port_open(args.ssh_port, device_address(args.ssh_devices - 1)))
+            for name in args.scenarios:
+                workdir = os.path.join(tmp, name)
+                os.makedirs(workdir)
+                context = dict(workdir=workdir, document=document, llm_port=LLM_PORT, batch=args.batch,
+                               ssh_port=args.ssh_port, ssh_username=USERNAME, ssh_password=PASSWORD,
+                               ssh_addresses=[device_address(i) for i in range(args.ssh_devices)])
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), '--scenario', name, '--context',
+                                         json.dumps(context)], cwd=ROOT, env=env, stdout=subprocess.PIPE)
+                if output.returncode:
+                    report['scenarios'][name] = dict(error='exit status %d' % output.returncode)
+                else:
+                    report['scenarios'][name] = json.loads(output.stdout.decode().strip().splitlines()[-1])
+                result = report['scenarios'][name]
+                print('%-18s %s' % (name, result.get('error') or 'wall %(wall)7.2fs  import %(import_ms)7.1f ms  '
+                                    'peak RSS %(peak_rss_mb)7.1f MB' % result))
+                for stage, metrics in result.get('stages', {}).items():
+                    print('    %-18s %7.2fs  first token %6s  prompt tokens %7d  LLM/embedding requests %5d' % (
+                        stage, metrics['wall'], metrics.get('first_token', '-'), metrics['prompt_tokens'],
+                        metrics['requests']))
+        finally:
+            for helper in helpers:
+                helper.terminate()
+                helper.wait()
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('Report written to %s' % args.report)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    if any('error' in result for result in report['scenarios'].values()):
+        sys.exit('FAIL: some scenarios did not finish')
+
+
+if __name__ == '__main__':
+    main()
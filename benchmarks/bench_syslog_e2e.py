@@ -0,0 +1,165 @@
+"""End-to-end throughput of syslog_listener.py: UDP in, coalesced CONFIG_I events out to a webhook.
+
+Starts the listener on a non-privileged port with --workers processes, forwarding to an
+in-process webhook_sink, and drives it with syslog_loadgen.py at each --rate in turn. Per
+rate it reports:
+
+    sent        datagrams the load generator put on the wire (and the rate it achieved)
+    received    sent minus the kernel's drop counter of the listener's sockets
+    CONFIG_I    CONFIG_I lines sent, and how many of them reached the webhook (matched)
+    forwarded   events the webhook received; a burst of lines from one device is one event
+    latency     p50/p99 from sending a burst's latest line to the webhook receiving it,
+                which includes the --quiet-period the coalescer waits out and up to the
+                forwarder's BATCH_INTERVAL spent filling a batch
+
+    python benchmarks/bench_syslog_e2e.py --devices 2000 --rate 5000 20000 50000 --duration 10 --workers 2
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, ROOT)
+
+from bench_syslog_match import load_capture  # noqa: E402
+from syslog_loadgen import run_load, sequence_of  # noqa: E402
+from webhook_sink import SinkState, start_sink  # noqa: E402
+
+# How long the webhook must stay quiet after the load before a step is counted
+SETTLE = 2.0
+
+
+def listener_sockets(port):
+    """(bound sockets, summed kernel drops) of the UDP sockets on port, from /proc/net/udp."""
+    sockets = drops = 0
+    with open('/proc/net/udp') as f:
+        next(f)
+        for line in f:
+            fields = line.split()
+            if int(fields[1].split(':')[1], 16) == port:
+                sockets += 1
+                drops += int(fields[12])
+    return sockets, drops
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_sink(state, port):
+    """Serve the sink from a thread; returns the loop so it can be stopped."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(start_sink(state, port=port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return loop
+
+
+def wait_settled(state, timeout):
+    """Wait until no event has arrived for SETTLE seconds (or timeout passed)."""
+    deadline = time.time() + timeout
+    count, changed = len(state.events), time.time()
+    while time.time() < deadline and time.time() - changed < SETTLE:
+        time.sleep(0.1)
+        if len(state.events) != count:
+            count, changed = len(state.events), time.time()
+
+
+def measure(args, state, rate, seq_base, capture):
+    first_event = len(state.events)
+    _, drops_before = listener_sockets(args.port)
+    load = run_load(('127.0.0.1', args.port), args.devices, rate, args.duration, args.config_ratio, args.processes,
+                    seq_base, capture)
+    wait_settled(state, args.max_wait + SETTLE + 10)
+    _, drops_after = listener_sockets(args.port)
+
+    send_times = load['send_times']
+    matched = forwarded = 0
+    latencies = []
+    for received_at, event in state.events[first_event:]:
+        seq = sequence_of(event.get('log', ''))
+        if seq not in send_times:
+            continue
+        forwarded += 1
+        matched += event['count']
+        latencies.append(received_at - send_times[seq])
+    drops = drops_after - drops_before
+    return dict(rate=rate, sent=load['sent'], send_rate=load['sent'] / load['elapsed'], drops=drops,
+                received=load['sent'] - load['errors'] - drops, config_sent=load['config_sent'], matched=matched,
+                forwarded=forwarded, p50=percentile(latencies, 0.5), p99=percentile(latencies, 0.99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--rate', type=float, nargs='+', default=[5000, 20000, 50000],
+                        help='Messages per second to send; one step per value, on the same listener.')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--config-ratio', type=float, default=0.01)
+    parser.add_argument('--processes', type=int, default=4, help='Load generator processes.')
+    parser.add_argument('--capture', help='Replay the lines of this file instead of synthesizing them.')
+    parser.add_argument('--workers', type=int, default=2, help='Listener worker processes.')
+    parser.add_argument('--port', type=int, default=5514)
+    parser.add_argument('--sink-port', type=int, default=5000)
+    parser.add_argument('--sink-latency', type=float, default=0.0, help='Seconds the webhook takes per POST.')
+    parser.add_argument('--quiet-period', type=float, default=0.5)
+    parser.add_argument('--max-wait', type=float, default=5.0)
+    parser.add_argument('--no-state-cache', action='store_true',
+                        help='Do not invalidate a device state cache on CONFIG_I.')
+    args = parser.parse_args()
+
+    capture = load_capture(args.capture) if args.capture else None
+    state = SinkState(args.sink_latency)
+    sink_loop = run_sink(state, args.sink_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        command = [sys.executable, os.path.join(ROOT, 'syslog_listener.py'), '--listen-ip', '127.0.0.1',
+                   '--listen-port', str(args.port), '--workers', str(args.workers), '--forward',
+                   '--webhook-url', f'http://127.0.0.1:{args.sink_port}/endpoint',
+                   '--journal-dir', os.path.join(tmp, 'journal'), '--quiet-period', str(args.quiet_period),
+                   '--max-wait', str(args.max_wait),
+                   '--state-cache', '' if args.no_state_cache else os.path.join(tmp, 'device_state.sqlite')]
+        # Its per-line output goes nowhere, as it would under a service manager with a slow log
+        listener = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+        try:
+            deadline = time.time() + 30
+            while listener_sockets(args.port)[0] < args.workers:
+                if time.time() > deadline or listener.poll() is not None:
+                    sys.exit('FAIL: the listener did not start')
+                time.sleep(0.1)
+
+            print(f'{args.devices} devices, {args.workers} listener worker(s), {args.processes} sender process(es), '
+                  f'CONFIG_I ratio {args.config_ratio}, quiet period {args.quiet_period}s')
+            print(f"{'rate':>8} {'sent':>9} {'sent/s':>8} {'drops':>8} {'received':>9} {'CONFIG_I':>8} "
+                  f"{'matched':>8} {'missed':>7} {'forwarded':>9} {'p50 ms':>8} {'p99 ms':>8}")
+            for step, rate in enumerate(args.rate):
+                result = measure(args, state, rate, step * 10 ** 9, capture)
+                print(f"{rate:>8.0f} {result['sent']:>9} {result['send_rate']:>8.0f} {result['drops']:>8} "
+                      f"{result['received']:>9} {result['config_sent']:>8} {result['matched']:>8} "
+                      f"{result['config_sent'] - result['matched']:>7} {result['forwarded']:>9} "
+                      f"{result['p50'] * 1000:>8.1f} {result['p99'] * 1000:>8.1f}")
+        finally:
+            # The listener passes it on to its workers and waits for them to shut down
+            listener.send_signal(signal.SIGTERM)
+            listener.wait()
+            sink_loop.call_soon_threadsafe(sink_loop.stop)
+
+
+if __name__ == '__main__':
+    main()
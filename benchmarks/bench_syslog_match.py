@@ -0,0 +1,99 @@
+"""Compare the old decode-then-match path of syslog_listener with the byte-level prefilter.
+
+Replay a capture (one syslog message per line, e.g. exported from tcpdump/Wireshark)
+or synthesize one. Only the matching stage is timed, the socket receive path is not:
+
+    python benchmarks/bench_syslog_match.py --capture syslog_capture.txt
+    python benchmarks/bench_syslog_match.py --messages 1000000 --match-ratio 0.005
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from syslog_listener import MNEMONICS, compile_matcher  # noqa: E402
+
+NOISE = [
+    '<190>{seq}: *Mar  1 00:{m:02d}:{s:02d}.123: %SEC-6-IPACCESSLOGP: list 101 denied tcp 10.{a}.{b}.7(51234) -> 10.0.0.1(22), 1 packet',
+    '<189>{seq}: *Mar  1 00:{m:02d}:{s:02d}.456: %LINEPROTO-5-UPDOWN: Line protocol on Interface GigabitEthernet1/0/{a}, changed state to up',
+    '<187>{seq}: *Mar  1 00:{m:02d}:{s:02d}.789: %DOT1X-5-FAIL: Authentication failed for client (0011.22{a:02x}.{b:02x}00) on Interface Gi1/0/{a}',
+]
+MATCHES = [
+    '<189>{seq}: *Mar  1 00:{m:02d}:{s:02d}.001: %SYS-5-CONFIG_I: Configured from console by admin on vty0 (10.{a}.{b}.5)',
+    '<187>{seq}: *Mar  1 00:{m:02d}:{s:02d}.002: %LINK-3-UPDOWN: Interface GigabitEthernet1/0/{a}, changed state to down',
+]
+
+
+def synthesize(count, match_ratio, seed=113):
+    rng = random.Random(seed)
+    messages = []
+    for seq in range(count):
+        templates = MATCHES if rng.random() < match_ratio else NOISE
+        line = rng.choice(templates).format(seq=seq, m=seq // 60 % 60, s=seq % 60,
+                                            a=rng.randrange(48), b=rng.randrange(256))
+        messages.append(line.encode('utf-8'))
+    return messages
+
+
+def load_capture(path):
+    with open(path, 'rb') as f:
+        return [line.rstrip(b'\r\n') for line in f if line.strip()]
+
+
+def baseline(messages, mnemonics):
+    # What listen_for_syslog_messages did before: decode everything, then match text
+    search = re.compile('|'.join(re.escape('%' + m.lstrip('%')) for m in mnemonics)).search
+    matched = 0
+    for data in messages:
+        syslog_message = data.decode('utf-8').strip()
+        if search(syslog_message):
+            matched += 1
+    return matched
+
+
+def prefilter(messages, mnemonics):
+    # What SyslogWorker.handle_datagram does now: match the raw bytes, decode hits only
+    search = compile_matcher(mnemonics).search
+    matched = 0
+    for data in messages:
+        if search(data) is None:
+            continue
+        str(data, 'utf-8').strip()
+        matched += 1
+    return matched
+
+
+def measure(name, func, messages, mnemonics, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        matched = func(messages, mnemonics)
+        best = min(best, time.perf_counter() - start)
+    rate = len(messages) / best
+    print(f'{name:<10} {rate:>14,.0f} msg/s  ({matched} matched, {best:.3f}s best of {rounds})')
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--capture', help='File with one raw syslog message per line.')
+    parser.add_argument('--messages', type=int, default=500000)
+    parser.add_argument('--match-ratio', type=float, default=0.005)
+    parser.add_argument('--mnemonic', action='append', dest='mnemonics')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    mnemonics = args.mnemonics or MNEMONICS
+    messages = load_capture(args.capture) if args.capture else synthesize(args.messages, args.match_ratio)
+    print(f'{len(messages)} messages, mnemonics: {", ".join(mnemonics)}')
+    before = measure('before', baseline, messages, mnemonics, args.rounds)
+    after = measure('after', prefilter, messages, mnemonics, args.rounds)
+    print(f'speedup    {after / before:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Measure syslog_parser.SyslogParser throughput and its malformed-line counter.
+
+    python benchmarks/bench_syslog_parser.py --lines 1000000 --malformed-ratio 0.01
+    python benchmarks/bench_syslog_parser.py --capture syslog_capture.txt
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_syslog_match import load_capture, synthesize  # noqa: E402
+from syslog_parser import SyslogParser  # noqa: E402
+
+MALFORMED = [b'', b'garbage without a priority', b'<999>12: %SYS-5-CONFIG_I: out of range', b'<189>no tag here']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--capture', help='File with one raw syslog message per line.')
+    parser.add_argument('--lines', type=int, default=1000000)
+    parser.add_argument('--malformed-ratio', type=float, default=0.01)
+    parser.add_argument('--match-ratio', type=float, default=0.2, help='Share of CONFIG_I/LINK lines when synthesizing.')
+    args = parser.parse_args()
+
+    if args.capture:
+        lines = load_capture(args.capture)
+    else:
+        lines = synthesize(args.lines, args.match_ratio)
+        rng = random.Random(7)
+        for i in rng.sample(range(len(lines)), int(len(lines) * args.malformed_ratio)):
+            lines[i] = rng.choice(MALFORMED)
+
+    syslog_parser = SyslogParser()
+    parse = syslog_parser.parse
+    start = time.perf_counter()
+    for line in lines:
+        parse(line)
+    parse_seconds = time.perf_counter() - start
+
+    # Building the webhook payload decodes the fields, which only matched events pay for
+    records = [r for r in map(SyslogParser().parse, lines[:100000]) if r is not None]
+    start = time.perf_counter()
+    for record in records:
+        record.to_dict()
+    payload_seconds = time.perf_counter() - start
+
+    print(f'{len(lines)} lines parsed in {parse_seconds:.2f}s ({len(lines) / parse_seconds:,.0f} lines/s)')
+    print(f'parsed {syslog_parser.parsed}, malformed {syslog_parser.malformed}')
+    print(f'to_dict: {len(records) / payload_seconds:,.0f} records/s')
+
+
+if __name__ == '__main__':
+    main()
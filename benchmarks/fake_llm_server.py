@@ -0,0 +1,205 @@
+"""Local stand-in for an Ollama server and the OpenAI API.
+
+Answers with a fixed reply after --latency seconds (time to first token), streamed at
+--tokens-per-second, and embeds text with the same deterministic hash embeddings
+as fakes.HashEmbeddings, so the modules can be benchmarked without a model or a key:
+
+    Ollama  /api/generate, /api/chat (streamed unless "stream": false), /api/embeddings, /api/embed
+    OpenAI  /v1/chat/completions (SSE when "stream": true), /v1/embeddings, /v1/models
+
+GET /stats reports requests, prompt and completion tokens and embedded texts so far.
+
+    python benchmarks/fake_llm_server.py --port 11434 --latency 0.2 --tokens-per-second 40
+    OPENAI_BASE_URL=http://127.0.0.1:11434/v1 OPENAI_API_KEY=fake ansible-playbook playbook.yml
+"""
+import argparse
+import asyncio
+import base64
+import json
+import struct
+import time
+import uuid
+
+from aiohttp import web
+
+from fakes import HashEmbeddings, count_tokens
+
+ANSWER = 'vlan 99\n name Management\ninterface fa0/5\n switchport mode access\n switchport access vlan 99'
+
+
+class FakeLLMState:
+    def __init__(self, latency=0.0, answer=ANSWER, embedding_size=64, tokens_per_second=0.0):
+        self.latency = latency
+        self.answer = answer
+        self.tokens_per_second = tokens_per_second
+        self.embeddings = HashEmbeddings(embedding_size)
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.embedded_texts = 0
+        self.embedded_tokens = 0
+
+    def summary(self):
+        return dict(requests=self.requests, prompt_tokens=self.prompt_tokens,
+                    completion_tokens=self.completion_tokens, embedded_texts=self.embedded_texts,
+                    embedded_tokens=self.embedded_tokens)
+
+    def tokens(self):
+        """The answer in the pieces it is streamed in, roughly one per word."""
+        words = self.answer.split(' ')
+        return [word + ' ' for word in words[:-1]] + words[-1:]
+
+    async def generate(self, prompt):
+        """Yield the answer's pieces with the configured latency and rate, counting tokens."""
+        self.requests += 1
+        self.prompt_tokens += count_tokens(prompt)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i, token in enumerate(self.tokens()):
+            if i and self.tokens_per_second:
+                await asyncio.sleep(1.0 / self.tokens_per_second)
+            self.completion_tokens += 1
+            yield token
+
+    def embed(self, texts):
+        self.requests += 1
+        self.embedded_texts += len(texts)
+        self.embedded_tokens += sum(count_tokens(text) for text in texts)
+        return self.embeddings.embed_documents(texts)
+
+
+def _chat_prompt(messages):
+    return '\n'.join(message.get('content') or '' for message in messages)
+
+
+def _embedding_input(value):
+    """OpenAIEmbeddings sends token IDs when it checks context length; they are hashed like text."""
+    values = value if isinstance(value, list) and value and not isinstance(value[0], int) else [value]
+    return [item if isinstance(item, str) else json.dumps(item) for item in values]
+
+
+def create_app(state: FakeLLMState):
+    async def ollama(request, prompt, piece):
+        payload = await request.json()
+        model = payload.get('model')
+        prompt = prompt(payload)
+        if payload.get('stream') is False:
+            text = ''.join([token async for token in state.generate(prompt)])
+            return web.json_response(dict(model=model, done=True, **piece(text), prompt_eval_count=count_tokens(prompt),
+                                          eval_count=len(state.tokens())))
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        async for token in state.generate(prompt):
+            await response.write(json.dumps(dict(model=model, done=False, **piece(token))).encode() + b'\n')
+        done = dict(model=model, done=True, **piece(''), prompt_eval_count=count_tokens(prompt),
+                    eval_count=len(state.tokens()))
+        await response.write(json.dumps(done).encode() + b'\n')
+        await response.write_eof()
+        return response
+
+    async def generate(request):
+        return await ollama(request, lambda payload: payload['prompt'], lambda text: dict(response=text))
+
+    async def chat(request):
+        return await ollama(request, lambda payload: _chat_prompt(payload['messages']),
+                            lambda text: dict(message=dict(role='assistant', content=text)))
+
+    async def embeddings(request):
+        payload = await request.json()
+        return web.json_response(dict(embedding=state.embed([payload['prompt']])[0]))
+
+    async def embed(request):
+        payload = await request.json()
+        return web.json_response(dict(model=payload.get('model'), embeddings=state.embed(_embedding_input(
+            payload['input']))))
+
+    async def chat_completions(request):
+        payload = await request.json()
+        model = payload.get('model')
+        prompt = _chat_prompt(payload['messages'])
+        completion_id = 'chatcmpl-%s' % uuid.uuid4().hex
+        created = int(time.time())
+        usage = dict(prompt_tokens=count_tokens(prompt), completion_tokens=len(state.tokens()),
+                     total_tokens=count_tokens(prompt) + len(state.tokens()))
+        if not payload.get('stream'):
+            text = ''.join([token async for token in state.generate(prompt)])
+            return web.json_response(dict(id=completion_id, object='chat.completion', created=created, model=model,
+                                          choices=[dict(index=0, message=dict(role='assistant', content=text),
+                                                        finish_reason='stop')], usage=usage))
+
+        def event(choices, **extra):
+            chunk = dict(id=completion_id, object='chat.completion.chunk', created=created, model=model,
+                         choices=choices, **extra)
+            return b'data: ' + json.dumps(chunk).encode() + b'\n\n'
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        role = dict(role='assistant')
+        async for token in state.generate(prompt):
+            await response.write(event([dict(index=0, delta=dict(role, content=token), finish_reason=None)]))
+            role = {}
+        await response.write(event([dict(index=0, delta={}, finish_reason='stop')]))
+        if (payload.get('stream_options') or {}).get('include_usage'):
+            await response.write(event([], usage=usage))
+        await response.write(b'data: [DONE]\n\n')
+        await response.write_eof()
+        return response
+
+    async def openai_embeddings(request):
+        payload = await request.json()
+        texts = _embedding_input(payload['input'])
+        vectors = state.embed(texts)
+        if payload.get('encoding_format') == 'base64':
+            vectors = [base64.b64encode(struct.pack('<%df' % len(vector), *vector)).decode('ascii')
+                       for vector in vectors]
+        tokens = sum(count_tokens(text) for text in texts)
+        return web.json_response(dict(object='list', model=payload.get('model'),
+                                      data=[dict(object='embedding', index=i, embedding=vector)
+                                            for i, vector in enumerate(vectors)],
+                                      usage=dict(prompt_tokens=tokens, total_tokens=tokens)))
+
+    async def models(request):
+        return web.json_response(dict(object='list', data=[dict(id=name, object='model', owned_by='fake')
+                                                           for name in ('gpt-4', 'gpt-3.5-turbo',
+                                                                        'text-embedding-ada-002')]))
+
+    async def stats(request):
+        return web.json_response(state.summary())
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/api/generate', generate)
+    app.router.add_post('/api/chat', chat)
+    app.router.add_post('/api/embeddings', embeddings)
+    app.router.add_post('/api/embed', embed)
+    app.router.add_post('/v1/chat/completions', chat_completions)
+    app.router.add_post('/v1/embeddings', openai_embeddings)
+    app.router.add_get('/v1/models', models)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+async def start_server(state: FakeLLMState, host='127.0.0.1', port=11434):
+    """Start the server inside the running event loop and return its runner (call runner.cleanup() to stop)."""
+    runner = web.AppRunner(create_app(state))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before the first token of an answer.')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0,
+                        help='Rate the rest of an answer is streamed at; 0 sends it at once.')
+    parser.add_argument('--embedding-size', type=int, default=64)
+    args = parser.parse_args()
+
+    state = FakeLLMState(args.latency, embedding_size=args.embedding_size, tokens_per_second=args.tokens_per_second)
+    web.run_app(create_app(state), host=args.host, port=args.port)
+    print(state.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Local stand-ins used by the benchmarks so they run without paid or remote endpoints."""
+import hashlib
+import math
+import random
+import time
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings derived from a hash of the text: same text, same vector."""
+
+    def __init__(self, size=64, model='hash-embedding'):
+        self.size = size
+        self.model = model
+
+    def _embed(self, text):
+        values = []
+        counter = 0
+        while len(values) < self.size:
+            digest = hashlib.blake2b(text.encode('utf-8'), digest_size=64, salt=counter.to_bytes(16, 'little')).digest()
+            values.extend(b / 255.0 - 0.5 for b in digest)
+            counter += 1
+        values = values[:self.size]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+ROUTE_TEMPLATE = 'O    10.{a}.{b}.0/24 [110/{cost}] via 192.168.{a}.{c}, 00:{m:02d}:{s:02d}, GigabitEthernet0/{port}\n'
+INTERFACE_TEMPLATE = 'GigabitEthernet1/0/{port:<3}  10.{a}.{b}.{port:<5}  YES manual up                    up\n'
+
+
+def synthesize_fleet_output(path, devices=100, routes=200, interfaces=48, seed=113):
+    """Write CLI output for a fleet of devices in the layout of commands_output.txt; returns bytes written."""
+    rng = random.Random(seed)
+    written = 0
+    with open(path, 'w') as f:
+        for device in range(devices):
+            hostname = 'store%04d-sw%d' % (device // 2, device % 2 + 1)
+            blocks = ['%s#show ip route\n\n' % hostname]
+            blocks.extend(ROUTE_TEMPLATE.format(a=rng.randrange(256), b=rng.randrange(256), c=rng.randrange(1, 255),
+                                                cost=rng.randrange(2, 50), m=rng.randrange(60), s=rng.randrange(60),
+                                                port=rng.randrange(4)) for _ in range(routes))
+            blocks.append('\n\n%s#show ip interface brief\n\n' % hostname)
+            blocks.extend(INTERFACE_TEMPLATE.format(port=port, a=device % 256, b=device // 256)
+                          for port in range(1, interfaces + 1))
+            blocks.append('\n\n%s#show ip protocols | begin Networks\nRouting for Networks:\n' % hostname)
+            blocks.append('10.%d.0.0 0.0.255.255 area 0\n\n\n' % (device % 256))
+            text = ''.join(blocks)
+            f.write(text)
+            written += len(text)
+    return written
+
+
+_encoding = []
+
+
+def count_tokens(text):
+    """Prompt tokens as OpenAI counts them, or roughly 4 characters per token without tiktoken.
+
+    tiktoken downloads its encoding on first use, so offline it falls back to the estimate too.
+    """
+    if not _encoding:
+        try:
+            import tiktoken
+            _encoding.append(tiktoken.get_encoding('cl100k_base'))
+        except Exception:
+            _encoding.append(None)
+    if _encoding[0] is None:
+        return len(text) // 4 + 1
+    return len(_encoding[0].encode(text))
+
+
+class PrefillLLM(LLM):
+    """LLM stand-in whose latency grows with the prompt, like prompt processing on a local model.
+
+    Sleeps prompt tokens / prefill_rate seconds and answers with a fixed string.
+    """
+
+    prefill_rate: float = 2000.0
+    answer: str = 'Issues Identified: none'
+
+    @property
+    def _llm_type(self):
+        return 'prefill-fake'
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(count_tokens(prompt) / self.prefill_rate)
+        return self.answer
@@ -0,0 +1,366 @@
+"""Local stand-in for a fleet of Cisco IOS switches reachable over SSH.
+
+Each switch listens on its own loopback address (127.1.0.1, 127.1.0.2, ...) and answers
+with an IOS-like prompt (`sw001#`), enough of the CLI for netmiko's cisco_ios driver
+and the agent's VLAN tasks: terminal width/length, show vlan brief, show
+running-config, configure terminal, vlan/name/no vlan, interface and switchport
+lines, end/exit, write memory. Anything else gets `% Invalid input detected`. Logins
+and commands can be made slow to look like real devices, and leaving configuration
+mode can be logged as %SYS-5-CONFIG_I to a syslog listener, sent from the switch's
+own address:
+
+    python benchmarks/ios_ssh_standin.py --devices 200 --port 2222 --login-delay 0.5 --latency 0.05
+    python benchmarks/ios_ssh_standin.py --syslog 127.0.0.1:5514
+"""
+import argparse
+import re
+import selectors
+import socket
+import threading
+import time
+
+import paramiko
+
+USERNAME = 'admin'
+PASSWORD = 'Cisco123'
+
+SEED_VLANS = {1: 'default', 10: 'Users', 20: 'Voice', 99: 'Management', 901: 'AIBot-Test1', 902: 'AIBot-Test2'}
+
+
+def device_address(index):
+    return '127.1.%d.%d' % (index // 250, index % 250 + 1)
+
+
+class InvalidInput(Exception):
+    """The command is not valid; column is where IOS would put the ^ marker."""
+
+    def __init__(self, column=0):
+        self.column = column
+
+
+class Switch:
+    """State of one emulated switch, shared by all sessions to it."""
+
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self.vlans = dict(SEED_VLANS)
+        self.interfaces = {}
+        self.lock = threading.Lock()
+
+    def show_vlan_brief(self):
+        ports = {}
+        for name, lines in sorted(self.interfaces.items()):
+            vlan = next((int(line.split()[-1]) for line in lines if line.startswith('switchport access vlan')), 1)
+            ports.setdefault(vlan, []).append(name)
+        rows = ['VLAN Name                             Status    Ports',
+                '---- -------------------------------- --------- -------------------------------']
+        for vlan, name in sorted(self.vlans.items()):
+            rows.append('%-4d %-32s %-9s %s' % (vlan, name, 'active', ', '.join(ports.get(vlan, []))))
+        return '\r\n'.join(rows)
+
+    def show_running_config(self):
+        lines = ['!', 'hostname %s' % self.hostname, '!']
+        for vlan, name in sorted(self.vlans.items()):
+            if vlan != 1:
+                lines.extend(['vlan %d' % vlan, ' name %s' % name, '!'])
+        for name, config in sorted(self.interfaces.items()):
+            lines.extend(['interface %s' % name] + [' ' + line for line in config] + ['!'])
+        lines.append('end')
+        body = '\r\n'.join(lines)
+        return 'Building configuration...\r\n\r\nCurrent configuration : %d bytes\r\n%s' % (len(body), body)
+
+
+class CliSession:
+    """One interactive shell: reads lines from the channel, echoes them and answers like IOS."""
+
+    def __init__(self, switch, channel, latency=0.0, stats=None, on_config_change=None, peer=None):
+        self.switch = switch
+        self.channel = channel
+        self.latency = latency
+        self.stats = stats
+        self.on_config_change = on_config_change
+        self.peer = peer
+        self.mode = 'exec'
+        self.context = None
+
+    def prompt(self):
+        suffix = {'exec': '#', 'config': '(config)#', 'config-vlan': '(config-vlan)#', 'config-if': '(config-if)#'}
+        return self.switch.hostname + suffix[self.mode]
+
+    def run(self):
+        self.channel.sendall(('\r\n' + self.prompt()).encode())
+        buffer = b''
+        skip_lf = False
+        while True:
+            data = self.channel.recv(4096)
+            if not data:
+                return
+            for byte in data.replace(b'\x00', b''):
+                if skip_lf and byte == 0x0a:
+                    skip_lf = False
+                    continue
+                skip_lf = byte == 0x0d
+                if byte in (0x0d, 0x0a):
+                    if not self.line(buffer.decode('utf-8', 'replace')):
+                        return
+                    buffer = b''
+                else:
+                    buffer += bytes([byte])
+
+    def line(self, text):
+        """Answer one command line; False once the session should end."""
+        prompt = self.prompt()
+        self.channel.sendall((text + '\r\n').encode())
+        command = text.strip()
+        if command in ('exit', 'quit', 'logout') and self.mode == 'exec':
+            return False
+        output = ''
+        if command:
+            if self.stats is not None:
+                self.stats['commands'] += 1
+            if self.latency:
+                time.sleep(self.latency)
+            configuring = self.mode != 'exec'
+            try:
+                with self.switch.lock:
+                    output = self.execute(command)
+                if configuring and self.mode == 'exec' and self.on_config_change is not None:
+                    self.on_config_change(self.switch, self.peer)
+            except InvalidInput as e:
+                column = len(prompt) + len(text) - len(text.lstrip()) + e.column
+                output = ' ' * column + '^\r\n% Invalid input detected at \'^\' marker.\r\n'
+        self.channel.sendall((output + ('\r\n' if output and not output.endswith('\n') else '') +
+                              self.prompt()).encode())
+        return True
+
+    def execute(self, command):
+        words = command.split()
+        if self.mode == 'exec':
+            return self.exec_command(command, words)
+        if words[0] == 'do':
+            return self.exec_command(command[3:].strip(), words[1:])
+        if words[0] == 'end':
+            self.mode, self.context = 'exec', None
+            return ''
+        if words[0] == 'exit':
+            self.mode, self.context = ('config', None) if self.mode != 'config' else ('exec', None)
+            return ''
+        if words[0] == 'vlan' or words[:2] == ['no', 'vlan']:
+            negate = words[0] == 'no'
+            args = words[2:] if negate else words[1:]
+            if not args:
+                return '% Incomplete command.\r\n'
+            if not args[0].isdigit() or not 1 <= int(args[0]) <= 4094:
+                raise InvalidInput(command.index(args[0]))
+            vlan = int(args[0])
+            if negate:
+                self.switch.vlans.pop(vlan, None)
+                self.mode = 'config'
+            else:
+                self.switch.vlans.setdefault(vlan, 'VLAN%04d' % vlan)
+                self.mode, self.context = 'config-vlan', vlan
+            return ''
+        if words[0] == 'name' and self.mode == 'config-vlan':
+            if len(words) < 2:
+                return '% Incomplete command.\r\n'
+            self.switch.vlans[self.context] = words[1]
+            return ''
+        if words[0] == 'interface':
+            if len(words) < 2 or not re.match(r'[A-Za-z]+\d', words[1]):
+                raise InvalidInput(len(words[0]) + 1)
+            self.switch.interfaces.setdefault(words[1], [])
+            self.mode, self.context = 'config-if', words[1]
+            return ''
+        if self.mode == 'config-if' and words[0] in ('switchport', 'description', 'shutdown', 'no', 'ip',
+                                                      'spanning-tree'):
+            if words[:3] == ['switchport', 'access', 'vlan'] and (len(words) < 4 or not words[3].isdigit()):
+                raise InvalidInput(len(' '.join(words[:3])) + 1)
+            config = self.switch.interfaces[self.context]
+            config[:] = [line for line in config if line.split()[:3] != words[:3]] + [command]
+            return ''
+        if words[0] == 'hostname' and len(words) == 2:
+            self.switch.hostname = words[1]
+            return ''
+        raise InvalidInput()
+
+    def exec_command(self, command, words):
+        if not words:
+            return ''
+        if len(words[0]) >= 2 and 'show'.startswith(words[0]):
+            words = ['show'] + words[1:]
+        if words[0] == 'terminal' and len(words) == 3 and words[1] in ('length', 'width'):
+            return ''
+        if words[0] == 'enable':
+            return ''
+        if words[:2] in (['configure', 'terminal'], ['conf', 't']):
+            self.mode = 'config'
+            return 'Enter configuration commands, one per line.  End with CNTL/Z.\r\n'
+        if words[:2] in (['write', 'memory'], ['write', 'mem'], ['wr']):
+            return 'Building configuration...\r\n[OK]\r\n'
+        if words[:2] == ['show', 'vlan']:
+            return self.switch.show_vlan_brief() + '\r\n'
+        if words[:2] in (['show', 'running-config'], ['show', 'run']):
+            return self.switch.show_running_config() + '\r\n'
+        if words[:2] == ['show', 'version']:
+            return 'Cisco IOS Software, ios_ssh_standin\r\n%s uptime is 1 day\r\n' % self.switch.hostname
+        raise InvalidInput()
+
+
+class _SshServer(paramiko.ServerInterface):
+    def __init__(self, standin):
+        self.standin = standin
+        self.shell = threading.Event()
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if self.standin.login_delay:
+            time.sleep(self.standin.login_delay)
+        if (username, password) == (self.standin.username, self.standin.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell.set()
+        return True
+
+
+class IosStandIn:
+    """`devices` emulated switches on one port of consecutive loopback addresses.
+
+    start() serves them from a background thread; stop() closes the listeners and
+    every open session. stats counts sessions, commands and configuration changes,
+    which are sent as syslog to the (host, port) syslog if given.
+    """
+
+    def __init__(self, devices=10, port=2222, username=USERNAME, password=PASSWORD, login_delay=0.0, latency=0.0,
+                 syslog=None):
+        self.port = port
+        self.username = username
+        self.password = password
+        self.login_delay = login_delay
+        self.latency = latency
+        self.switches = dict((device_address(i), Switch('sw%03d' % (i + 1))) for i in range(devices))
+        self.syslog = syslog
+        self.stats = dict(sessions=0, commands=0, config_changes=0)
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self._selector = selectors.DefaultSelector()
+        self._transports = []
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def addresses(self):
+        return list(self.switches)
+
+    def start(self):
+        for address in self.switches:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((address, self.port))
+            listener.listen(128)
+            listener.setblocking(False)
+            self._selector.register(listener, selectors.EVENT_READ)
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for key in list(self._selector.get_map().values()):
+            self._selector.unregister(key.fileobj)
+            key.fileobj.close()
+        with self._lock:
+            for transport in self._transports:
+                transport.close()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                events = self._selector.select(timeout=0.2)
+            except (OSError, ValueError):
+                return
+            for key, _ in events:
+                try:
+                    sock, _ = key.fileobj.accept()
+                except OSError:
+                    continue
+                sock.setblocking(True)
+                threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def config_changed(self, switch, peer):
+        with self._lock:
+            self.stats['config_changes'] += 1
+            sequence = self.stats['config_changes']
+        if self.syslog is None:
+            return
+        now = time.localtime()
+        message = '<189>%d: *%s %2d %s.000: %%SYS-5-CONFIG_I: Configured from console by %s on vty0 (%s)' % (
+            sequence, time.strftime('%b', now), now.tm_mday, time.strftime('%H:%M:%S', now), self.username, peer)
+        address = next(address for address, known in self.switches.items() if known is switch)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+            sender.bind((address, 0))
+            sender.sendto(message.encode(), self.syslog)
+
+    def _serve(self, sock):
+        switch = self.switches[sock.getsockname()[0]]
+        peer = sock.getpeername()[0]
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(self.host_key)
+        with self._lock:
+            self._transports.append(transport)
+            self.stats['sessions'] += 1
+        server = _SshServer(self)
+        try:
+            transport.start_server(server=server)
+            channel = transport.accept(30)
+            if channel is not None and server.shell.wait(10):
+                CliSession(switch, channel, self.latency, self.stats, self.config_changed, peer).run()
+        except (paramiko.SSHException, EOFError, OSError):
+            pass
+        finally:
+            transport.close()
+            with self._lock:
+                self._transports.remove(transport)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--username', default=USERNAME)
+    parser.add_argument('--password', default=PASSWORD)
+    parser.add_argument('--login-delay', type=float, default=0.0, help='Seconds a password login takes.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before a command is answered.')
+    parser.add_argument('--syslog', help='HOST:PORT of a syslog listener to send %%SYS-5-CONFIG_I to.')
+    args = parser.parse_args()
+
+    syslog = None
+    if args.syslog:
+        host, port = args.syslog.rsplit(':', 1)
+        syslog = (host, int(port))
+    standin = IosStandIn(args.devices, args.port, args.username, args.password, args.login_delay, args.latency,
+                         syslog)
+    standin.start()
+    print('%d switches on %s..%s port %d' % (args.devices, standin.addresses[0], standin.addresses[-1], args.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.stop()
+        print(standin.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Send Cisco syslog to a listener at a fixed rate, from many source addresses and processes.
+
+Each device gets its own UDP socket bound to a loopback address (127.10.0.1 and up), so
+the listener sees --devices senders and SO_REUSEPORT spreads them over its workers like
+a real fleet. Messages are synthesized from the templates of bench_syslog_match.py, or
+replayed from a capture, and --config-ratio of them are %SYS-5-CONFIG_I. The sequence
+number of every CONFIG_I line is unique, and its send time is kept so the webhook side can
+measure latency (see bench_syslog_e2e.py).
+
+    python benchmarks/syslog_loadgen.py --target 127.0.0.1:5514 --devices 2000 --rate 20000 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import resource
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_syslog_match import NOISE, load_capture  # noqa: E402
+
+CONFIG_TEMPLATE = ('<189>{seq}: {hostname}: *{timestamp}: %SYS-5-CONFIG_I: '
+                   'Configured from console by admin on vty0 (10.0.0.5)')
+CONFIG_TAG = b'%SYS-5-CONFIG_I'
+
+# Sequence numbers of CONFIG_I lines are decoded back from the forwarded events
+SEQUENCE_PATTERN = re.compile(r'^<\d{1,3}>(\d+):')
+CAPTURE_PREFIX = re.compile(rb'^(<\d{1,3}>)(?:\d+: )?')
+
+# Noise messages are prebuilt and cycled, so formatting does not cap the send rate
+NOISE_POOL = 1024
+
+
+def device_address(index):
+    return f'127.{10 + index // 65025}.{index // 255 % 255}.{index % 255 + 1}'
+
+
+def device_hostname(index):
+    return f'store{index // 2:04d}-sw{index % 2 + 1}'
+
+
+def sequence_of(line):
+    """The sequence number of a line sent by this generator, or None."""
+    match = SEQUENCE_PATTERN.match(line)
+    return int(match.group(1)) if match else None
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def noise_pool(rng, capture=None):
+    if capture:
+        noise = [line for line in capture if CONFIG_TAG not in line]
+        return noise[:NOISE_POOL] or [b'<190>1: %SEC-6-IPACCESSLOGP: list 101 denied tcp']
+    return [rng.choice(NOISE).format(seq=seq, m=seq // 60 % 60, s=seq % 60, a=rng.randrange(48),
+                                     b=rng.randrange(256)).encode('utf-8') for seq in range(NOISE_POOL)]
+
+
+def config_lines(capture):
+    """CONFIG_I lines of a capture as templates for a new sequence number."""
+    return [CAPTURE_PREFIX.sub(rb'\1{seq}: ', line, count=1) for line in capture or [] if CONFIG_TAG in line]
+
+
+def generate(target, devices, rate, duration, config_ratio, index=0, processes=1, seq_base=0, capture=None,
+             seed=113):
+    """Send from this process's share of the devices for duration seconds at its share of rate.
+
+    Returns dict(sent, config_sent, errors, elapsed, send_times: {sequence: time.time() of the send}).
+    """
+    raise_fd_limit()
+    rng = random.Random(seed + index)
+    own = list(range(index, devices, processes))
+    sockets = []
+    for device in own:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((device_address(device), 0))
+        sockets.append(sock)
+    noise = noise_pool(rng, capture)
+    templates = config_lines(capture)
+    rate = rate / processes
+    send_times = {}
+    sent = errors = 0
+    started = time.monotonic()
+    try:
+        while True:
+            elapsed = time.monotonic() - started
+            if elapsed >= duration:
+                break
+            due = int(elapsed * rate)
+            while sent < due:
+                position = rng.randrange(len(own))
+                seq = None
+                if rng.random() < config_ratio:
+                    seq = seq_base + sent * processes + index
+                    if templates:
+                        data = rng.choice(templates).replace(b'{seq}', str(seq).encode('ascii'))
+                    else:
+                        data = CONFIG_TEMPLATE.format(seq=seq, hostname=device_hostname(own[position]),
+                                                      timestamp=time.strftime('%b %e %H:%M:%S.000')).encode('utf-8')
+                    send_times[seq] = time.time()
+                else:
+                    data = noise[sent % len(noise)]
+                try:
+                    sockets[position].sendto(data, target)
+                except OSError:
+                    errors += 1
+                    if seq is not None:
+                        del send_times[seq]
+                sent += 1
+            time.sleep(0.001)
+    finally:
+        for sock in sockets:
+            sock.close()
+    return dict(sent=sent, config_sent=len(send_times), errors=errors, elapsed=time.monotonic() - started,
+                send_times=send_times)
+
+
+def _generate_into(queue, *args):
+    queue.put(generate(*args))
+
+
+def run_load(target, devices, rate, duration, config_ratio, processes=4, seq_base=0, capture=None):
+    """generate() in processes processes; returns their results added up."""
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_generate_into, args=(queue, target, devices, rate, duration,
+                                                                    config_ratio, i, processes, seq_base, capture))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    # Read before joining: a child does not exit while its result is stuck in the pipe
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    total = dict(sent=0, config_sent=0, errors=0, elapsed=0.0, send_times={})
+    for result in results:
+        for key in ('sent', 'config_sent', 'errors'):
+            total[key] += result[key]
+        total['elapsed'] = max(total['elapsed'], result['elapsed'])
+        total['send_times'].update(result['send_times'])
+    return total
+
+
+def parse_target(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', type=parse_target, default=('127.0.0.1', 5514), help='HOST:PORT of the listener.')
+    parser.add_argument('--devices', type=int, default=1000, help='Distinct sender addresses.')
+    parser.add_argument('--rate', type=float, default=10000, help='Messages per second, all processes together.')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--config-ratio', type=float, default=0.01, help='Share of %%SYS-5-CONFIG_I messages.')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--capture', help='Replay the lines of this file instead of synthesizing them.')
+    args = parser.parse_args()
+
+    capture = load_capture(args.capture) if args.capture else None
+    result = run_load(args.target, args.devices, args.rate, args.duration, args.config_ratio, args.processes,
+                      capture=capture)
+    print(f"sent {result['sent']} ({result['sent'] / result['elapsed']:,.0f} msg/s), "
+          f"CONFIG_I {result['config_sent']}, send errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Local stand-in for the EDA webhook receiver.
+
+Accepts the JSON arrays posted by webhook_forwarder.WebhookForwarder, counts the
+events and can be told to be slow or to fail, so batching, retries and the
+overflow policies can be exercised without a real Event-Driven Ansible endpoint:
+
+    python benchmarks/webhook_sink.py --port 5000 --fail-rate 0.2 --latency 0.05
+    python syslog_listener.py --listen-port 5514 --forward --webhook-url http://127.0.0.1:5000/endpoint
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+
+class SinkState:
+    """What the sink has seen so far; shared by the handlers and whoever embeds the app."""
+
+    def __init__(self, latency=0.0, fail_rate=0.0, fail_status=503):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.requests = 0
+        self.failed = 0
+        self.events = []
+
+    def summary(self):
+        return dict(requests=self.requests, failed=self.failed, events=len(self.events))
+
+
+def create_app(state: SinkState):
+    async def receive(request):
+        state.requests += 1
+        if state.latency:
+            await asyncio.sleep(state.latency)
+        if random.random() < state.fail_rate:
+            state.failed += 1
+            return web.Response(status=state.fail_status)
+        payload = await request.json()
+        received_at = time.time()
+        for event in payload if isinstance(payload, list) else [payload]:
+            state.events.append((received_at, event))
+        return web.json_response({'accepted': len(payload) if isinstance(payload, list) else 1})
+
+    async def stats(request):
+        return web.json_response(state.summary())
+
+    app = web.Application()
+    app.router.add_post('/endpoint', receive)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+async def start_sink(state: SinkState, host='127.0.0.1', port=5000):
+    """Start the sink inside the running event loop and return its runner (call runner.cleanup() to stop)."""
+    runner = web.AppRunner(create_app(state))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering.')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of requests answered with --fail-status.')
+    parser.add_argument('--fail-status', type=int, default=503)
+    args = parser.parse_args()
+
+    state = SinkState(args.latency, args.fail_rate, args.fail_status)
+    web.run_app(create_app(state), host=args.host, port=args.port)
+    print(state.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import time
+
+from module_utils.embedding_cache import CACHE_PATH, CachedEmbeddings
+from module_utils.fleet_index import INDEX_DIR, INDEX_TYPES, SITE_PATTERN, build_fleet_index, index_path
+from module_utils.index_cache import embedding_model_name
+from module_utils.llm_tasks import CHUNK_OVERLAP, CHUNK_SIZE, embeddings_client, provider_for
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Build a named fleet index for redhat_one_demo's index option from runbooks, configs and "
+                    "show output. Directories are read recursively (.txt, .md and .csv files).",
+        epilog='Example: python build_fleet_index.py fleet --runbook vlan.md --config "Demo Configs" '
+               "--show-output commands_output.txt")
+    parser.add_argument("name", help="Name the module loads the index by.")
+    parser.add_argument("--runbook", action="append", default=[], help="Runbook file or directory.")
+    parser.add_argument("--config", action="append", default=[], help="Configuration file or directory.")
+    parser.add_argument("--show-output", action="append", default=[], help="CLI show output file or directory.")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--model", default="llama-pro",
+                        help="An LLM of the embedding backend to use, as for redhat_one_demo's model option.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="auto",
+                        help="auto is exact (flat) for small indexes and HNSW past fleet_index.FLAT_MAX chunks.")
+    parser.add_argument("--site-pattern", default=SITE_PATTERN,
+                        help="Regex whose match in a device's hostname (or else the file path) is its site.")
+    parser.add_argument("--embedding-cache", default=CACHE_PATH,
+                        help="Embedding cache shared with redhat_one_demo; an empty string turns it off.")
+    args = parser.parse_args()
+    if not (args.runbook or args.config or args.show_output):
+        parser.error("give at least one --runbook, --config or --show-output")
+    return args
+
+
+def main():
+    args = parse_args()
+    sources = ([(path, "runbook") for path in args.runbook] + [(path, "config") for path in args.config]
+               + [(path, "show_output") for path in args.show_output])
+    for path, doc_type in sources:
+        if not os.path.exists(path):
+            raise SystemExit(f"{path} does not exist")
+
+    provider = provider_for(args.model)
+    embeddings = embeddings_client(provider)
+    manifest = dict(provider=provider, embedding_model=embedding_model_name(embeddings),
+                    chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, site_pattern=args.site_pattern)
+    if args.embedding_cache:
+        embeddings = CachedEmbeddings(embeddings, manifest["embedding_model"], args.embedding_cache)
+
+    started = time.time()
+    path = index_path(args.index_dir, args.name)
+    manifest = build_fleet_index(path, sources, embeddings, manifest, CHUNK_SIZE, CHUNK_OVERLAP, args.index_type,
+                                 args.site_pattern)
+    print(f"{args.name}: {manifest['chunks']} chunks from {len(sources)} source(s), {manifest['index_type']} index "
+          f"of {manifest['dimension']}-dimensional {manifest['embedding_model']} vectors, "
+          f"built in {time.time() - started:.1f}s at {path}")
+    if args.embedding_cache:
+        print(f"embedding cache: {embeddings.stats()}")
+
+
+if __name__ == "__main__":
+    main()
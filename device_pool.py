@@ -0,0 +1,290 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from netmiko import ConnectHandler
+from netmiko.exceptions import ReadTimeout
+
+# Sessions unused for longer than this are logged out instead of being reused
+IDLE_TIMEOUT = 300.0
+
+# Devices worked on at the same time by run_on_devices
+MAX_WORKERS = 32
+
+# Seconds send_config_batch waits for the next prompt before giving up on the device
+LINE_TIMEOUT = 10.0
+
+# IOS reports a rejected line with a "% ..." message right after its echo
+ERROR_PATTERN = re.compile(r"^% (?:Invalid input|Incomplete command|Ambiguous command|Unknown command).*$", re.M)
+
+CONFIG_ENTER = ("configure terminal", "conf t", "config t")
+CONFIG_EXIT = ("end",)
+
+# Exec commands and the shortest abbreviation taken for each, which no global or
+# interface configuration command starts with. They are sent with `do` in front while
+# in configuration mode. A bare `sh` is left alone: in interface configuration it is
+# `shutdown`, while `show` always has something to show.
+EXEC_COMMANDS = {
+    "show": "sh", "write": "wr", "copy": "cop", "clear": "cle", "ping": "pin", "traceroute": "trac",
+    "reload": "rel", "dir": "dir", "more": "mor", "verify": "veri", "debug": "deb", "undebug": "undeb",
+    "terminal": "ter",
+}
+
+
+class DevicePool:
+    """Authenticated netmiko sessions kept open between calls, keyed by device and login.
+
+    A session is used by one thread at a time: checkout() hands out an idle session of
+    the same key, or logs in if there is none, and checkin() puts it back. Sessions left
+    idle for longer than idle_timeout, or whose transport died, are disconnected the
+    next time the pool looks at them.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, connect=ConnectHandler):
+        self.idle_timeout = idle_timeout
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._idle = {}
+        self.stats = dict(connects=0, reuses=0, closed=0)
+
+    @staticmethod
+    def key(device):
+        return (device.get("device_type", "cisco_ios"), device["host"], device.get("port", 22),
+                device["username"], device.get("password"))
+
+    def checkout(self, device):
+        """A session to device (netmiko ConnectHandler arguments) and whether it was reused."""
+        device = {"device_type": "cisco_ios", **device}
+        key = self.key(device)
+        while True:
+            with self._lock:
+                sessions = self._idle.get(key)
+                if not sessions:
+                    break
+                connection, last_used = sessions.pop()
+            if time.monotonic() - last_used <= self.idle_timeout and connection.is_alive():
+                with self._lock:
+                    self.stats["reuses"] += 1
+                return connection, True
+            self.discard(connection)
+        connection = self._connect(**device)
+        with self._lock:
+            self.stats["connects"] += 1
+        return connection, False
+
+    def checkin(self, device, connection):
+        """Return a healthy session; it goes back at the privileged exec prompt."""
+        device = {"device_type": "cisco_ios", **device}
+        try:
+            if connection.check_config_mode():
+                connection.exit_config_mode()
+        except Exception:
+            self.discard(connection)
+            return
+        with self._lock:
+            self._idle.setdefault(self.key(device), []).append((connection, time.monotonic()))
+
+    def discard(self, connection):
+        """Disconnect a session that must not be reused, e.g. after an error mid-command."""
+        try:
+            connection.disconnect()
+        except Exception:
+            pass
+        with self._lock:
+            self.stats["closed"] += 1
+
+    def close_idle(self):
+        """Disconnect every session idle for longer than idle_timeout."""
+        expired = []
+        now = time.monotonic()
+        with self._lock:
+            for key, sessions in list(self._idle.items()):
+                keep = [(c, t) for c, t in sessions if now - t <= self.idle_timeout]
+                expired.extend(c for c, t in sessions if now - t > self.idle_timeout)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for connection in expired:
+            self.discard(connection)
+
+    def close(self):
+        with self._lock:
+            sessions = [c for idle in self._idle.values() for c, _ in idle]
+            self._idle.clear()
+        for connection in sessions:
+            self.discard(connection)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(sessions) for sessions in self._idle.values())
+
+
+def send_commands(connection, commands):
+    """Send each command and read for a fixed time after it, as config_commands used to."""
+    output = ""
+    for command in commands:
+        output += connection.send_command_timing(command, strip_prompt=False, strip_command=False, delay_factor=4)
+    return dict(output=output)
+
+
+def is_exec_command(line):
+    """True if line is an exec command (EXEC_COMMANDS), abbreviated or not."""
+    words = line.lower().split()
+    if not words or (words[0] == "sh" and len(words) == 1):
+        return False
+    return any(words[0].startswith(shortest) and command.startswith(words[0])
+               for command, shortest in EXEC_COMMANDS.items())
+
+
+def plan_config_batch(commands):
+    """The lines to send for commands, as (position in commands or None if added, line).
+
+    Lines before the first `configure terminal` are configuration commands too, unless
+    they are exec commands, so configuration mode is entered for them. A `configure
+    terminal` inside configuration mode, or an `end` outside it, is skipped. Exec
+    commands get `do` in front while in configuration mode, and a closing `end` is only
+    added if the commands leave the device in configuration mode.
+    """
+    lines = []
+    configuring = False
+    for number, command in enumerate(commands, 1):
+        line = command.strip()
+        if not line:
+            continue
+        if line.lower() in CONFIG_ENTER:
+            if not configuring:
+                lines.append((number, line))
+                configuring = True
+        elif line.lower() in CONFIG_EXIT:
+            if configuring:
+                lines.append((number, line))
+                configuring = False
+        elif is_exec_command(line):
+            lines.append((number, "do " + line if configuring else line))
+        else:
+            if not configuring:
+                lines.append((None, "configure terminal"))
+                configuring = True
+            lines.append((number, line))
+    if configuring:
+        lines.append((None, "end"))
+    return lines
+
+
+def send_config_batch(connection, commands, line_timeout=LINE_TIMEOUT):
+    """Push commands as one write, like pasting them into the CLI.
+
+    Instead of sleeping after each line, the reply is read until every line has been
+    answered by a prompt. Configuration mode is entered and left as plan_config_batch()
+    says, so a list may mix configuration and exec commands (`sh vlan brief`,
+    `write memory`). Returns the transcript and, per rejected line, dict(line, command,
+    error) where line is its 1-based position in commands; lines added to enter or
+    leave configuration mode are never reported.
+    """
+    lines = plan_config_batch(commands)
+    if not lines:
+        return dict(output="", errors=[])
+
+    # A session is handed back in exec mode, unless an earlier run failed half-way
+    output = connection.exit_config_mode() if connection.check_config_mode() else ""
+    prompt = re.compile(r"^%s(?:\([\w.-]+\))?#" % re.escape(connection.base_prompt), re.M)
+    connection.write_channel("".join(connection.normalize_cmd(line) for _, line in lines))
+    reply = ""
+    answered = 0
+    deadline = time.monotonic() + line_timeout
+    while answered < len(lines):
+        data = connection.read_channel()
+        if data:
+            reply += data
+            seen = len(prompt.findall(reply))
+            if seen > answered:
+                answered = seen
+                deadline = time.monotonic() + line_timeout
+        elif time.monotonic() > deadline:
+            raise ReadTimeout(f"No prompt after {lines[answered][1]!r} within {line_timeout}s")
+        else:
+            time.sleep(0.005)
+
+    # Everything up to the n-th prompt is the echo of line n and the device's answer to it
+    errors = []
+    for (number, line), answer in zip(lines, prompt.split(reply)):
+        match = ERROR_PATTERN.search(answer)
+        if match and number is not None:
+            errors.append(dict(line=number, command=line, error=match.group(0).strip()))
+    return dict(output=output + reply, errors=errors)
+
+
+def run_on_device(pool, device, commands, run=send_config_batch):
+    """Run commands on one device through the pool; returns its result dict, never raises."""
+    result = dict(host=device["host"], ok=False, output="", errors=[], error=None, reused=False,
+                  connect_time=0.0, run_time=0.0)
+    started = time.monotonic()
+    try:
+        connection, result["reused"] = pool.checkout(device)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["connect_time"] = round(time.monotonic() - started, 3)
+        return result
+    connected = time.monotonic()
+    result["connect_time"] = round(connected - started, 3)
+    try:
+        result.update(run(connection, commands))
+    except Exception as e:
+        # The session is in an unknown state (half-read output, maybe config mode)
+        result["error"] = f"{type(e).__name__}: {e}"
+        pool.discard(connection)
+    else:
+        result["ok"] = not result["errors"]
+        pool.checkin(device, connection)
+    result["run_time"] = round(time.monotonic() - connected, 3)
+    return result
+
+
+def run_on_devices(hosts, commands, username, password, port=22, device_type="cisco_ios", workers=MAX_WORKERS,
+                   pool=None, run=send_config_batch):
+    """Run the same commands on many devices at once, at most `workers` at a time.
+
+    hosts are hostnames/IPs or dicts of ConnectHandler arguments that override the
+    shared ones. run(connection, commands) returns the fields it fills in, output and
+    optionally errors (the device rejected a line). Returns one result dict per host,
+    in the order of hosts: host, ok, output, errors, error (the run failed),
+    reused (an existing session was used), connect_time and run_time in seconds.
+    """
+    owned = pool is None
+    if owned:
+        pool = DevicePool()
+    devices = []
+    for host in hosts:
+        device = dict(device_type=device_type, username=username, password=password, port=port)
+        device.update(host if isinstance(host, dict) else dict(host=host))
+        devices.append(device)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(devices)))) as executor:
+            return list(executor.map(lambda device: run_on_device(pool, device, commands, run), devices))
+    finally:
+        if owned:
+            pool.close()
+        else:
+            pool.close_idle()
+
+
+def result_text(result):
+    """A device's output followed by what went wrong, as text for an agent."""
+    text = result["output"]
+    for error in result["errors"]:
+        text += f"\nLine {error['line']} {error['command']!r} was rejected: {error['error']}"
+    if result["error"]:
+        text += f"\n{result['error']}"
+    return text
+
+
+def format_results(results):
+    """The per-device results as text for an agent: one section per device, errors included."""
+    sections = []
+    for result in results:
+        status = "ok" if result["ok"] else "failed"
+        sections.append(f"=== {result['host']} ({status}, {result['connect_time'] + result['run_time']:.2f}s) ===\n"
+                        f"{result_text(result)}")
+    return "\n".join(sections)
@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from module_utils.ios_facts import parse_running_config, parse_vlan_brief
+
+STATE_PATH = os.path.expanduser("~/.cache/langchain_ops/device_state.sqlite")
+
+# Seconds a snapshot is served without asking the device again, unless it reports a change first
+TTL = 900
+
+# The agent and the syslog listener's workers use the file at the same time
+BUSY_TIMEOUT = 5
+
+# What can be snapshotted: the command that is run and how its output is parsed
+SNAPSHOTS = {
+    "vlans": ("show vlan brief", parse_vlan_brief),
+    "running_config": ("show running-config", parse_running_config),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    host TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    hostname TEXT,
+    data TEXT NOT NULL,
+    taken REAL NOT NULL,
+    PRIMARY KEY (host, kind)
+);
+CREATE INDEX IF NOT EXISTS snapshots_hostname ON snapshots (hostname);
+CREATE TABLE IF NOT EXISTS invalidations (
+    name TEXT PRIMARY KEY,
+    at REAL NOT NULL
+);
+"""
+
+
+class DeviceStateCache:
+    """Parsed show output per device, shared by the agent and the syslog listener through SQLite.
+
+    A snapshot is keyed by the address the agent connected to and also remembers the
+    device's own hostname (from its prompt), so a change reported by either name drops
+    it. A snapshot taken before the latest invalidation of its device is not stored,
+    so a read racing a `conf t` session cannot bring the old state back.
+    """
+
+    def __init__(self, path=STATE_PATH, ttl=TTL):
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self.stats = dict(hits=0, misses=0, invalidations=0)
+
+    def get(self, host, kind):
+        """(data, taken) of a fresh snapshot, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT data, taken FROM snapshots WHERE host = ? AND kind = ? AND taken > ?",
+                                   (host.lower(), kind, time.time() - self.ttl)).fetchone()
+            self.stats["hits" if row else "misses"] += 1
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, host, kind, data, taken, hostname=None):
+        """Store a snapshot whose commands were sent at `taken`; False if the device changed since."""
+        names = [host.lower()] + ([hostname.lower()] if hostname else [])
+        with self._lock:
+            # The check and the write are one transaction, so a listener worker cannot invalidate in between
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                changed = self._db.execute("SELECT MAX(at) FROM invalidations WHERE name IN (%s)"
+                                           % ", ".join("?" * len(names)), names).fetchone()[0]
+                stored = changed is None or changed < taken
+                if stored:
+                    self._db.execute("INSERT OR REPLACE INTO snapshots (host, kind, hostname, data, taken) "
+                                     "VALUES (?, ?, ?, ?, ?)", (names[0], kind, names[-1], json.dumps(data), taken))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return stored
+
+    def invalidate(self, *names):
+        """Drop every snapshot of the device known by any of names (address or hostname)."""
+        names = [name.lower() for name in names if name]
+        now = time.time()
+        placeholders = ", ".join("?" * len(names))
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO invalidations (name, at) VALUES (?, ?)",
+                                     [(name, now) for name in names])
+                deleted = self._db.execute("DELETE FROM snapshots WHERE host IN (%s) OR hostname IN (%s)"
+                                           % (placeholders, placeholders), names + names).rowcount
+                # Only invalidations younger than any snapshot still being taken matter
+                self._db.execute("DELETE FROM invalidations WHERE at < ?", (now - self.ttl,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self.stats["invalidations"] += 1
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def read_device_state(cache, pool, device, kinds=tuple(SNAPSHOTS), refresh=False):
+    """The parsed state of one device, from the cache where fresh and over SSH otherwise.
+
+    device holds netmiko ConnectHandler arguments; a session is only checked out of
+    the device_pool.DevicePool if some kind is missing, and only show commands are
+    sent on it. Returns dict(host, <kind>: data, age: seconds per kind, cached: kinds
+    served from the cache).
+    """
+    host = device["host"]
+    state = dict(host=host, age={}, cached=[])
+    missing = []
+    for kind in kinds:
+        snapshot = None if refresh else cache.get(host, kind)
+        if snapshot is None:
+            missing.append(kind)
+            continue
+        state[kind], taken = snapshot
+        state["age"][kind] = round(time.time() - taken, 1)
+        state["cached"].append(kind)
+    if not missing:
+        return state
+
+    connection, _ = pool.checkout(device)
+    try:
+        for kind in missing:
+            command, parse = SNAPSHOTS[kind]
+            taken = time.time()
+            state[kind] = parse(connection.send_command(command))
+            state["age"][kind] = 0.0
+            cache.put(host, kind, state[kind], taken, connection.base_prompt)
+    except Exception:
+        pool.discard(connection)
+        raise
+    pool.checkin(device, connection)
+    return state
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+# A burst is emitted once its key has been quiet for QUIET_PERIOD seconds, or
+# MAX_WAIT seconds after its first event if the device never goes quiet
+QUIET_PERIOD = 5.0
+MAX_WAIT = 30.0
+
+# Timer wheel resolution and size. Deadlines further out than TICK * WHEEL_SLOTS
+# simply go around the wheel again.
+TICK = 0.25
+WHEEL_SLOTS = 512
+
+# Raw lines kept per burst; the count keeps going past it
+MAX_LINES = 50
+
+
+class Burst:
+    """Events of one (sender IP, mnemonic) key collapsed into a single event."""
+
+    __slots__ = ("sender_ip", "mnemonic", "count", "first_seen", "last_seen", "lines", "line", "record")
+
+    def __init__(self, sender_ip, mnemonic, now):
+        self.sender_ip = sender_ip
+        self.mnemonic = mnemonic
+        self.count = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.lines = []
+        # The latest line, which `lines` stops keeping past max_lines
+        self.line = None
+        self.record = None
+
+    def deadline(self, quiet_period, max_wait):
+        return min(self.last_seen + quiet_period, self.first_seen + max_wait)
+
+    def to_event(self):
+        # The parsed fields of the latest message, plus what the burst adds to them
+        event = self.record.to_dict() if self.record is not None else {}
+        event.update({
+            "log": self.line,
+            "ip_address": self.sender_ip,
+            "tag": self.mnemonic,
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "lines": self.lines,
+        })
+        return event
+
+
+class EventCoalescer:
+    """Collapse bursts of events per (sender IP, mnemonic) with a single hashed timer wheel.
+
+    Adding an event is O(1) and never reschedules: a burst sits in the slot of the
+    deadline it had when it was created and, when that slot comes up, is either
+    emitted or moved to the slot of its current deadline. One task drives the wheel
+    no matter how many devices are bursting at once.
+    """
+
+    def __init__(self, emit, quiet_period=QUIET_PERIOD, max_wait=MAX_WAIT, tick=TICK, slots=WHEEL_SLOTS,
+                 max_lines=MAX_LINES):
+        self.emit = emit
+        self.quiet_period = quiet_period
+        self.max_wait = max_wait
+        self.tick = tick
+        self.max_lines = max_lines
+        self.bursts = {}
+        self._wheel = [[] for _ in range(slots)]
+        self._current_tick = int(time.time() / tick)
+        self.stats = dict(events=0, emitted=0)
+
+    def add(self, sender_ip, mnemonic, line, record=None, now=None):
+        """Add one event to the burst of its key. Returns True if it opened a new burst."""
+        now = time.time() if now is None else now
+        key = (sender_ip, mnemonic)
+        burst = self.bursts.get(key)
+        opened = burst is None
+        if opened:
+            burst = self.bursts[key] = Burst(sender_ip, mnemonic, now)
+            self._schedule(key, burst.deadline(self.quiet_period, self.max_wait))
+        burst.count += 1
+        burst.last_seen = now
+        burst.line = line
+        if len(burst.lines) < self.max_lines:
+            burst.lines.append(line)
+        if record is not None:
+            burst.record = record
+        self.stats["events"] += 1
+        return opened
+
+    def _schedule(self, key, deadline):
+        # Never schedule into a slot the wheel has already passed
+        tick = max(int(deadline / self.tick) + 1, self._current_tick + 1)
+        self._wheel[tick % len(self._wheel)].append(key)
+
+    def advance(self, now=None):
+        """Fire every slot up to `now`, emitting the bursts that are due."""
+        now = time.time() if now is None else now
+        target = int(now / self.tick)
+        # After a long stall one lap of the wheel visits every slot once
+        first = max(self._current_tick + 1, target - len(self._wheel) + 1)
+        for tick in range(first, target + 1):
+            slot = self._wheel[tick % len(self._wheel)]
+            if not slot:
+                continue
+            self._wheel[tick % len(self._wheel)] = []
+            self._current_tick = tick
+            for key in slot:
+                burst = self.bursts.get(key)
+                if burst is None:
+                    continue
+                deadline = burst.deadline(self.quiet_period, self.max_wait)
+                if deadline <= now:
+                    del self.bursts[key]
+                    self._emit(burst)
+                else:
+                    self._schedule(key, deadline)
+        self._current_tick = max(self._current_tick, target)
+
+    def flush(self):
+        """Emit every pending burst, e.g. on shutdown."""
+        bursts, self.bursts = self.bursts, {}
+        for slot in self._wheel:
+            slot.clear()
+        for burst in bursts.values():
+            self._emit(burst)
+
+    def _emit(self, burst):
+        self.stats["emitted"] += 1
+        self.emit(burst.to_event())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
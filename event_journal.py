@@ -0,0 +1,207 @@
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+
+# Each segment is a preallocated, memory-mapped file of this many bytes
+SEGMENT_SIZE = 16 * 1024 * 1024
+
+# Records are synced to disk every FSYNC_EVERY appends or FSYNC_INTERVAL seconds
+FSYNC_EVERY = 256
+FSYNC_INTERVAL = 1.0
+
+# Record layout: payload length, CRC32 of the payload, payload (UTF-8 JSON).
+# A zero length marks the end of the data written to a segment so far.
+HEADER = struct.Struct("<II")
+
+SEGMENT_PATTERN = "segment-{:012d}.log"
+CURSOR_FILE = "cursor"
+
+
+class JournalPosition:
+    """A (segment, offset) pair; records before it have been consumed."""
+
+    __slots__ = ("segment", "offset")
+
+    def __init__(self, segment, offset):
+        self.segment = segment
+        self.offset = offset
+
+    def __repr__(self):
+        return f"JournalPosition({self.segment}, {self.offset})"
+
+
+class EventJournal:
+    """Append-only, memory-mapped segment journal with a persistent replay cursor."""
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._readers = {}
+        self.cursor = self._load_cursor()
+
+        segments = self._segments()
+        if not segments:
+            segments = [self.cursor.segment]
+        self._write_segment = segments[-1]
+        self._write_file, self._write_map = self._open_segment(self._write_segment, writable=True)
+        self._write_offset = self._scan_end(self._write_map)
+        self.pending = self._count_pending()
+
+    # -- writing ---------------------------------------------------------
+
+    def append(self, event):
+        """Append one event. It is durable once sync() has run (at most fsync_every appends later)."""
+        payload = json.dumps(event, separators=(",", ":")).encode("utf-8")
+        size = HEADER.size + len(payload)
+        if size + HEADER.size > self.segment_size:
+            raise ValueError(f"event of {len(payload)} bytes does not fit in a {self.segment_size} byte segment")
+        if self._write_offset + size + HEADER.size > self.segment_size:
+            self._roll()
+        offset = self._write_offset
+        start = offset + HEADER.size
+        self._write_map[start:start + len(payload)] = payload
+        # The header goes in last, so a torn write looks like the end of the segment
+        self._write_map[offset:start] = HEADER.pack(len(payload), zlib.crc32(payload))
+        self._write_offset = start + len(payload)
+        self.pending += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self, force=True):
+        """msync the active segment. With force=False only if FSYNC_INTERVAL has passed."""
+        if not self._unsynced or (not force and time.monotonic() - self._last_sync < self.fsync_interval):
+            return
+        self._write_map.flush()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _roll(self):
+        self.sync()
+        self._write_map.close()
+        self._write_file.close()
+        self._write_segment += 1
+        self._write_file, self._write_map = self._open_segment(self._write_segment, writable=True)
+        self._write_offset = 0
+
+    # -- reading ---------------------------------------------------------
+
+    def read(self, max_records, position=None):
+        """Return (events, position after them), starting at the cursor unless a position is given."""
+        position = position or self.cursor
+        segment, offset = position.segment, position.offset
+        events = []
+        while len(events) < max_records:
+            if segment > self._write_segment:
+                break
+            view = self._reader(segment)
+            if offset + HEADER.size > len(view):
+                length = 0
+            else:
+                length, crc = HEADER.unpack_from(view, offset)
+            if length == 0:
+                if segment == self._write_segment:
+                    break
+                segment, offset = segment + 1, 0
+                continue
+            start = offset + HEADER.size
+            payload = view[start:start + length]
+            if zlib.crc32(payload) != crc:
+                # Corrupt tail of a sealed segment: skip to the next one
+                segment, offset = segment + 1, 0
+                continue
+            events.append(json.loads(payload))
+            offset = start + length
+        return events, JournalPosition(segment, offset)
+
+    def commit(self, position, consumed):
+        """Persist the cursor after `consumed` events up to `position` were delivered; drop finished segments."""
+        self.cursor = position
+        self.pending = max(0, self.pending - consumed)
+        tmp_path = os.path.join(self.directory, CURSOR_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(f"{position.segment} {position.offset}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, CURSOR_FILE))
+        for segment in self._segments():
+            if segment < position.segment:
+                reader = self._readers.pop(segment, None)
+                if reader is not None:
+                    reader[1].close()
+                    reader[0].close()
+                os.remove(self._segment_path(segment))
+
+    def close(self):
+        self.sync()
+        for f, view in self._readers.values():
+            view.close()
+            f.close()
+        self._readers.clear()
+        self._write_map.close()
+        self._write_file.close()
+
+    # -- helpers ---------------------------------------------------------
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, SEGMENT_PATTERN.format(segment))
+
+    def _segments(self):
+        names = (n for n in os.listdir(self.directory) if n.startswith("segment-") and n.endswith(".log"))
+        return sorted(int(n[len("segment-"):-len(".log")]) for n in names)
+
+    def _open_segment(self, segment, writable=False):
+        path = self._segment_path(segment)
+        if writable:
+            f = open(path, "a+b")
+            if os.fstat(f.fileno()).st_size < self.segment_size:
+                f.truncate(self.segment_size)
+            return f, mmap.mmap(f.fileno(), self.segment_size)
+        f = open(path, "rb")
+        return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _reader(self, segment):
+        if segment == self._write_segment:
+            return self._write_map
+        if segment not in self._readers:
+            self._readers[segment] = self._open_segment(segment)
+        return self._readers[segment][1]
+
+    def _scan_end(self, view):
+        """Find where the valid records of a segment end (recovers from a torn last write)."""
+        offset = 0
+        while offset + HEADER.size <= len(view):
+            length, crc = HEADER.unpack_from(view, offset)
+            start = offset + HEADER.size
+            if length == 0 or start + length > len(view) or zlib.crc32(view[start:start + length]) != crc:
+                break
+            offset = start + length
+        # Zero out anything after the last valid record so readers stop there
+        view[offset:min(len(view), offset + HEADER.size)] = bytes(min(HEADER.size, len(view) - offset))
+        return offset
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                segment, offset = f.read().split()
+            return JournalPosition(int(segment), int(offset))
+        except (OSError, ValueError):
+            segments = self._segments()
+            return JournalPosition(segments[0] if segments else 0, 0)
+
+    def _count_pending(self):
+        count, position = 0, self.cursor
+        while True:
+            events, position = self.read(1024, position)
+            if not events:
+                return count
+            count += len(events)
@@ -29,9 +29,76 @@ options:
         required: false
         type: str
     prompt:
-        description: The query or command to be processed by the LLM. Should be formulated clearly to yield the most accurate and relevant response.
-        required: true
+        description: The query or command to be processed by the LLM. Should be formulated clearly to yield the most accurate and relevant response. One of I(prompt), I(prompts) or I(prompt_template) is required.
+        required: false
+        type: str
+    prompts:
+        description: Several prompts to answer in one task, concurrently. Mutually exclusive with I(prompt) and I(prompt_template).
+        required: false
+        type: list
+        elements: str
+    prompt_template:
+        description: A prompt with C({name}) placeholders, answered once for each item of I(variables).
+        required: false
         type: str
+    variables:
+        description: One dict of placeholder values per prompt built from I(prompt_template).
+        required: false
+        type: list
+        elements: dict
+    max_concurrency:
+        description: Prompts of a batch sent to the LLM at the same time.
+        required: false
+        type: int
+        default: 8
+    rate_limit:
+        description: Maximum LLM calls started per second across a batch. Unset, calls are only limited by I(max_concurrency).
+        required: false
+        type: float
+    cache:
+        description: Reuse the response to the same model, temperature, system_message and prompt from a cache on the controller instead of calling the LLM again. Best suited to low temperatures, where answers to the same question are interchangeable.
+        required: false
+        type: bool
+        default: false
+    cache_path:
+        description: SQLite file of the response cache.
+        required: false
+        type: path
+        default: ~/.cache/langchain_ops/responses.sqlite
+    cache_ttl:
+        description: Seconds a cached response is reused for.
+        required: false
+        type: int
+        default: 86400
+    cache_max_entries:
+        description: Number of responses kept; the least recently used ones are evicted beyond it.
+        required: false
+        type: int
+        default: 10000
+    cache_similarity:
+        description: Opt-in near-duplicate hits. On an exact miss the prompt is embedded and the response to the most similar cached prompt (same model, temperature and system_message) is reused if their cosine similarity is at least this value, for example C(0.98). Unset, only exact prompts hit.
+        required: false
+        type: float
+    progress_file:
+        description: Write the response to this file on the controller as it is generated, so a long answer can be followed with C(tail -f) while the task runs. With a batch, each answer is written once it is complete. The file is truncated at the start of the task.
+        required: false
+        type: path
+
+    gateway:
+        description: Send the request to llm_gateway.py when it is running, which answers without starting a new interpreter and re-importing LangChain and keeps clients and caches warm. Without a gateway the module does the work itself. The gateway uses its own environment, such as OPENAI_API_KEY.
+        required: false
+        type: bool
+        default: true
+    gateway_socket:
+        description: Unix socket llm_gateway.py listens on.
+        required: false
+        type: path
+        default: ~/.cache/langchain_ops/gateway.sock
+    gateway_timeout:
+        description: Seconds to wait for the gateway to accept the request, after which the module does the work itself, and then for its reply, after which the task fails.
+        required: false
+        type: int
+        default: 600
 
 author:
     - Your Name (@vsantiago113)
@@ -49,6 +116,24 @@ EXAMPLES = r'''
 - name: Print AI response
   ansible.builtin.debug:
     msg: "{{ ai['response'] }}"
+
+- name: Per-device VLAN plan, up to 16 prompts at a time
+  vsantiago113.langchain_ops.llm_ollama:
+    model: llama2
+    temperature: 0
+    system_message: As an expert network architect, you answer with IOS commands only.
+    prompt_template: "Give the commands to create VLAN 99 named 'Management' on {hostname} and assign port {port} to it."
+    variables:
+      - {hostname: store001-sw1, port: fa0/5}
+      - {hostname: store002-sw1, port: fa0/7}
+      - {hostname: store003-sw1, port: gi1/0/12}
+    max_concurrency: 16
+    rate_limit: 5
+  register: plan
+
+- name: Print the failed prompts
+  ansible.builtin.debug:
+    msg: "{{ plan['results'] | selectattr('error') | list }}"
 '''
 
 RETURN = r'''
@@ -57,12 +142,47 @@ message:
     type: str
     returned: always
     response: "Of course! I'd be happy to help you configure VLAN 99..."
+cached:
+    description: Whether the response came from the response cache rather than the LLM.
+    type: bool
+    returned: always
+    sample: true
+first_token_latency:
+    description: Seconds until the first piece of the response arrived (the whole lookup on a cache hit).
+    type: float
+    returned: for a single prompt
+    sample: 0.42
+latency:
+    description: Seconds until the response was complete.
+    type: float
+    returned: for a single prompt
+    sample: 6.8
+results:
+    description: With I(prompts) or I(prompt_template), one item per prompt in the order given, with the prompt, the response, whether it was cached, the first-token and total latency in seconds and the error (null when the prompt was answered).
+    type: list
+    elements: dict
+    returned: for batches
+    sample: [{"prompt": "Configure VLAN 99 on store001-sw1", "response": "vlan 99...", "cached": false, "first_token_latency": 0.31, "latency": 1.82, "error": null}]
+failed:
+    description: Number of prompts of a batch that could not be answered.
+    type: int
+    returned: for batches
+    sample: 0
+metrics:
+    description: Seconds spent per stage (C(cache) for response cache lookups and writes, C(generate) for the LLM, summed over the prompts of a batch) and the prompt and completion tokens the LLM reported.
+    type: dict
+    returned: always
+    sample: {"stages": {"cache": 0.002, "generate": 6.41}, "tokens": {"prompt": 38, "completion": 412}}
+gateway:
+    description: Whether llm_gateway.py served the request.
+    type: bool
+    returned: always
+    sample: true
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from langchain_community.llms import Ollama
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import os
+from ansible.module_utils.gateway_client import call
 
 
 def run_module():
@@ -70,29 +190,52 @@ def run_module():
         model=dict(type='str', required=False, default='llama2'),
         temperature=dict(type='float', required=False, default=0.7),
         system_message=dict(type='str', required=False),
-        prompt=dict(type='str', required=True)
+        prompt=dict(type='str', required=False),
+        prompts=dict(type='list', elements='str', required=False),
+        prompt_template=dict(type='str', required=False),
+        variables=dict(type='list', elements='dict', required=False),
+        max_concurrency=dict(type='int', required=False, default=8),
+        rate_limit=dict(type='float', required=False),
+        cache=dict(type='bool', required=False, default=False),
+        cache_path=dict(type='path', required=False, default='~/.cache/langchain_ops/responses.sqlite'),
+        cache_ttl=dict(type='int', required=False, default=86400),
+        cache_max_entries=dict(type='int', required=False, default=10000),
+        cache_similarity=dict(type='float', required=False),
+        progress_file=dict(type='path', required=False),
+        gateway=dict(type='bool', required=False, default=True),
+        gateway_socket=dict(type='path', required=False, default='~/.cache/langchain_ops/gateway.sock'),
+        gateway_timeout=dict(type='int', required=False, default=600)
     )
 
     result = dict(
         changed=False,
-        response=''
+        response='',
+        cached=False
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[('prompt', 'prompts', 'prompt_template')],
+        required_one_of=[('prompt', 'prompts', 'prompt_template')],
+        required_together=[('prompt_template', 'variables')],
         supports_check_mode=False
     )
 
-    llm = Ollama(model=module.params['model'], temperature=module.params['temperature'])  # TODO: Need error handling here
-    prompt = ChatPromptTemplate.from_messages([
-        ('system', module.params['system_message']),
-        ('user', '{input}')
-    ])
-    output_parser = StrOutputParser()
-    chain = prompt | llm | output_parser
-    response = chain.invoke({'input': module.params['prompt']})
-
-    result['response'] = response
+    params = dict(module.params)
+    if params['progress_file']:
+        # The gateway runs in another directory
+        params['progress_file'] = os.path.abspath(params['progress_file'])
+    try:
+        output = call('llm_ollama', params, module.params['gateway_socket'],
+                      module.params['gateway_timeout']) if module.params['gateway'] else None
+        result['gateway'] = output is not None
+        if output is None:
+            # No gateway running: import LangChain and do the work here
+            from ansible.module_utils.llm_tasks import ask_ollama
+            output = ask_ollama(params)
+    except Exception as e:
+        module.fail_json(msg=str(e), **result)
+    result.update(output)
 
     module.exit_json(**result)
 
@@ -35,9 +35,93 @@ options:
         required: true
         type: str
     document:
-        description: A reference document or text providing additional context or information for the LLM to consider when processing the prompt. Useful for complex queries requiring background knowledge.
-        required: true
+        description: A reference document or text providing additional context or information for the LLM to consider when processing the prompt. Useful for complex queries requiring background knowledge. One of I(document) and I(index) is required.
+        required: false
+        type: str
+    index:
+        description: Name of a fleet index built with build_fleet_index.py from runbooks, configs and show output of many devices. It is loaded read-only and a question costs one embedding call plus the search; no document is read, split or embedded. Cannot be used with I(document) or I(context=facts).
+        required: false
         type: str
+    index_dir:
+        description: Directory build_fleet_index.py wrote the fleet indexes to.
+        required: false
+        type: path
+        default: ~/.cache/langchain_ops/indexes
+    sites:
+        description: With I(index), only retrieve chunks of these sites (as matched by the build's site pattern, for example C(store0042)) plus the chunks that belong to no site, such as runbooks. When omitted, the sites named in the prompt are used.
+        required: false
+        type: list
+        elements: str
+    doc_types:
+        description: With I(index), only retrieve chunks of these document types.
+        required: false
+        type: list
+        elements: str
+        choices: [runbook, config, show_output]
+    index_cache:
+        description: Keep the FAISS index built from the document on disk, keyed by the document content, the embedding model and the splitter settings, so unchanged documents are not split and embedded again.
+        required: false
+        type: bool
+        default: true
+    cache_dir:
+        description: Directory on the controller holding the cached indexes.
+        required: false
+        type: path
+        default: ~/.cache/langchain_ops/faiss
+    cache_max_size:
+        description: Size in MB the cached indexes may use before the least recently used ones are evicted.
+        required: false
+        type: int
+        default: 2048
+    embedding_cache:
+        description: Look up chunk embeddings in a local cache keyed by the embedding model and the chunk text hash, and only send the misses to the embedding backend, in batches. Repetitive show outputs across devices embed once.
+        required: false
+        type: bool
+        default: true
+    embedding_cache_path:
+        description: SQLite file of the embedding cache. It is shared with web_retrieval_app.py.
+        required: false
+        type: path
+        default: ~/.cache/langchain_ops/embeddings.sqlite
+    devices:
+        description: Only retrieve CLI output of these devices (the hostname in the C(hostname#command) prompt), or with I(context=facts) only describe these devices in the fact sheet. When omitted, the devices of the document named in the prompt are used, and every device is included if the prompt names none. With I(index), chunks that belong to no device are kept as well.
+        required: false
+        type: list
+        elements: str
+    commands:
+        description: Only retrieve the output of these commands, exactly as typed after the prompt, for example C(show ip route).
+        required: false
+        type: list
+        elements: str
+    top_k:
+        description: Number of chunks passed to the LLM as context. Each chunk of CLI output is the output of one command on one device.
+        required: false
+        type: int
+        default: 4
+    context:
+        description:
+            - How the document is turned into the context of the question.
+            - C(retrieval) embeds the chunks of the document and passes the most similar ones.
+            - C(facts) parses C(show ip route), C(show ip ospf interface), C(show ip protocols), C(show ip interface brief) and the router ospf section of C(show run) into a condensed fact sheet, runs deterministic checks for OSPF mismatches and passes only the fact sheet and the anomalies found. Output of other commands is passed verbatim. No embeddings are computed.
+        required: false
+        type: str
+        choices: [retrieval, facts]
+        default: retrieval
+    gateway:
+        description: Send the request to llm_gateway.py when it is running, which answers without starting a new interpreter and re-importing LangChain and keeps clients and caches warm. Without a gateway the module does the work itself. The gateway uses its own environment, such as OPENAI_API_KEY.
+        required: false
+        type: bool
+        default: true
+    gateway_socket:
+        description: Unix socket llm_gateway.py listens on.
+        required: false
+        type: path
+        default: ~/.cache/langchain_ops/gateway.sock
+    gateway_timeout:
+        description: Seconds to wait for the gateway to accept the request, after which the module does the work itself, and then for its reply, after which the task fails.
+        required: false
+        type: int
+        default: 600
 
 # Specify this value according to your collection
 # in format of namespace.collection.doc_fragment_name
@@ -77,6 +161,15 @@ EXAMPLES = r'''
     document: commands_output.txt
   register: ai
 
+- name: Ask the prebuilt fleet index about one store's switches
+  vsantiago113.langchain_ops.redhat_one_demo:
+    model: gpt-4
+    temperature: 0.2
+    prompt: Why is VLAN 99 missing on the access ports of store0042?
+    index: fleet
+    doc_types: [runbook, show_output]
+  register: fleet_answer
+
 - name: Print AI response
   ansible.builtin.debug:
     msg: "{{ ai['response'] }}"
@@ -89,22 +182,52 @@ message:
     type: str
     returned: always
     response: "Issues Identified..."
+index_cache:
+    description: Whether the document index was loaded from the cache (hit), updated from the previous index of the same document (incremental), built and cached (miss) or built without caching or not needed (disabled).
+    type: str
+    returned: always
+    sample: incremental
+index_update:
+    description: Chunks embedded and added, deleted, and kept as they were when the index was built or updated.
+    type: dict
+    returned: when the index was not a cache hit
+    sample: {"added": 2, "removed": 2, "unchanged": 5}
+embedding_cache:
+    description: Embedding cache hits, misses, hit ratio, seconds spent embedding misses and estimated seconds saved by the hits.
+    type: dict
+    returned: when embedding_cache is true and the index was built
+    sample: {"hits": 120, "misses": 4, "hit_ratio": 0.9677, "embedding_seconds": 0.41, "seconds_saved": 12.3}
+retrieval_filter:
+    description: Metadata filter applied to the chunks before the similarity search, from the devices, commands, sites and doc_types options or the devices and sites named in the prompt.
+    type: dict
+    returned: when retrieval was narrowed to some devices, commands, sites or document types
+    sample: {"device": ["R1"]}
+index:
+    description: The fleet index that answered, its number of chunks, its FAISS index type and when it was built (seconds since the epoch).
+    type: dict
+    returned: when index is set
+    sample: {"name": "fleet", "chunks": 48213, "index_type": "hnsw", "built": 1718000000.0}
+anomalies:
+    description: Findings of the deterministic checks, each with the device, the check name and a detail.
+    type: list
+    elements: dict
+    returned: when context is facts
+    sample: [{"device": "R1", "check": "connected_not_in_ospf", "detail": "1.1.1.0/24 on Loopback0 is not covered by any OSPF network statement"}]
+metrics:
+    description: Seconds spent per stage and the prompt and completion tokens the LLM reported. The stages are C(load) (hashing the document and loading its cached index, parsing the facts, or loading the fleet index), C(split) (reading and chunking the document), C(embed) (embedding the chunks, or with I(index) the question), C(index) (adding them to FAISS and saving it), C(retrieve) (searching, which for a document includes embedding the question) and C(generate) (the LLM). Stages that did not run are left out.
+    type: dict
+    returned: always
+    sample: {"stages": {"load": 0.003, "retrieve": 0.012, "generate": 4.87}, "tokens": {"prompt": 2072, "completion": 310}}
+gateway:
+    description: Whether llm_gateway.py served the request.
+    type: bool
+    returned: always
+    sample: true
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-import sys
-from langchain_community.llms import Ollama
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
-from langchain_community.document_loaders import TextLoader
-from langchain_community.document_loaders import UnstructuredMarkdownLoader
-from langchain_community.document_loaders.csv_loader import CSVLoader
+import os
+from ansible.module_utils.gateway_client import call
 
 
 def run_module():
@@ -114,7 +237,23 @@ def run_module():
         temperature=dict(type='float', required=False, default=0.7),
         system_message=dict(type='str', required=False),
         prompt=dict(type='str', required=True),
-        document=dict(type='str', required=True)
+        document=dict(type='str', required=False),
+        index=dict(type='str', required=False),
+        index_dir=dict(type='path', required=False, default='~/.cache/langchain_ops/indexes'),
+        sites=dict(type='list', elements='str', required=False),
+        doc_types=dict(type='list', elements='str', required=False, choices=['runbook', 'config', 'show_output']),
+        index_cache=dict(type='bool', required=False, default=True),
+        cache_dir=dict(type='path', required=False, default='~/.cache/langchain_ops/faiss'),
+        cache_max_size=dict(type='int', required=False, default=2048),
+        embedding_cache=dict(type='bool', required=False, default=True),
+        embedding_cache_path=dict(type='path', required=False, default='~/.cache/langchain_ops/embeddings.sqlite'),
+        devices=dict(type='list', elements='str', required=False),
+        commands=dict(type='list', elements='str', required=False),
+        top_k=dict(type='int', required=False, default=4),
+        context=dict(type='str', required=False, default='retrieval', choices=['retrieval', 'facts']),
+        gateway=dict(type='bool', required=False, default=True),
+        gateway_socket=dict(type='path', required=False, default='~/.cache/langchain_ops/gateway.sock'),
+        gateway_timeout=dict(type='int', required=False, default=600)
     )
 
     # seed the result dict in the object
@@ -124,7 +263,8 @@ def run_module():
     # for consumption, for example, in a subsequent task
     result = dict(
         changed=False,
-        response=''
+        response='',
+        index_cache='disabled'
     )
 
     # the AnsibleModule object will be our abstraction working with Ansible
@@ -133,6 +273,8 @@ def run_module():
     # supports check mode
     module = AnsibleModule(
         argument_spec=module_args,
+        required_one_of=[('document', 'index')],
+        mutually_exclusive=[('document', 'index')],
         supports_check_mode=False
     )
 
@@ -144,61 +286,21 @@ def run_module():
 
     # manipulate or modify the state as needed (this is going to be the
     # part where your module will do what it needs to do)
-
-    if module.params['model'] in ['llama2', 'llama-pro']:
-        llm = Ollama(model=module.params['model'], temperature=0.0)
-        embeddings = OllamaEmbeddings()
-    elif module.params['model'] in ['gpt-4', 'gpt-3.5-turbo']:
-        llm = ChatOpenAI(model=module.params['model'], temperature=0.0)
-        embeddings = OpenAIEmbeddings()
-    else:
-        sys.exit('Error: Model not found!')
-
-    document = module.params['document']
-    if document.lower().endswith('.md'):
-        loader = UnstructuredMarkdownLoader(document)
-    elif document.lower().endswith('.csv'):
-        loader = CSVLoader(file_path=document, csv_args={
-        'delimiter': ',',
-        'quotechar': '"'
-    })
-    else:
-        loader = TextLoader(document)
-
-    docs = loader.load()
-
-    text_splitter = RecursiveCharacterTextSplitter()
-    documents = text_splitter.split_documents(docs)
-    vector = FAISS.from_documents(documents, embeddings)
-
-    prompt = ChatPromptTemplate.from_template(
-        '''
-{system_message}
-                                        
-Your task is to utilize the information provided below to answer the question. 
-If the context does not contain enough information to formulate a conclusive 
-answer, your response should be "I don't know".
-
-<context>
-{context}
-</context>
-
-Question: {input}
-    ''')
-
-    document_chain = create_stuff_documents_chain(llm, prompt)
-
-    retriever = vector.as_retriever()
-    retrieval_chain = create_retrieval_chain(retriever, document_chain)
-
-    response = retrieval_chain.invoke(
-            {
-                'input': module.params['prompt'],
-                'system_message': module.params['system_message']
-            }
-        )
-
-    result['response'] = response['answer']
+    params = dict(module.params)
+    # The gateway runs in another directory
+    if params['document']:
+        params['document'] = os.path.abspath(params['document'])
+    try:
+        output = call('redhat_one_demo', params, module.params['gateway_socket'],
+                      module.params['gateway_timeout']) if module.params['gateway'] else None
+        result['gateway'] = output is not None
+        if output is None:
+            # No gateway running: import LangChain and do the work here
+            from ansible.module_utils.llm_tasks import ask_document
+            output = ask_document(params)
+    except Exception as e:
+        module.fail_json(msg=str(e), **result)
+    result.update(output)
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+import traceback
+
+from module_utils.gateway_client import SOCKET_PATH
+from module_utils.llm_tasks import TASKS, TaskError
+
+# Requests are newline-terminated JSON objects {"task": ..., "params": ...}; the reply is
+# {"result": ...} or {"error": ...} and the connection is closed after it.
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+
+class GatewayHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        started = time.time()
+        line = self.rfile.readline(MAX_REQUEST_SIZE)
+        task = None
+        try:
+            request = json.loads(line)
+            task = request["task"]
+            if task not in TASKS:
+                raise TaskError(f"Unknown task {task!r}")
+            reply = dict(result=TASKS[task](request["params"]))
+        except TaskError as e:
+            reply = dict(error=str(e))
+        except Exception as e:
+            traceback.print_exc()
+            reply = dict(error=f"{type(e).__name__}: {e}")
+        self.server.count(task, "error" not in reply)
+        self.wfile.write(json.dumps(reply).encode("utf-8"))
+        print(f"{task} {'ok' if 'error' not in reply else 'error'} in {time.time() - started:.3f}s")
+
+
+class Gateway(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve the work of the llm_* and redhat_one_demo modules from one warm process.
+
+    LLM and embedding clients, their HTTP connection pools, response caches and the
+    FAISS indexes loaded last are kept in module_utils.llm_tasks between requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        if os.path.exists(path):
+            os.unlink(path)
+        # Only the user running the playbooks may connect
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, GatewayHandler)
+        finally:
+            os.umask(umask)
+        self._lock = threading.Lock()
+        self.stats = dict(requests=0, errors=0)
+
+    def count(self, task, ok):
+        with self._lock:
+            self.stats["requests"] += 1
+            if not ok:
+                self.stats["errors"] += 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the LLM Ansible modules from a long-lived process.")
+    parser.add_argument("--socket", default=SOCKET_PATH,
+                        help="Unix socket to listen on; the modules' gateway_socket option must match.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = Gateway(args.socket)
+    print(f"LLM gateway listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+        print(f"Served {server.stats['requests']} requests, {server.stats['errors']} errors")
@@ -0,0 +1,60 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import re
+
+# "R1#show ip route", "SW1(config)#vlan 99", "core-sw.lab#show run | section router ospf"
+PROMPT_PATTERN = re.compile(r'^(?P<device>[A-Za-z][\w.-]*)(?:\([\w-]+\))?#[ \t]*(?P<command>\S[^\r\n]*?)[ \t]*$',
+                            re.MULTILINE)
+
+
+def iter_prompt_blocks(lines):
+    """Split CLI output on prompt lines, yielding (device, command, block) per command.
+
+    `lines` is any iterable of lines with their line endings, such as an open file, so
+    output of any size is split without reading it whole. The block includes its prompt
+    line. Text before the first prompt is yielded with device and command set to None.
+    A block only changes when that command's output changes, which keeps chunk
+    boundaries stable between two captures of the same devices.
+    """
+    block, device, command = [], None, None
+    for line in lines:
+        match = PROMPT_PATTERN.match(line)
+        if match is not None:
+            text = ''.join(block)
+            if text.strip():
+                yield device, command, text.strip('\n')
+            block, device, command = [], match.group('device'), match.group('command')
+        block.append(line)
+    text = ''.join(block)
+    if text.strip():
+        yield device, command, text.strip('\n')
+
+
+def devices_in_prompt(devices, prompt):
+    """The hostnames among `devices` that the prompt mentions as a whole word, sorted."""
+    return sorted(device for device in devices
+                  if re.search(r'(?<![\w.-])%s(?![\w-])' % re.escape(device), prompt, re.IGNORECASE))
+
+
+def metadata_filter(vector, prompt, devices=None, commands=None):
+    """FAISS metadata filter for a question, or None to search every chunk.
+
+    Explicit devices/commands win; otherwise the devices of the index whose hostname
+    appears in the prompt ("why is R1 not advertising its loopback?") are used.
+    """
+    if not devices:
+        known = set()
+        for doc_id in vector.index_to_docstore_id.values():
+            device = vector.docstore.search(doc_id).metadata.get('device')
+            if device:
+                known.add(device)
+        devices = devices_in_prompt(known, prompt)
+    search_filter = {}
+    if devices:
+        search_filter['device'] = list(devices)
+    if commands:
+        search_filter['command'] = list(commands)
+    return search_filter or None
@@ -0,0 +1,45 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+# Kept apart from cli_chunker so that using the prompt parsing does not import LangChain
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+
+try:
+    from ansible.module_utils.cli_chunker import iter_prompt_blocks
+except ImportError:
+    from module_utils.cli_chunker import iter_prompt_blocks
+
+
+class CliOutputSplitter(TextSplitter):
+    """Text splitter for Cisco CLI output: one chunk per (device, command) block.
+
+    Chunks carry the device and command as metadata, so retrieval can be narrowed to
+    the devices a question is about, and R1 and R2 output never share a chunk. Blocks
+    longer than chunk_size are split further with RecursiveCharacterTextSplitter.
+    """
+
+    def __init__(self, chunk_size=4000, chunk_overlap=200, **kwargs):
+        super(CliOutputSplitter, self).__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._block_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def split_text(self, text):
+        return [document.page_content for document in self.iter_documents(text.splitlines(True))]
+
+    def split_documents(self, documents):
+        chunks = []
+        for document in documents:
+            chunks.extend(self.iter_documents(document.page_content.splitlines(True), document.metadata))
+        return chunks
+
+    def iter_documents(self, lines, metadata=None):
+        """Yield the chunks of `lines` (any iterable of lines, e.g. an open file) as Documents."""
+        for device, command, block in iter_prompt_blocks(lines):
+            block_metadata = dict(metadata or {})
+            if device is not None:
+                block_metadata.update(device=device, command=command)
+            pieces = self._block_splitter.split_text(block) if len(block) > self._chunk_size else [block]
+            for piece in pieces:
+                yield Document(page_content=piece, metadata=block_metadata)
@@ -0,0 +1,159 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+CACHE_PATH = os.path.expanduser('~/.cache/langchain_ops/embeddings.sqlite')
+
+# Cache misses are sent to the embedding backend this many texts at a time
+BATCH_SIZE = 64
+
+# SQLite's default limit of host parameters per statement is 999
+LOOKUP_CHUNK = 900
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, hash)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS models (
+    model TEXT PRIMARY KEY,
+    embedded INTEGER NOT NULL,
+    seconds REAL NOT NULL
+);
+'''
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def _pack(vector):
+    return array('f', vector).tobytes()
+
+
+def _unpack(blob):
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an embedding backend with a content-addressed SQLite cache keyed by (model, SHA-256 of the text).
+
+    Vectors are stored as float32, so a cached vector and a freshly computed one are
+    returned with the same precision.
+    """
+
+    def __init__(self, backend, model, path=CACHE_PATH, batch_size=BATCH_SIZE):
+        self.backend = backend
+        self.model = model
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Streamlit serves sessions from several threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.embedding_seconds = 0.0
+
+    def embed_documents(self, texts):
+        hashes = [_text_hash(text) for text in texts]
+        found = self._lookup(set(hashes))
+        missing = {}
+        for text, digest in zip(texts, hashes):
+            if digest not in found and digest not in missing:
+                missing[digest] = text
+        misses = sum(1 for digest in hashes if digest in missing)
+        self.hits += len(texts) - misses
+        self.misses += misses
+
+        items = list(missing.items())
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            started = time.time()
+            vectors = self.backend.embed_documents([text for digest, text in batch])
+            self._store(batch, vectors, time.time() - started)
+            for (digest, text), vector in zip(batch, vectors):
+                found[digest] = _unpack(_pack(vector))
+        return [found[digest] for digest in hashes]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        """Hit ratio and an estimate of the embedding time the cache saved in this run."""
+        total = self.hits + self.misses
+        seconds_per_text = self._seconds_per_text()
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=round(float(self.hits) / total, 4) if total else 0.0,
+            embedding_seconds=round(self.embedding_seconds, 3),
+            seconds_saved=round(self.hits * seconds_per_text, 3),
+        )
+
+    def _lookup(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        with self._lock:
+            for start in range(0, len(hashes), LOOKUP_CHUNK):
+                chunk = hashes[start:start + LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    'SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN (%s)' % ','.join('?' * len(chunk)),
+                    [self.model] + chunk)
+                for digest, blob in rows:
+                    found[bytes(digest)] = _unpack(blob)
+        return found
+
+    def _store(self, batch, vectors, seconds):
+        self.embedding_seconds += seconds
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)',
+                [(self.model, digest, _pack(vector)) for (digest, text), vector in zip(batch, vectors)])
+            # Running totals per model, so a run with 100% hits can still say what it saved
+            self._db.execute(
+                'INSERT INTO models (model, embedded, seconds) VALUES (?, ?, ?) '
+                'ON CONFLICT(model) DO UPDATE SET embedded = embedded + excluded.embedded, '
+                'seconds = seconds + excluded.seconds',
+                (self.model, len(batch), seconds))
+
+    def _seconds_per_text(self):
+        with self._lock:
+            row = self._db.execute('SELECT embedded, seconds FROM models WHERE model = ?', (self.model,)).fetchone()
+        if not row or not row[0]:
+            return 0.0
+        return row[1] / row[0]
+
+
+class TimedEmbeddings(Embeddings):
+    """Add the seconds spent in an embedding backend to a stage of a metrics.StageTimer."""
+
+    def __init__(self, backend, timer, stage='embed'):
+        self.backend = backend
+        self.timer = timer
+        self.stage = stage
+
+    def embed_documents(self, texts):
+        with self.timer.stage(self.stage):
+            return self.backend.embed_documents(texts)
+
+    def embed_query(self, text):
+        with self.timer.stage(self.stage):
+            return self.backend.embed_query(text)
@@ -0,0 +1,284 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import math
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+
+try:
+    from ansible.module_utils.cli_chunker import devices_in_prompt
+    from ansible.module_utils.index_cache import document_ids
+    from ansible.module_utils.streaming_loader import iter_batches, iter_documents
+except ImportError:
+    from module_utils.cli_chunker import devices_in_prompt
+    from module_utils.index_cache import document_ids
+    from module_utils.streaming_loader import iter_batches, iter_documents
+
+INDEX_DIR = os.path.expanduser('~/.cache/langchain_ops/indexes')
+
+MANIFEST_FILE = 'manifest.json'
+INDEX_FILE = 'index.faiss'
+CHUNKS_FILE = 'chunks.pkl'
+
+# Document types a source can be indexed as
+DOC_TYPES = ('runbook', 'config', 'show_output')
+SOURCE_SUFFIXES = ('.txt', '.md', '.csv')
+
+# The site of a chunk is the first match in its device's hostname, else in its path
+SITE_PATTERN = r'store\d+'
+
+# Up to FLAT_MAX chunks the index is searched exhaustively; above it 'auto' builds HNSW
+FLAT_MAX = 20000
+INDEX_TYPES = ('auto', 'flat', 'hnsw', 'ivf')
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+
+# A filter selecting at most this many chunks is answered exactly from their vectors
+EXACT_MAX = 20000
+
+# Metadata a search can be narrowed by. Chunks without a site or device (runbooks,
+# fleet-wide configs) apply everywhere, so a site or device filter keeps them.
+FILTER_FIELDS = ('site', 'device', 'doc_type', 'command')
+SCOPED_FIELDS = ('site', 'device')
+
+EMBED_BATCH_SIZE = 256
+
+
+def index_path(index_dir, name):
+    if not re.match(r'^[\w.-]+$', name) or name.startswith('.'):
+        raise ValueError('Index names may only contain letters, digits, ".", "_" and "-": %r' % name)
+    return os.path.join(index_dir, name)
+
+
+def iter_source_files(sources):
+    """(file, doc_type) for each (path, doc_type) source, walking directories in name order."""
+    for path, doc_type in sources:
+        if not os.path.isdir(path):
+            yield path, doc_type
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(SOURCE_SUFFIXES) and not name.startswith('.'):
+                    yield os.path.join(root, name), doc_type
+
+
+def iter_fleet_documents(sources, chunk_size, chunk_overlap, site_pattern=SITE_PATTERN):
+    """The chunks of every source file, with doc_type and (where one is found) site added to their metadata."""
+    site_search = re.compile(site_pattern, re.IGNORECASE).search
+    for path, doc_type in iter_source_files(sources):
+        for document in iter_documents(path, chunk_size, chunk_overlap):
+            document.metadata['doc_type'] = doc_type
+            match = site_search(document.metadata.get('device') or '') or site_search(path)
+            if match:
+                document.metadata['site'] = match.group(0).lower()
+            yield document
+
+
+def create_faiss_index(vectors, index_type='auto'):
+    """A FAISS index holding vectors (float32, n x d): exact below FLAT_MAX, HNSW or IVF above."""
+    import faiss
+
+    count, dimension = vectors.shape
+    if index_type == 'auto':
+        index_type = 'flat' if count <= FLAT_MAX else 'hnsw'
+    if index_type == 'flat':
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == 'ivf':
+        # About 4 * sqrt(n) lists, with enough points per list to train the centroids
+        lists = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, lists)
+        index.train(vectors)
+    else:
+        raise ValueError('index_type must be one of %s' % ', '.join(INDEX_TYPES))
+    index.add(vectors)
+    return index, index_type
+
+
+def build_fleet_index(path, sources, embeddings, manifest, chunk_size, chunk_overlap, index_type='auto',
+                      site_pattern=SITE_PATTERN, batch_size=EMBED_BATCH_SIZE):
+    """Embed every chunk of sources and write the store to path, replacing what was there.
+
+    manifest says which embeddings were used (provider, embedding_model); the counts,
+    index type and sources are added to it. Returns the manifest as written.
+    """
+    import numpy
+
+    chunks, batches, seen = [], [], set()
+    for batch in iter_batches(iter_fleet_documents(sources, chunk_size, chunk_overlap, site_pattern), batch_size):
+        # Identical chunks (same text and metadata) are only indexed once
+        new = []
+        for chunk_id, document in zip(document_ids(batch), batch):
+            if chunk_id not in seen:
+                seen.add(chunk_id)
+                new.append(document)
+        if new:
+            batches.append(numpy.asarray(embeddings.embed_documents([d.page_content for d in new]), dtype='float32'))
+            chunks.extend((document.page_content, document.metadata) for document in new)
+    if not chunks:
+        raise ValueError('The sources do not contain any text to index.')
+    index, index_type = create_faiss_index(numpy.vstack(batches), index_type)
+
+    import faiss
+
+    manifest = dict(manifest, chunks=len(chunks), dimension=index.d, index_type=index_type, built=time.time(),
+                    sources=[dict(path=os.path.abspath(source), doc_type=doc_type) for source, doc_type in sources])
+    parent = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        faiss.write_index(index, os.path.join(tmp_path, INDEX_FILE))
+        with open(os.path.join(tmp_path, CHUNKS_FILE), 'wb') as f:
+            pickle.dump(chunks, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    # The old store is moved aside rather than deleted until the new one is in place: a
+    # reader only misses the store between two renames, and a failed swap puts it back
+    old_path = tempfile.mkdtemp(dir=parent, prefix='.old-')
+    old_store = os.path.join(old_path, 'store')
+    try:
+        if os.path.exists(path):
+            os.rename(path, old_store)
+        try:
+            os.rename(tmp_path, path)
+        except Exception:
+            if os.path.exists(old_store):
+                os.rename(old_store, path)
+            raise
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.exists(old_store):
+            shutil.rmtree(old_path, ignore_errors=True)
+        raise
+    # Readers keep the old files open (or in memory)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+class FleetIndex(object):
+    """A prebuilt store loaded read-only: its FAISS index, chunks and posting lists of their metadata."""
+
+    def __init__(self, index, chunks, manifest):
+        self.index = index
+        self.chunks = chunks
+        self.manifest = manifest
+        # field -> value -> chunk positions, and the positions without a value for scoped fields
+        self.postings = dict((field, {}) for field in FILTER_FIELDS)
+        self.unscoped = dict((field, []) for field in SCOPED_FIELDS)
+        for position, (text, metadata) in enumerate(chunks):
+            for field in FILTER_FIELDS:
+                value = metadata.get(field)
+                if value is not None:
+                    self.postings[field].setdefault(value, []).append(position)
+                elif field in self.unscoped:
+                    self.unscoped[field].append(position)
+
+    @classmethod
+    def load(cls, path):
+        import faiss
+
+        manifest = read_manifest(path)
+        index_file = os.path.join(path, INDEX_FILE)
+        index = None
+        if manifest['index_type'] == 'flat':
+            try:
+                index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                pass
+        if index is None:
+            index = faiss.read_index(index_file)
+        if manifest['index_type'] == 'hnsw':
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        elif manifest['index_type'] == 'ivf':
+            index.nprobe = IVF_NPROBE
+            # Filtered searches read vectors back by position
+            index.make_direct_map()
+        # The chunks pickle is one build_fleet_index() wrote
+        with open(os.path.join(path, CHUNKS_FILE), 'rb') as f:
+            chunks = pickle.load(f)
+        return cls(index, chunks, manifest)
+
+    def values(self, field):
+        return set(self.postings[field])
+
+    def select(self, search_filter):
+        """Positions of the chunks matching search_filter ({field: [values]}), sorted."""
+        selected = None
+        for field, values in search_filter.items():
+            positions = set()
+            for value in values:
+                positions.update(self.postings[field].get(value, ()))
+            positions.update(self.unscoped.get(field, ()))
+            selected = positions if selected is None else selected & positions
+        return sorted(selected)
+
+    def search(self, vector, k=4, search_filter=None):
+        """The k chunks nearest to vector (among those matching search_filter) as LangChain Documents."""
+        import numpy
+        from langchain_core.documents import Document
+
+        query = numpy.asarray([vector], dtype='float32')
+        if not search_filter:
+            distances, positions = self.index.search(query, k)
+            positions = [position for position in positions[0] if position >= 0]
+        else:
+            selected = numpy.asarray(self.select(search_filter), dtype='int64')
+            if not len(selected):
+                positions = []
+            elif len(selected) <= EXACT_MAX or self.manifest['index_type'] == 'flat':
+                # Exact distances to the selected vectors only
+                vectors = self.index.reconstruct_batch(selected)
+                distances = ((vectors - query) ** 2).sum(axis=1)
+                nearest = numpy.argsort(distances)[:k]
+                positions = selected[nearest].tolist()
+            else:
+                positions = self._search_selected(query, selected, k)
+        return [Document(page_content=self.chunks[position][0], metadata=dict(self.chunks[position][1]))
+                for position in positions]
+
+    def _search_selected(self, query, selected, k):
+        import faiss
+
+        selector = faiss.IDSelectorBatch(selected)
+        if self.manifest['index_type'] == 'hnsw':
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(HNSW_EF_SEARCH, k))
+        else:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=IVF_NPROBE)
+        distances, positions = self.index.search(query, k, params=params)
+        return [position for position in positions[0] if position >= 0]
+
+
+def fleet_filter(store, prompt, devices=None, sites=None, doc_types=None, commands=None):
+    """Metadata filter for a question, or None to search every chunk.
+
+    Explicit devices/sites win; otherwise the devices and sites of the store that the
+    prompt names are used. doc_types and commands are only ever given explicitly.
+    """
+    search_filter = {}
+    devices = devices or devices_in_prompt(store.values('device'), prompt)
+    sites = [site.lower() for site in sites] if sites else devices_in_prompt(store.values('site'), prompt)
+    for field, values in (('device', devices), ('site', sites), ('doc_type', doc_types), ('command', commands)):
+        if values:
+            search_filter[field] = list(values)
+    return search_filter or None
@@ -0,0 +1,64 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import errno
+import json
+import os
+import socket
+
+# Only the standard library is imported here: a module that is answered by the
+# gateway never pays for importing langchain.
+SOCKET_PATH = os.path.expanduser('~/.cache/langchain_ops/gateway.sock')
+
+# Errors meaning no gateway is running, or its backlog is full because it stopped
+# accepting (a Unix socket then fails with EAGAIN at once), so the module does the work itself
+ABSENT = (errno.ENOENT, errno.ECONNREFUSED, errno.EAGAIN)
+
+# Seconds to wait for the gateway to accept the request and then to reply to it. A
+# gateway that does not accept in time is treated as absent; one that takes the
+# request but goes quiet is an error, since the task may still be running there.
+TIMEOUT = 600
+
+
+class GatewayError(Exception):
+    pass
+
+
+def call(task, params, path=SOCKET_PATH, timeout=TIMEOUT):
+    """Run task (llm_openai, llm_ollama or redhat_one_demo) in llm_gateway.py.
+
+    Returns the module result, or None when no gateway listens on path or it does not
+    accept the connection within timeout seconds. Errors raised by the task in the
+    gateway, and no reply within timeout seconds, are raised here as GatewayError.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(path)
+        except socket.timeout:
+            return None
+        except socket.error as e:
+            if e.errno in ABSENT:
+                return None
+            raise
+        chunks = []
+        try:
+            sock.sendall(json.dumps(dict(task=task, params=params)).encode('utf-8') + b'\n')
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except socket.timeout:
+            raise GatewayError('The gateway at %s did not reply within %s seconds' % (path, timeout))
+    finally:
+        sock.close()
+    if not chunks:
+        raise GatewayError('The gateway closed the connection without a reply')
+    reply = json.loads(b''.join(chunks).decode('utf-8'))
+    if 'error' in reply:
+        raise GatewayError(reply['error'])
+    return reply['result']
@@ -0,0 +1,195 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+try:
+    from ansible.module_utils.streaming_loader import iter_batches
+except ImportError:
+    from module_utils.streaming_loader import iter_batches
+
+CACHE_DIR = os.path.expanduser('~/.cache/langchain_ops/faiss')
+MAX_CACHE_SIZE_MB = 2048
+
+INDEX_FILE = 'index.faiss'
+DOCSTORE_FILE = 'index.pkl'
+
+# Chunks embedded and added to the index per step when building from a stream
+EMBED_BATCH_SIZE = 256
+
+# Pointers from a lineage (a document path + model + settings) to its latest entry
+LINEAGE_DIR = '.lineage'
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks so large documents are not loaded whole."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def embedding_model_name(embeddings):
+    """Identify the embedding backend and model, e.g. 'OpenAIEmbeddings:text-embedding-ada-002'."""
+    model = getattr(embeddings, 'model', None) or getattr(embeddings, 'model_name', None)
+    return '%s:%s' % (type(embeddings).__name__, model)
+
+
+def cache_key(content_hash, embedding_model, splitter_settings):
+    """Cache key of an index: the document content, the embedding model and how it was split."""
+    material = json.dumps([content_hash, embedding_model, splitter_settings], sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def document_ids(documents):
+    """Content-derived ID of each chunk: the same text with the same metadata always gets the same ID."""
+    ids = []
+    for document in documents:
+        material = json.dumps([document.metadata, document.page_content], sort_keys=True, default=str)
+        ids.append(hashlib.sha256(material.encode('utf-8')).hexdigest())
+    return ids
+
+
+def build_index(documents, embeddings, previous=None, batch_size=EMBED_BATCH_SIZE):
+    """Build a FAISS store for documents, or bring `previous` up to date with them.
+
+    documents can be any iterable, such as a streaming loader: chunks are embedded and
+    added batch_size at a time, so besides the index itself only one batch is in memory.
+    With a previous store only the chunks whose ID is new get embedded, and chunks
+    that are gone are deleted by ID. Returns (vector store, counts).
+    """
+    from langchain_community.vectorstores import FAISS
+
+    vector = previous
+    existing = set(previous.index_to_docstore_id.values()) if previous is not None else set()
+    seen = set()
+    added = 0
+    for batch in iter_batches(documents, batch_size):
+        ids, new_documents = [], []
+        for chunk_id, document in zip(document_ids(batch), batch):
+            # Identical chunks (same text and metadata) are only indexed once
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            if chunk_id not in existing:
+                ids.append(chunk_id)
+                new_documents.append(document)
+        if not ids:
+            continue
+        if vector is None:
+            vector = FAISS.from_documents(new_documents, embeddings, ids=ids)
+        else:
+            vector.add_documents(new_documents, ids=ids)
+        added += len(ids)
+
+    if vector is None:
+        raise ValueError('The document does not contain any text to index.')
+    removed = [chunk_id for chunk_id in existing if chunk_id not in seen]
+    if removed:
+        vector.delete(removed)
+    return vector, dict(added=added, removed=len(removed), unchanged=len(seen) - added)
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(path) for name in files)
+
+
+class IndexCache:
+    """FAISS indexes saved on disk by cache key, evicted least recently used first once over max_bytes."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_SIZE_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key, embeddings):
+        """Return the cached FAISS vector store for key, or None on a miss."""
+        path = self.path(key)
+        if not os.path.exists(os.path.join(path, INDEX_FILE)):
+            return None
+        # The directory mtime is the "last used" time the eviction goes by
+        os.utime(path, None)
+        return load_index(path, embeddings)
+
+    def load_lineage(self, lineage, embeddings):
+        """Return a writable copy of the latest index saved for lineage, or None."""
+        try:
+            with open(os.path.join(self.cache_dir, LINEAGE_DIR, lineage)) as f:
+                key = f.read().strip()
+        except (IOError, OSError):
+            return None
+        path = self.path(key)
+        if not os.path.exists(os.path.join(path, INDEX_FILE)):
+            return None
+        return load_index(path, embeddings, mmap=False)
+
+    def save(self, key, vector, lineage=None):
+        """Store a vector store under key (atomically) and evict old entries if over budget.
+
+        With a lineage, the entry also becomes the base for the next incremental update.
+        """
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            vector.save_local(tmp_path)
+            if os.path.exists(self.path(key)):
+                shutil.rmtree(self.path(key))
+            os.rename(tmp_path, self.path(key))
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        if lineage is not None:
+            lineage_dir = os.path.join(self.cache_dir, LINEAGE_DIR)
+            if not os.path.isdir(lineage_dir):
+                os.makedirs(lineage_dir)
+            with open(os.path.join(lineage_dir, lineage), 'w') as f:
+                f.write(key)
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path) and not name.startswith('.') and name != keep:
+                entries.append((os.path.getmtime(path), _dir_size(path), path))
+        total = sum(size for mtime, size, path in entries)
+        if keep is not None and os.path.isdir(self.path(keep)):
+            total += _dir_size(self.path(keep))
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def load_index(path, embeddings, mmap=True):
+    """Load a FAISS store written by save_local(), memory-mapping the index (read-only) unless mmap is False."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+    faiss = dependable_faiss_import()
+    index_path = os.path.join(path, INDEX_FILE)
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type supports mmap
+            pass
+    if index is None:
+        index = faiss.read_index(index_path)
+    # The docstore pickle is one we wrote ourselves into the cache directory
+    with open(os.path.join(path, DOCSTORE_FILE), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
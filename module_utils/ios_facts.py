@@ -0,0 +1,305 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import ipaddress
+import re
+
+try:
+    from ansible.module_utils.cli_chunker import iter_prompt_blocks
+except ImportError:
+    from module_utils.cli_chunker import iter_prompt_blocks
+
+# Routes listed per device in the fact sheet; the rest are counted
+MAX_ROUTES = 50
+
+# Commands are matched abbreviated as well ("sh ip ro", "show ip ospf int lo0")
+ROUTE_COMMAND = re.compile(r'^sh\w*\s+ip\s+ro', re.IGNORECASE)
+OSPF_INTERFACE_COMMAND = re.compile(r'^sh\w*\s+ip\s+ospf\s+int', re.IGNORECASE)
+PROTOCOLS_COMMAND = re.compile(r'^sh\w*\s+ip\s+prot', re.IGNORECASE)
+RUNNING_CONFIG_COMMAND = re.compile(r'^sh\w*\s+run', re.IGNORECASE)
+INTERFACE_BRIEF_COMMAND = re.compile(r'^sh\w*\s+ip\s+int\w*\s+br', re.IGNORECASE)
+
+# "O 2.2.2.2/32 [110/2] via 192.168.12.2, 00:00:14, FastEthernet0/0", "C 2.2.2.0 is directly connected, Loopback0"
+ROUTE_PATTERN = re.compile(r'^\s*(?P<code>[A-Za-z]\*?(?:\s+(?:IA|E1|E2|N1|N2|L1|L2|ia|su))?)\s+'
+                           r'(?P<network>\d+\.\d+\.\d+\.\d+)(?:/(?P<length>\d+))?\s+'
+                           r'(?:\[\d+/\d+\]\s+via\s+(?P<next_hop>\d+\.\d+\.\d+\.\d+)|is directly connected)'
+                           r'(?P<rest>.*)$')
+# "2.0.0.0/24 is subnetted, 1 subnets" sets the mask of the routes listed under it
+SUBNETTED_PATTERN = re.compile(r'^\s*\d+\.\d+\.\d+\.\d+/(?P<length>\d+) is (?P<variably>variably )?subnetted')
+AGE_PATTERN = re.compile(r'^(?:\d+:\d+:\d+|\d+[wdhm]\w*)$')
+NETWORK_PATTERN = re.compile(r'^\s*(?:network\s+)?(?P<address>\d+\.\d+\.\d+\.\d+)\s+(?P<wildcard>\d+\.\d+\.\d+\.\d+)'
+                             r'\s+area\s+(?P<area>\S+)')
+ROUTER_OSPF_PATTERN = re.compile(r'^router ospf (?P<process>\d+)')
+OSPF_DISABLED_PATTERN = re.compile(r'OSPF not enabled on (?P<interface>\S+)')
+OSPF_INTERFACE_PATTERN = re.compile(r'^(?P<interface>\S+) is (?:administratively )?(?:up|down), line protocol')
+OSPF_ADDRESS_PATTERN = re.compile(r'Internet Address (?P<address>[\d.]+/\d+), Area (?P<area>\S+)')
+OSPF_NETWORK_TYPE_PATTERN = re.compile(r'Network Type (?P<network_type>[\w-]+)')
+BRIEF_PATTERN = re.compile(r'^(?P<interface>\S+)\s+(?P<address>\d+\.\d+\.\d+\.\d+|unassigned)\s+\S+\s+\S+\s+'
+                           r'(?P<status>administratively down|up|down)\s+(?P<protocol>up|down)')
+
+# "10   Users                            active    Gi1/0/1, Gi1/0/2"; more ports wrap onto indented lines
+VLAN_BRIEF_PATTERN = re.compile(r'^(?P<vlan>\d+)\s+(?P<name>\S+)\s+(?P<status>(?:act|sus)\w*(?:/\w+)?|active|suspended)'
+                                r'\s*(?P<ports>.*)$')
+HOSTNAME_PATTERN = re.compile(r'^hostname (?P<hostname>\S+)')
+VLAN_SECTION_PATTERN = re.compile(r'^vlan (?P<vlan>\d+)$')
+
+
+def _classful_length(network):
+    first = int(network.split('.')[0])
+    return 8 if first < 128 else 16 if first < 192 else 24
+
+
+def parse_routes(text):
+    """Routes of "show ip route" as dicts with code, prefix, next_hop and interface."""
+    routes, subnetted_length = [], None
+    for line in text.splitlines():
+        header = SUBNETTED_PATTERN.match(line)
+        if header is not None:
+            subnetted_length = None if header.group('variably') else int(header.group('length'))
+            continue
+        match = ROUTE_PATTERN.match(line)
+        if match is None:
+            continue
+        length = match.group('length') or subnetted_length or _classful_length(match.group('network'))
+        fields = [field.strip() for field in match.group('rest').split(',') if field.strip()]
+        interface = fields[-1] if fields and not AGE_PATTERN.match(fields[-1]) else None
+        routes.append(dict(code=' '.join(match.group('code').split()),
+                           prefix='%s/%s' % (match.group('network'), length),
+                           next_hop=match.group('next_hop'), interface=interface))
+    return routes
+
+
+def parse_ospf_networks(text):
+    """OSPF network statements of "show ip protocols" or the router ospf section of the config."""
+    return [dict(address=match.group('address'), wildcard=match.group('wildcard'), area=match.group('area'))
+            for match in map(NETWORK_PATTERN.match, text.splitlines()) if match is not None]
+
+
+def parse_ospf_interfaces(text):
+    """Interfaces of "show ip ospf interface", keyed by name, with enabled, address, area and network_type."""
+    interfaces, current = {}, None
+    for line in text.splitlines():
+        line = line.strip()
+        disabled = OSPF_DISABLED_PATTERN.search(line)
+        if disabled is not None:
+            interfaces[disabled.group('interface')] = dict(enabled=False)
+            current = None
+            continue
+        match = OSPF_INTERFACE_PATTERN.match(line)
+        if match is not None:
+            current = interfaces.setdefault(match.group('interface'), dict(enabled=True))
+            continue
+        if current is None:
+            continue
+        match = OSPF_ADDRESS_PATTERN.search(line)
+        if match is not None:
+            current.update(address=match.group('address'), area=match.group('area'))
+        match = OSPF_NETWORK_TYPE_PATTERN.search(line)
+        if match is not None:
+            current['network_type'] = match.group('network_type')
+    return interfaces
+
+
+def parse_interface_brief(text):
+    """Interfaces of "show ip interface brief", keyed by name, with address, status and protocol."""
+    return dict((match.group('interface'), dict(address=match.group('address'), status=match.group('status'),
+                                                protocol=match.group('protocol')))
+                for match in map(BRIEF_PATTERN.match, text.splitlines()) if match is not None)
+
+
+def parse_vlan_brief(text):
+    """VLANs of "show vlan brief" as dicts with vlan, name, status and ports."""
+    vlans = []
+    for line in text.splitlines():
+        match = VLAN_BRIEF_PATTERN.match(line)
+        if match is not None:
+            vlans.append(dict(vlan=int(match.group('vlan')), name=match.group('name'), status=match.group('status'),
+                              ports=[port.strip() for port in match.group('ports').split(',') if port.strip()]))
+        elif vlans and line[:1].isspace() and line.strip():
+            vlans[-1]['ports'].extend(port.strip() for port in line.split(',') if port.strip())
+    return vlans
+
+
+def parse_running_config(text):
+    """The hostname, named VLANs and per-interface lines of "show running-config"."""
+    config = dict(hostname=None, vlans=[], interfaces={})
+    section = None
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith('!'):
+            section = None
+            continue
+        if not line[0].isspace():
+            section = line
+            hostname = HOSTNAME_PATTERN.match(line)
+            if hostname is not None:
+                config['hostname'] = hostname.group('hostname')
+            vlan = VLAN_SECTION_PATTERN.match(line)
+            if vlan is not None:
+                config['vlans'].append(dict(vlan=int(vlan.group('vlan')), name=None))
+            if line.startswith('interface '):
+                config['interfaces'][line.split(None, 1)[1]] = []
+        elif section is not None:
+            if section.startswith('interface '):
+                config['interfaces'][section.split(None, 1)[1]].append(line.strip())
+            elif VLAN_SECTION_PATTERN.match(section) and line.strip().startswith('name '):
+                config['vlans'][-1]['name'] = line.strip()[len('name '):]
+    return config
+
+
+def _new_facts():
+    return dict(routes=None, ospf_networks=None, ospf_processes=[], ospf_interfaces={}, interfaces={}, other=[])
+
+
+def collect_facts(lines):
+    """Parse CLI output (any iterable of lines) into facts per device.
+
+    Output of commands without a parser is kept verbatim in the device's "other" list
+    so the fact sheet does not lose it.
+    """
+    devices = {}
+    for device, command, block in iter_prompt_blocks(lines):
+        if device is None:
+            continue
+        facts = devices.setdefault(device, _new_facts())
+        output = block.split('\n', 1)[1] if '\n' in block else ''
+        if ROUTE_COMMAND.match(command):
+            facts['routes'] = (facts['routes'] or []) + parse_routes(output)
+        elif OSPF_INTERFACE_COMMAND.match(command):
+            facts['ospf_interfaces'].update(parse_ospf_interfaces(output))
+        elif INTERFACE_BRIEF_COMMAND.match(command):
+            facts['interfaces'].update(parse_interface_brief(output))
+        elif PROTOCOLS_COMMAND.match(command) or RUNNING_CONFIG_COMMAND.match(command):
+            facts['ospf_networks'] = (facts['ospf_networks'] or []) + [
+                network for network in parse_ospf_networks(output) if network not in (facts['ospf_networks'] or [])]
+            facts['ospf_processes'].extend(match.group('process') for match in map(ROUTER_OSPF_PATTERN.match,
+                                                                                   output.splitlines()) if match)
+        else:
+            facts['other'].append(block)
+    return devices
+
+
+def _statement_network(statement):
+    """The address range an OSPF network statement matches, or None for a non-contiguous wildcard."""
+    # ipaddress reads "0.0.0.0" as a /0 netmask, so the wildcard is converted to a length here
+    host_bits = int(ipaddress.IPv4Address(statement['wildcard']))
+    if host_bits & (host_bits + 1):
+        return None
+    return ipaddress.ip_network('%s/%d' % (statement['address'], 32 - host_bits.bit_length()), strict=False)
+
+
+def _covers(statements, prefix):
+    networks = [_statement_network(statement) for statement in statements]
+    return any(network is None or network.overlaps(prefix) for network in networks)
+
+
+def _connected(facts):
+    return [(ipaddress.ip_network(route['prefix'], strict=False), route['interface'])
+            for route in facts['routes'] or [] if route['code'] == 'C']
+
+
+def check_facts(devices):
+    """Deterministic checks for the usual OSPF mismatches; returns a list of anomaly dicts."""
+    anomalies = []
+
+    def flag(device, check, detail):
+        anomalies.append(dict(device=device, check=check, detail=detail))
+
+    for device in sorted(devices):
+        facts = devices[device]
+        connected = _connected(facts)
+        statements = facts['ospf_networks'] or []
+        if facts['routes'] is not None:
+            for statement in statements:
+                network = _statement_network(statement)
+                if network is not None and not any(network.overlaps(prefix) for prefix, interface in connected):
+                    flag(device, 'ospf_network_unmatched',
+                         'network %(address)s %(wildcard)s area %(area)s matches no connected interface' % statement)
+            if statements:
+                for prefix, interface in connected:
+                    if not _covers(statements, prefix):
+                        flag(device, 'connected_not_in_ospf',
+                             '%s on %s is not covered by any OSPF network statement' % (prefix, interface))
+        for interface, details in sorted(facts['ospf_interfaces'].items()):
+            if not details['enabled']:
+                flag(device, 'ospf_not_enabled', 'OSPF is not enabled on %s' % interface)
+            elif details.get('network_type') == 'LOOPBACK' and details.get('address', '').split('/')[-1] != '32':
+                flag(device, 'loopback_host_route',
+                     '%s %s is advertised as a /32 host route (network type LOOPBACK)'
+                     % (interface, details['address']))
+        for interface, details in sorted(facts['interfaces'].items()):
+            if details['address'] != 'unassigned' and details['status'] == 'up' and details['protocol'] == 'down':
+                flag(device, 'line_protocol_down', '%s %s is up, line protocol down' % (interface, details['address']))
+
+    # Prefixes a device advertises should be in the routing table of the other OSPF devices
+    for device in sorted(devices):
+        statements = devices[device]['ospf_networks']
+        if not statements:
+            continue
+        for prefix, interface in _connected(devices[device]):
+            if not _covers(statements, prefix):
+                continue
+            for other in sorted(devices):
+                routes = devices[other]['routes']
+                if other == device or routes is None or not devices[other]['ospf_networks']:
+                    continue
+                if not any(ipaddress.ip_network(route['prefix'], strict=False).overlaps(prefix) for route in routes):
+                    flag(other, 'route_missing', 'no route to %s advertised by %s' % (prefix, device))
+    return anomalies
+
+
+def fact_sheet(devices, anomalies, only=None):
+    """Condensed text of the facts and anomalies, sent to the LLM instead of the raw output.
+
+    `only` limits the sheet to some devices; the checks still see the whole fleet.
+    """
+    if only:
+        devices = dict((device, facts) for device, facts in devices.items() if device in only)
+        anomalies = [anomaly for anomaly in anomalies if anomaly['device'] in only]
+    lines = []
+    for device in sorted(devices):
+        facts = devices[device]
+        lines.append(device)
+        if facts['routes'] is not None:
+            connected = ['%s %s' % (route['prefix'], route['interface']) for route in facts['routes']
+                         if route['code'] == 'C']
+            lines.append('  connected: %s' % ('; '.join(connected) or 'none'))
+            # Learned routes grouped by code and next hop: "O via 192.168.12.2: 2.2.2.2/32, 3.3.3.3/32"
+            learned, shown = {}, 0
+            for route in facts['routes']:
+                if route['code'] not in ('C', 'L'):
+                    learned.setdefault((route['code'], route['next_hop'] or route['interface']), []).append(
+                        route['prefix'])
+            groups = []
+            for (code, via), prefixes in sorted(learned.items()):
+                remaining = max(MAX_ROUTES - shown, 0)
+                listed = ', '.join(prefixes[:remaining])
+                if len(prefixes) > remaining:
+                    listed += '%s... %d more' % (', ' if listed else '', len(prefixes) - remaining)
+                groups.append('%s via %s: %s' % (code, via, listed))
+                shown += len(prefixes)
+            lines.append('  routes: %s' % ('; '.join(groups) or 'none'))
+        if facts['ospf_networks'] is not None:
+            lines.append('  ospf %snetworks: %s' % (
+                'process %s ' % ','.join(facts['ospf_processes']) if facts['ospf_processes'] else '',
+                '; '.join('%(address)s %(wildcard)s area %(area)s' % network for network in facts['ospf_networks'])
+                or 'none'))
+        if facts['ospf_interfaces']:
+            lines.append('  ospf interfaces: %s' % '; '.join(
+                '%s %s' % (interface, ' '.join(details.get(key, '') for key in ('address', 'network_type')).strip()
+                           if details['enabled'] else 'not enabled')
+                for interface, details in sorted(facts['ospf_interfaces'].items())))
+        if facts['interfaces']:
+            lines.append('  interfaces: %s' % '; '.join(
+                '%s %s %s/%s' % (interface, details['address'], details['status'], details['protocol'])
+                for interface, details in sorted(facts['interfaces'].items())))
+        for block in facts['other']:
+            lines.extend('  ' + line for line in block.splitlines() if line.strip())
+    lines.append('')
+    lines.append('Anomalies found by deterministic checks:')
+    lines.extend('- %(device)s %(check)s: %(detail)s' % anomaly for anomaly in anomalies)
+    if not anomalies:
+        lines.append('- none')
+    return '\n'.join(lines)
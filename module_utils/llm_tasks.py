@@ -0,0 +1,509 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Only modules that import nothing heavy are imported here. LangChain, the provider SDKs
+# and FAISS are imported by the code path that uses them, so a run pays for one backend
+# and, on an index or response cache hit, for no document loader or splitter at all.
+try:
+    from ansible.module_utils.cli_chunker import devices_in_prompt, metadata_filter
+    from ansible.module_utils.ios_facts import check_facts, collect_facts, fact_sheet
+    from ansible.module_utils.index_cache import IndexCache, build_index, cache_key, embedding_model_name, file_digest
+    from ansible.module_utils.streaming_loader import iter_documents, loader_name
+    from ansible.module_utils.response_cache import ResponseCache
+    from ansible.module_utils.metrics import StageTimer
+    from ansible.module_utils.fleet_index import INDEX_DIR, MANIFEST_FILE, FleetIndex, fleet_filter, index_path
+except ImportError:
+    from module_utils.cli_chunker import devices_in_prompt, metadata_filter
+    from module_utils.ios_facts import check_facts, collect_facts, fact_sheet
+    from module_utils.index_cache import IndexCache, build_index, cache_key, embedding_model_name, file_digest
+    from module_utils.streaming_loader import iter_documents, loader_name
+    from module_utils.response_cache import ResponseCache
+    from module_utils.metrics import StageTimer
+    from module_utils.fleet_index import INDEX_DIR, MANIFEST_FILE, FleetIndex, fleet_filter, index_path
+
+# Splitter settings are part of the index cache key, so they are spelled out here
+CHUNK_SIZE = 4000
+CHUNK_OVERLAP = 200
+
+# Loaded FAISS indexes kept in memory by a long-lived process (llm_gateway.py)
+WARM_INDEXES = 8
+
+DOCUMENT_PROMPT = '''
+{system_message}
+
+Your task is to utilize the information provided below to answer the question.
+If the context does not contain enough information to formulate a conclusive
+answer, your response should be "I don't know".
+
+<context>
+{context}
+</context>
+
+Question: {input}
+    '''
+
+
+class TaskError(Exception):
+    pass
+
+
+def _ollama_llm(model, temperature):
+    from langchain_community.llms import Ollama
+    return Ollama(model=model, temperature=temperature)
+
+
+def _ollama_embeddings():
+    from langchain_community.embeddings import OllamaEmbeddings
+    return OllamaEmbeddings()
+
+
+def _openai_llm(model, temperature):
+    from langchain_openai import ChatOpenAI
+    # Streamed answers only report their token usage when asked to
+    return ChatOpenAI(model=model, temperature=temperature, stream_usage=True)
+
+
+def _openai_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings()
+
+
+# LLM backends: the models redhat_one_demo accepts for each, and how to build its LLM
+# and embedding clients. A new backend is one more entry here.
+PROVIDERS = dict(
+    ollama=dict(models=('llama2', 'llama-pro'), llm=_ollama_llm, embeddings=_ollama_embeddings),
+    openai=dict(models=('gpt-4', 'gpt-3.5-turbo'), llm=_openai_llm, embeddings=_openai_embeddings),
+)
+
+
+def provider_for(model):
+    for name, provider in PROVIDERS.items():
+        if model in provider['models']:
+            return name
+    raise TaskError('Error: Model not found!')
+
+
+# Clients, caches and indexes created once per process. Inside a module run each is
+# used once; in the gateway they stay warm across requests.
+_lock = threading.Lock()
+_warm = {}
+_indexes = OrderedDict()
+
+
+def warm(key, factory):
+    """The object created by factory() the first time key was asked for in this process."""
+    with _lock:
+        if key not in _warm:
+            _warm[key] = factory()
+        return _warm[key]
+
+
+def _warm_index(key, load):
+    with _lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    vector = load()
+    if vector is not None:
+        with _lock:
+            _indexes[key] = vector
+            while len(_indexes) > WARM_INDEXES:
+                _indexes.popitem(last=False)
+    return vector
+
+
+def llm_client(provider, model, temperature):
+    return warm((provider, 'llm', model, temperature),
+                lambda: PROVIDERS[provider]['llm'](model, temperature))
+
+
+def embeddings_client(provider):
+    return warm((provider, 'embeddings'), PROVIDERS[provider]['embeddings'])
+
+
+def _response_cache(params):
+    return warm(('responses', params['cache_path'], params['cache_ttl'], params['cache_max_entries']),
+                lambda: ResponseCache(params['cache_path'], params['cache_ttl'], params['cache_max_entries']))
+
+
+class ProgressFile(object):
+    """Partial output appended to a file as it is generated, so it can be followed with tail -f."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, text):
+        with self._lock:
+            self._file.write(text)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def stream_text(chunks, timing, started=None, key=None):
+    """Yield the text pieces of a chain's stream(), recording first_token and total seconds in timing.
+
+    With key the chunks are dicts (a retrieval chain's) and only their `key` part is text.
+    """
+    started = time.time() if started is None else started
+    for chunk in chunks:
+        text = chunk.get(key) if key is not None else chunk
+        if not text:
+            continue
+        if 'first_token' not in timing:
+            timing['first_token'] = round(time.time() - started, 3)
+        yield text
+    timing['total'] = round(time.time() - started, 3)
+    timing.setdefault('first_token', timing['total'])
+
+
+def _run_metrics(timer):
+    """A LangChain callback handler adding the retriever's and the LLM's seconds and the LLM's tokens to timer."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class RunMetrics(BaseCallbackHandler):
+        def __init__(self):
+            self.started = {}
+
+        def _end(self, run_id, stage):
+            started = self.started.pop(run_id, None)
+            if started is not None:
+                timer.add(stage, time.perf_counter() - started)
+
+        def on_retriever_start(self, serialized, query, run_id, **kwargs):
+            self.started[run_id] = time.perf_counter()
+
+        def on_retriever_end(self, documents, run_id, **kwargs):
+            self._end(run_id, 'retrieve')
+
+        def on_retriever_error(self, error, run_id, **kwargs):
+            self._end(run_id, 'retrieve')
+
+        def on_llm_start(self, serialized, prompts, run_id, **kwargs):
+            self.started[run_id] = time.perf_counter()
+
+        def on_chat_model_start(self, serialized, messages, run_id, **kwargs):
+            self.started[run_id] = time.perf_counter()
+
+        def on_llm_error(self, error, run_id, **kwargs):
+            self._end(run_id, 'generate')
+
+        def on_llm_end(self, response, run_id, **kwargs):
+            self._end(run_id, 'generate')
+            for generations in response.generations:
+                for generation in generations:
+                    # Chat models report usage_metadata, Ollama's completion API its eval counts
+                    usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                    info = generation.generation_info or {}
+                    if usage:
+                        timer.count('prompt', usage['input_tokens'])
+                        timer.count('completion', usage['output_tokens'])
+                    elif 'prompt_eval_count' in info:
+                        timer.count('prompt', info['prompt_eval_count'])
+                        timer.count('completion', info.get('eval_count', 0))
+
+    return RunMetrics()
+
+
+class RateLimiter(object):
+    """Space call starts at least 1 / rate seconds apart across threads; rate None means no limit."""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _chain(params, provider):
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
+    llm = llm_client(provider, params['model'], params['temperature'])
+    prompt = ChatPromptTemplate.from_messages([
+        ('system', params['system_message']),
+        ('user', '{input}')
+    ])
+    output_parser = StrOutputParser()
+    return prompt | llm | output_parser
+
+
+def _answer(params, provider, text, chain, cache, timer, rate_limiter=None, on_token=None):
+    """The response to one prompt text, whether it came from the response cache and its timing.
+
+    The response is streamed; on_token is called with each piece as it arrives.
+    """
+    started = time.time()
+    timing = {}
+    if cache is not None:
+        key = (params['model'], params['temperature'], params['system_message'], text)
+        embeddings = embeddings_client(provider) if params['cache_similarity'] is not None else None
+        with timer.stage('cache'):
+            response, embedding = cache.lookup(*key, embeddings=embeddings, similarity=params['cache_similarity'])
+        if response is not None:
+            timing['first_token'] = timing['total'] = round(time.time() - started, 3)
+            if on_token is not None:
+                on_token(response)
+            return response, True, timing
+    if rate_limiter is not None:
+        rate_limiter.wait()
+    pieces = []
+    for piece in stream_text(chain().stream({'input': text}), timing, started):
+        pieces.append(piece)
+        if on_token is not None:
+            on_token(piece)
+    response = ''.join(pieces)
+    if cache is not None:
+        with timer.stage('cache'):
+            cache.put(*key, response=response, embedding=embedding,
+                      embedding_model=embedding_model_name(embeddings) if embedding is not None else None)
+    return response, False, timing
+
+
+def batch_prompts(params):
+    """The prompt texts of a batch: prompts as given, or prompt_template filled with each of variables."""
+    if params.get('prompts'):
+        return list(params['prompts'])
+    try:
+        return [params['prompt_template'].format(**variables) for variables in params['variables']]
+    except (KeyError, IndexError) as e:
+        raise TaskError('prompt_template refers to %s, which variables does not define' % e)
+
+
+def _ask(params, provider):
+    result = dict(changed=False, response='', cached=False)
+    cache = _response_cache(params) if params['cache'] else None
+    progress = ProgressFile(params['progress_file']) if params.get('progress_file') else None
+    timer = StageTimer()
+    try:
+        _ask_with(params, provider, result, cache, progress, timer)
+    finally:
+        if progress is not None:
+            progress.close()
+    result['metrics'] = timer.as_dict()
+    return result
+
+
+def _ask_with(params, provider, result, cache, progress, timer):
+    # The chain, and with it the backend import, is only built if a prompt misses the cache
+    built = []
+
+    def chain():
+        if not built:
+            built.append(_chain(params, provider).with_config(callbacks=[_run_metrics(timer)]))
+        return built[0]
+
+    if not (params.get('prompts') or params.get('prompt_template')):
+        result['response'], result['cached'], timing = _answer(params, provider, params['prompt'], chain, cache,
+                                                               timer, on_token=progress.write if progress else None)
+        result['first_token_latency'], result['latency'] = timing['first_token'], timing['total']
+        return result
+
+    from langchain_core.runnables import RunnableLambda
+
+    rate_limiter = RateLimiter(params.get('rate_limit'))
+
+    def run_one(text):
+        started = time.time()
+        item = dict(prompt=text, response=None, cached=False, error=None, first_token_latency=None)
+        try:
+            item['response'], item['cached'], timing = _answer(params, provider, text, chain, cache, timer,
+                                                               rate_limiter)
+            item['first_token_latency'] = timing['first_token']
+        except Exception as e:
+            item['error'] = '%s: %s' % (type(e).__name__, e)
+        item['latency'] = round(time.time() - started, 3)
+        if progress is not None:
+            # Answers of a batch arrive interleaved, so each is written whole once it is complete
+            progress.write('### %s\n%s\n\n' % (text, item['response'] if item['error'] is None else item['error']))
+        return item
+
+    # batch() keeps the input order and runs at most max_concurrency items at a time
+    result['results'] = RunnableLambda(run_one).batch(batch_prompts(params),
+                                                      config=dict(max_concurrency=params.get('max_concurrency')))
+    result['cached'] = bool(result['results']) and all(item['cached'] for item in result['results'])
+    result['failed'] = sum(1 for item in result['results'] if item['error'] is not None)
+    return result
+
+
+def ask_openai(params):
+    """What llm_openai does with its parameters; returns the module result."""
+    return _ask(params, 'openai')
+
+
+def ask_ollama(params):
+    """What llm_ollama does with its parameters; returns the module result."""
+    return _ask(params, 'ollama')
+
+
+def ask_document(params):
+    """What redhat_one_demo does with its parameters; returns the module result."""
+    result = dict(changed=False, response='', index_cache='disabled')
+    timer = StageTimer()
+    _ask_document(params, result, timer)
+    result['metrics'] = timer.as_dict()
+    return result
+
+
+def _ask_document(params, result, timer):
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
+    provider = provider_for(params['model'])
+    llm = llm_client(provider, params['model'], 0.0)
+    document = params.get('document')
+    prompt = ChatPromptTemplate.from_template(DOCUMENT_PROMPT)
+
+    if params.get('index'):
+        if params['context'] == 'facts':
+            raise TaskError('context=facts parses a document and cannot be used with index')
+        _ask_fleet_index(params, result, timer, llm, prompt)
+        return
+
+    if params['context'] == 'facts':
+        # Parsed facts and the checks' findings replace the raw output, no index needed
+        with timer.stage('load'):
+            with open(document, encoding='utf-8', errors='replace') as f:
+                devices = collect_facts(f)
+            result['anomalies'] = check_facts(devices)
+        chain = prompt | llm | StrOutputParser()
+        only = params['devices'] or devices_in_prompt(devices, params['prompt'])
+        result['response'] = chain.invoke({
+            'context': fact_sheet(devices, result['anomalies'], only),
+            'input': params['prompt'],
+            'system_message': params['system_message']
+        }, config=dict(callbacks=[_run_metrics(timer)]))
+        return
+
+    try:
+        from ansible.module_utils.embedding_cache import CachedEmbeddings, TimedEmbeddings
+    except ImportError:
+        from module_utils.embedding_cache import CachedEmbeddings, TimedEmbeddings
+
+    embeddings = embeddings_client(provider)
+    embedding_model = embedding_model_name(embeddings)
+    if params['embedding_cache']:
+        embeddings = CachedEmbeddings(embeddings, embedding_model, params['embedding_cache_path'])
+
+    # Documents are streamed chunk by chunk (CLI output one device and command at a time,
+    # markdown by section, CSV by row) so memory does not grow with the size of the file
+    splitter_settings = dict(loader=loader_name(document), chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    vector = None
+    if params['index_cache']:
+        with timer.stage('load'):
+            index_cache = IndexCache(params['cache_dir'], params['cache_max_size'] * 1024 * 1024)
+            key = cache_key(file_digest(document), embedding_model, splitter_settings)
+            vector = _warm_index((params['cache_dir'], key), lambda: index_cache.load(key, embeddings))
+        result['index_cache'] = 'miss' if vector is None else 'hit'
+
+    if vector is None:
+        documents = iter_documents(document, CHUNK_SIZE, CHUNK_OVERLAP)
+        # Only while the index is built: a cached index outlives this run and its timer
+        timed_embeddings = TimedEmbeddings(embeddings, timer)
+
+        previous = None
+        if params['index_cache']:
+            # The last index built from this same file only needs the chunks that changed
+            lineage = cache_key(os.path.abspath(document), embedding_model, splitter_settings)
+            with timer.stage('load'):
+                previous = index_cache.load_lineage(lineage, timed_embeddings)
+            if previous is not None:
+                result['index_cache'] = 'incremental'
+        with timer.stage('index', exclude=('split', 'embed')):
+            vector, result['index_update'] = build_index(timer.timed('split', documents), timed_embeddings, previous)
+            vector.embedding_function = embeddings
+            if params['index_cache']:
+                index_cache.save(key, vector, lineage)
+        if params['embedding_cache']:
+            result['embedding_cache'] = embeddings.stats()
+
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.chains import create_retrieval_chain
+
+    document_chain = create_stuff_documents_chain(llm, prompt)
+
+    search_kwargs = dict(k=params['top_k'])
+    search_filter = metadata_filter(vector, params['prompt'], params['devices'], params['commands'])
+    if search_filter:
+        # FAISS applies the filter to the fetch_k nearest chunks; fetching all of them keeps it exact
+        search_kwargs.update(filter=search_filter, fetch_k=vector.index.ntotal)
+        result['retrieval_filter'] = search_filter
+    retriever = vector.as_retriever(search_kwargs=search_kwargs)
+    retrieval_chain = create_retrieval_chain(retriever, document_chain)
+
+    response = retrieval_chain.invoke(
+            {
+                'input': params['prompt'],
+                'system_message': params['system_message']
+            },
+            config=dict(callbacks=[_run_metrics(timer)])
+        )
+
+    result['response'] = response['answer']
+
+
+def _ask_fleet_index(params, result, timer, llm, prompt):
+    """Answer from a store built by build_fleet_index.py: one embedding call and a search, no document read."""
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+
+    index_dir = params.get('index_dir') or INDEX_DIR
+    try:
+        path = index_path(index_dir, params['index'])
+        stamp = os.path.getmtime(os.path.join(path, MANIFEST_FILE))
+    except ValueError as e:
+        raise TaskError(str(e))
+    except OSError:
+        raise TaskError('There is no index named %s in %s; build it with build_fleet_index.py'
+                        % (params['index'], index_dir))
+    with timer.stage('load'):
+        # A rebuild writes a new manifest, so a long-lived process picks the new store up
+        store = _warm_index(('fleet', path, stamp), lambda: FleetIndex.load(path))
+    manifest = store.manifest
+    embeddings = embeddings_client(manifest['provider'])
+    if embedding_model_name(embeddings) != manifest['embedding_model']:
+        raise TaskError('Index %s was built with %s embeddings, but %s is configured'
+                        % (params['index'], manifest['embedding_model'], embedding_model_name(embeddings)))
+    result['index'] = dict(name=params['index'], chunks=manifest['chunks'], index_type=manifest['index_type'],
+                           built=manifest['built'])
+
+    with timer.stage('embed'):
+        query = embeddings.embed_query(params['prompt'])
+    search_filter = fleet_filter(store, params['prompt'], params['devices'], params.get('sites'),
+                                 params.get('doc_types'), params['commands'])
+    if search_filter:
+        result['retrieval_filter'] = search_filter
+    with timer.stage('retrieve'):
+        documents = store.search(query, params['top_k'], search_filter)
+
+    chain = create_stuff_documents_chain(llm, prompt)
+    result['response'] = chain.invoke({
+        'context': documents,
+        'input': params['prompt'],
+        'system_message': params['system_message']
+    }, config=dict(callbacks=[_run_metrics(timer)]))
+
+
+TASKS = dict(llm_openai=ask_openai, llm_ollama=ask_ollama, redhat_one_demo=ask_document)
@@ -0,0 +1,135 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Upper bounds of the default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageTimer(object):
+    """Seconds spent per named stage of one task, and the tokens it used.
+
+    A stage can be entered many times (once per batch, once per prompt) and from
+    several threads; its seconds add up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = OrderedDict()
+        self.tokens = OrderedDict()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def count(self, name, tokens):
+        with self._lock:
+            self.tokens[name] = self.tokens.get(name, 0) + tokens
+
+    @contextmanager
+    def stage(self, name, exclude=()):
+        """Time the block as name, minus what the stages in exclude were timed inside it."""
+        started = time.perf_counter()
+        nested = sum(self.seconds.get(other, 0.0) for other in exclude)
+        try:
+            yield
+        finally:
+            nested = sum(self.seconds.get(other, 0.0) for other in exclude) - nested
+            self.add(name, time.perf_counter() - started - nested)
+
+    def timed(self, name, iterable):
+        """Yield from iterable, timing the time spent producing each item as name."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - started)
+                return
+            self.add(name, time.perf_counter() - started)
+            yield item
+
+    def as_dict(self):
+        with self._lock:
+            return dict(stages=OrderedDict((name, round(seconds, 4)) for name, seconds in self.seconds.items()),
+                        tokens=OrderedDict(self.tokens))
+
+
+class Histogram(object):
+    """Cumulative bucket counts, sum and count of observed values, as Prometheus exposes them.
+
+    Not locked: each one belongs to a single event loop or thread.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in labels.items())
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry(object):
+    """Metrics rendered in the Prometheus text format.
+
+    Counters and gauges are callbacks read at scrape time, so the code being measured
+    keeps its own plain counters and pays nothing extra per event. A callback returns
+    a number, or a list of (labels dict, number) pairs for a labelled series.
+    """
+
+    def __init__(self, labels=None):
+        self.labels = OrderedDict(labels or {})
+        self._metrics = []
+
+    def counter(self, name, help, collect):
+        self._metrics.append((name, 'counter', help, collect))
+
+    def gauge(self, name, help, collect):
+        self._metrics.append((name, 'gauge', help, collect))
+
+    def histogram(self, name, help, histogram):
+        self._metrics.append((name, 'histogram', help, histogram))
+
+    def render(self):
+        lines = []
+        for name, kind, help, collect in self._metrics:
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(collect.buckets + ('+Inf',), collect.counts):
+                    cumulative += count
+                    labels = OrderedDict(self.labels, le=bound if bound == '+Inf' else _number(bound))
+                    lines.append('%s_bucket%s %d' % (name, _labels(labels), cumulative))
+                lines.append('%s_sum%s %s' % (name, _labels(self.labels), _number(collect.sum)))
+                lines.append('%s_count%s %d' % (name, _labels(self.labels), collect.count))
+                continue
+            value = collect()
+            if value is None:
+                continue
+            for labels, number in value if isinstance(value, list) else [({}, value)]:
+                lines.append('%s%s %s' % (name, _labels(OrderedDict(self.labels, **labels)), _number(number)))
+        return '\n'.join(lines) + '\n'
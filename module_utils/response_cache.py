@@ -0,0 +1,130 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+try:
+    from ansible.module_utils.index_cache import embedding_model_name
+except ImportError:
+    from module_utils.index_cache import embedding_model_name
+
+CACHE_PATH = os.path.expanduser('~/.cache/langchain_ops/responses.sqlite')
+TTL = 86400
+MAX_ENTRIES = 10000
+
+# Parallel forks of the same task write to the file at once
+BUSY_TIMEOUT = 30
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key BLOB PRIMARY KEY,
+    scope BLOB NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    embedding_model TEXT,
+    embedding BLOB
+);
+CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+'''
+
+
+def _digest(*values):
+    return hashlib.sha256(json.dumps(values).encode('utf-8')).digest()
+
+
+class ResponseCache(object):
+    """LLM responses on the controller, keyed by (model, temperature, system_message, prompt).
+
+    Entries older than ttl seconds are not returned and are deleted on the next write,
+    as are the least recently used entries beyond max_entries.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # llm_gateway.py serves requests from several threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def lookup(self, model, temperature, system_message, prompt, embeddings=None, similarity=None):
+        """Exact lookup, then with embeddings and similarity set a near-duplicate lookup.
+
+        Returns (response or None, prompt embedding or None); pass the embedding on to
+        put() so the answer can serve near-duplicates later.
+        """
+        response = self.get(model, temperature, system_message, prompt)
+        if response is not None or embeddings is None or similarity is None:
+            return response, None
+        embedding = embeddings.embed_query(prompt)
+        return self.get_similar(model, temperature, system_message, embedding, embedding_model_name(embeddings),
+                                similarity), embedding
+
+    def get(self, model, temperature, system_message, prompt):
+        """The cached response, or None."""
+        key = _digest(model, temperature, system_message, prompt)
+        with self._lock:
+            row = self._db.execute('SELECT response FROM responses WHERE key = ? AND created > ?',
+                                   (key, time.time() - self.ttl)).fetchone()
+        if row is None:
+            return None
+        self._touch(key)
+        return row[0]
+
+    def get_similar(self, model, temperature, system_message, embedding, embedding_model, similarity):
+        """The response to the most similar cached prompt if its cosine similarity is at least `similarity`, or None.
+
+        Only prompts asked with the same model, temperature and system message, and
+        embedded with the same embedding model, are compared.
+        """
+        import numpy as np
+
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT key, response, embedding FROM responses '
+                'WHERE scope = ? AND embedding_model = ? AND embedding IS NOT NULL AND created > ?',
+                (_digest(model, temperature, system_message), embedding_model, time.time() - self.ttl)).fetchall()
+        if not rows:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        matrix = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        scores = matrix.dot(query) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+        best = int(scores.argmax())
+        if scores[best] < similarity:
+            return None
+        self._touch(rows[best][0])
+        return rows[best][1]
+
+    def put(self, model, temperature, system_message, prompt, response, embedding=None, embedding_model=None):
+        now = time.time()
+        blob = array('f', embedding).tobytes() if embedding is not None else None
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, scope, prompt, response, created, accessed, embedding_model, embedding) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (_digest(model, temperature, system_message, prompt), _digest(model, temperature, system_message),
+                 prompt, response, now, now, embedding_model, blob))
+            self._db.execute('DELETE FROM responses WHERE created <= ?', (now - self.ttl,))
+            self._db.execute(
+                'DELETE FROM responses WHERE key IN '
+                '(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def _touch(self, key):
+        with self._lock, self._db:
+            self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
@@ -0,0 +1,109 @@
+# Copyright: (c) 2024, Victor M Santiago <vsantiago113sec@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import csv
+import io
+import re
+
+# Markdown sections start at ATX headings ("## Step-by-Step Commands") outside code fences
+HEADING_PATTERN = re.compile(r'^#{1,6}\s+\S')
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+
+
+def loader_name(path):
+    """Name of the streaming loader used for path; part of the index cache key."""
+    lower = path.lower()
+    if lower.endswith('.md'):
+        return 'stream_markdown'
+    if lower.endswith('.csv'):
+        return 'stream_csv'
+    return 'stream_cli_text'
+
+
+def _open_text(path, data=None, newline=None):
+    if data is None:
+        return open(path, newline=newline, encoding='utf-8', errors='replace')
+    return io.StringIO(data.decode('utf-8', errors='replace'), newline=newline)
+
+
+def iter_documents(path, chunk_size, chunk_overlap, data=None):
+    """Yield the chunks of a .txt, .md or .csv document one at a time.
+
+    Nothing holds more than one prompt block, markdown section or CSV row (plus the
+    pieces it is split into) in memory, however large the file is. With data (the
+    bytes of an upload) those are split instead and path only names the document.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    try:
+        from ansible.module_utils.cli_splitter import CliOutputSplitter
+    except ImportError:
+        from module_utils.cli_splitter import CliOutputSplitter
+
+    name = loader_name(path)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if name == 'stream_markdown':
+        return iter_markdown_documents(path, text_splitter, chunk_size, data)
+    if name == 'stream_csv':
+        return iter_csv_documents(path, text_splitter, chunk_size, data)
+    return iter_text_documents(path, CliOutputSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap), data)
+
+
+def iter_text_documents(path, cli_splitter, data=None):
+    with _open_text(path, data) as f:
+        for document in cli_splitter.iter_documents(f, dict(source=path)):
+            yield document
+
+
+def iter_markdown_documents(path, text_splitter, chunk_size, data=None):
+    from langchain_core.documents import Document
+
+    def section_documents(lines, heading):
+        text = ''.join(lines).strip()
+        if not text:
+            return
+        metadata = dict(source=path)
+        if heading:
+            metadata['heading'] = heading
+        for piece in text_splitter.split_text(text) if len(text) > chunk_size else [text]:
+            yield Document(page_content=piece, metadata=metadata)
+
+    lines, heading, in_fence = [], None, False
+    with _open_text(path, data) as f:
+        for line in f:
+            if FENCE_PATTERN.match(line):
+                in_fence = not in_fence
+            elif not in_fence and HEADING_PATTERN.match(line):
+                for document in section_documents(lines, heading):
+                    yield document
+                lines, heading = [], line.strip().lstrip('#').strip()
+            lines.append(line)
+    for document in section_documents(lines, heading):
+        yield document
+
+
+def iter_csv_documents(path, text_splitter, chunk_size, data=None):
+    """One document per row, formatted like CSVLoader does ("column: value" lines)."""
+    from langchain_core.documents import Document
+
+    with _open_text(path, data, newline='') as f:
+        for i, row in enumerate(csv.DictReader(f, delimiter=',', quotechar='"')):
+            content = '\n'.join('%s: %s' % (k.strip() if k is not None else k,
+                                            v.strip() if isinstance(v, str) else
+                                            ','.join(map(str.strip, v)) if isinstance(v, list) else v)
+                                for k, v in row.items())
+            metadata = dict(source=path, row=i)
+            for piece in text_splitter.split_text(content) if len(content) > chunk_size else [content]:
+                yield Document(page_content=piece, metadata=metadata)
+
+
+def iter_batches(iterable, batch_size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
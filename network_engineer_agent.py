@@ -3,10 +3,21 @@ from langchain.chat_models import ChatOpenAI
 from langchain.tools import Tool, tool
 from typing import Optional, Type, List
 from pydantic import BaseModel, Field
-from netmiko import ConnectHandler
+import atexit
+import json
+
+from device_pool import DevicePool, format_results, result_text, run_on_devices
+from device_state import DeviceStateCache, read_device_state
 
 llm = ChatOpenAI(model='gpt-3.5-turbo', temperature=0.7)
 
+# Logged-in sessions are reused across the agent's tool calls
+pool = DevicePool()
+atexit.register(pool.close)
+
+# Parsed show output per device; syslog_listener.py drops a device's entry on %SYS-5-CONFIG_I
+state_cache = DeviceStateCache()
+
 
 class ConfigCommandsInput(BaseModel):
     hostname: str = Field(..., description='The hostname as a FQDN or IP Address.')
@@ -16,6 +27,22 @@ class ConfigCommandsInput(BaseModel):
     port: Optional[int] = Field(22, description='An optional port number, defaults to 22.')
 
 
+class FleetConfigCommandsInput(BaseModel):
+    hostnames: List[str] = Field(..., description='The hostnames as FQDNs or IP Addresses.')
+    username: str = Field(..., description='The username to login in the remote hosts.')
+    password: str = Field(..., description='The password to login in the remote hosts.')
+    commands: List[str] = Field(..., description='A list of commands to execute on every remote host.')
+    port: Optional[int] = Field(22, description='An optional port number, defaults to 22.')
+
+
+class DeviceStateInput(BaseModel):
+    hostname: str = Field(..., description='The hostname as a FQDN or IP Address.')
+    username: str = Field(..., description='The username to login in the remote host.')
+    password: str = Field(..., description='The password to login in the remote host.')
+    port: Optional[int] = Field(22, description='An optional port number, defaults to 22.')
+    refresh: Optional[bool] = Field(False, description='Ask the device even if a recent snapshot exists.')
+
+
 @tool
 def config_commands(hostname: str, username: str, password: str, commands: list, port: int=22) -> str:
     """
@@ -41,25 +68,52 @@ def config_commands(hostname: str, username: str, password: str, commands: list,
 
     Returns:
         str: A string containing the concatenated output from each command executed on the Cisco device. 
-             In case of an error, the error message will be appended to the output string.
+             Commands the device rejects are listed after the output with their line number and IOS error
+             message; any other error message is appended as well.
 
     Example:
         config_commands(hostname='192.168.1.1', username='admin', password='admin123', 
                         commands=['interface GigabitEthernet0/1', 'ip address 192.168.2.1 255.255.255.0'])
     """
-    net_connect = ConnectHandler(device_type='cisco_ios', host=hostname, username=username, password=password, port=port)
-    output = ''
+    result = run_on_devices([hostname], commands, username, password, port=port, pool=pool)[0]
+    state_cache.invalidate(hostname)
+    return result_text(result)
+
+
+@tool
+def fleet_config_commands(hostnames: list, username: str, password: str, commands: list, port: int=22) -> str:
+    """
+    Run the same Cisco IOS commands on many devices at once. Devices are worked on in parallel and
+    already logged-in sessions are reused, so prefer this tool over calling config_commands once per
+    device. Returns one section per device, headed by its hostname and whether it succeeded, with
+    the device output or the error.
+
+    Example:
+        fleet_config_commands(hostnames=['192.168.1.222', '192.168.1.223'], username='admin',
+                              password='admin123', commands=['show vlan brief'])
+    """
+    results = run_on_devices(hostnames, commands, username, password, port=port, pool=pool)
+    for hostname in hostnames:
+        state_cache.invalidate(hostname)
+    return format_results(results)
+
+
+@tool
+def device_state(hostname: str, username: str, password: str, port: int=22, refresh: bool=False) -> str:
+    """
+    Read the current VLANs and running configuration of a Cisco device without changing anything.
+    A snapshot taken in the last few minutes is returned without logging in; it is dropped as soon
+    as the device reports a configuration change, so it is safe to reason from.
+
+    Returns JSON with vlans (vlan, name, status, ports), running_config (hostname, vlans,
+    interfaces with their configuration lines), age (seconds since each was read from the
+    device) and cached (which of them came from the snapshot).
+    """
+    device = dict(device_type='cisco_ios', host=hostname, username=username, password=password, port=port)
     try:
-        for command in commands:
-            output += net_connect.send_command_timing(
-                command, strip_prompt=False, strip_command=False, delay_factor=4
-                )
+        return json.dumps(read_device_state(state_cache, pool, device, refresh=refresh))
     except Exception as e:
-        output += e
-    finally:
-        net_connect.disconnect()
-
-    return output
+        return f'{type(e).__name__}: {e}'
 
 
 tools = [
@@ -73,6 +127,25 @@ requiring manual intervention for these steps. Tailored for Cisco devices, it en
 updates, making it ideal for routine network management tasks.""",
         args_schema=ConfigCommandsInput,
         return_direct=True
+    ),
+    Tool(
+        func=fleet_config_commands,
+        name = 'fleet_config_commands',
+        description="""
+Runs the same commands on a list of Cisco network devices in parallel, reusing logged-in SSH sessions, and reports
+the output or error of each device separately. Use it instead of config_commands whenever more than one device
+needs the same change or the same show commands.""",
+        args_schema=FleetConfigCommandsInput,
+        return_direct=True
+    ),
+    Tool(
+        func=device_state,
+        name = 'device_state',
+        description="""
+Read-only view of a Cisco device's VLANs and running configuration as JSON. Use it to look at the current state
+before deciding on changes, e.g. which VLANs exist and what they are named; it usually answers without connecting
+to the device. It never changes the configuration.""",
+        args_schema=DeviceStateInput
     )
 ]
 
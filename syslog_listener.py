@@ -1,55 +1,455 @@
+import argparse
 import asyncio
-import aiohttp
+import logging
+import multiprocessing
+import os
+import queue
+import signal
 import socket
-from aiohttp import ClientSession
+import sys
+import time
 import re
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
 
-pattern = re.compile(r"%SYS-5-CONFIG_I")
+from aiohttp import web
+
+from device_state import STATE_PATH, DeviceStateCache
+from event_coalescer import MAX_WAIT, QUIET_PERIOD, EventCoalescer
+from module_utils.metrics import Histogram, Registry
+from syslog_parser import SyslogParser
+from webhook_forwarder import JOURNAL_DIR, OVERFLOW_POLICIES, OVERFLOW_POLICY, WebhookForwarder, create_session
+
+# Facility-severity-mnemonic tags that are forwarded. Everything else is dropped
+# before it is decoded, which is the fate of the vast majority of the traffic.
+MNEMONICS = ["SYS-5-CONFIG_I", "LINK-3-UPDOWN", "OSPF-5-ADJCHG"]
+
+
+def compile_matcher(mnemonics):
+    """Compile the mnemonics into one bytes regex that can scan raw datagrams."""
+    alternatives = b"|".join(re.escape(m.lstrip("%").encode("ascii")) for m in mnemonics)
+    # Every tag starts with '%', which lets the regex engine skip ahead with a
+    # single-byte scan and only try the alternation at candidate offsets.
+    return re.compile(b"%(?:" + alternatives + b")")
+
+
+pattern = compile_matcher(MNEMONICS)
 
 # Webhook URL to which the syslog events will be forwarded
 WEBHOOK_URL = "https://yourwebhook.url/endpoint"
+FORWARD_EVENTS = False  # Turn on (or pass --forward) once WEBHOOK_URL points at the EDA webhook
 
 # The IP address and port on which the script will listen for syslog messages
 LISTEN_IP = "0.0.0.0"
 LISTEN_PORT = 514  # Consider using a non-privileged port (above 1024) if not running as root
 
+# Number of worker processes sharing LISTEN_PORT through SO_REUSEPORT. The kernel
+# hashes each sender's address to one worker, so a device always lands on the same one.
+WORKERS = os.cpu_count() or 1
 
-# async def send_event(event_data: str, sender_ip: str, session: ClientSession):
-#     """Send a single syslog event and the sender's IP address to the webhook."""
-#     payload = {
-#         "log": event_data,
-#         "ip_address": sender_ip
-#     }
-#     try:
-#         async with session.post(WEBHOOK_URL, json=payload) as response:
-#             print(f"Log sent from {sender_ip}. Response status: {response.status}")
-#     except Exception as e:
-#         print(f"Error sending log from {sender_ip}: {e}")
+# Receive buffer requested for every worker socket. The kernel caps it at
+# net.core.rmem_max unless the process is allowed to use SO_RCVBUFFORCE.
+RCVBUF_SIZE = 16 * 1024 * 1024
 
+# Largest datagram we accept and the maximum number drained per event loop wakeup
+MAX_DATAGRAM_SIZE = 4096
+BATCH_SIZE = 256
 
-async def listen_for_syslog_messages(loop):
-    """Listen for incoming syslog messages and forward them along with the sender's IP address."""
-    # Create a UDP socket
+# Seconds between the packets/sec and drop counter reports of each worker
+REPORT_INTERVAL = 10
+
+# A configuration change drops the agent's cached show output of the device (device_state.py)
+CONFIG_CHANGE_TAG = "SYS-5-CONFIG_I"
+
+# Matched lines each worker logs per second; the rest are only counted, so a flood of
+# matches cannot make the log the bottleneck
+LOG_RATE = 10
+
+# Worker N serves Prometheus metrics on http://METRICS_IP:(METRICS_PORT + N)/metrics
+METRICS_IP = "127.0.0.1"
+METRICS_PORT = 9514
+
+# Signals that stop the listener; a worker flushes its bursts and journals unsent events first
+SHUTDOWN_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+# Histogram buckets of the datagrams read per event loop wakeup
+DRAIN_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+log = logging.getLogger("syslog_listener")
+
+
+def create_listen_socket(listen_ip, listen_port, rcvbuf_size=RCVBUF_SIZE):
+    """Create a non-blocking UDP socket that can share its port with the other workers."""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((LISTEN_IP, LISTEN_PORT))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        # SO_RCVBUFFORCE ignores rmem_max but needs CAP_NET_ADMIN
+        sock.setsockopt(socket.SOL_SOCKET, getattr(socket, "SO_RCVBUFFORCE", 33), rcvbuf_size)
+    except OSError:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_size)
+    sock.bind((listen_ip, listen_port))
     sock.setblocking(False)
+    return sock
+
+
+def read_socket_drops(sock):
+    """Return the kernel drop counter of a UDP socket from /proc/net/udp, or None if unavailable."""
+    inode = str(os.fstat(sock.fileno()).st_ino)
+    try:
+        with open("/proc/net/udp") as f:
+            next(f)  # header
+            for line in f:
+                fields = line.split()
+                # sl local rem st tx:rx tr:when retrnsmt uid timeout inode ref pointer drops
+                if fields[9] == inode:
+                    return int(fields[12])
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+def start_logging():
+    """Hand log records to a background thread, so a slow stdout never blocks the receive loop."""
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(records, handler)
+    log.addHandler(QueueHandler(records))
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    listener.start()
+    return listener
+
+
+class LogSampler:
+    """Allow at most `rate` lines per second and count the ones held back."""
+
+    def __init__(self, rate=LOG_RATE):
+        self.rate = rate
+        self.second = 0
+        self.logged = 0
+        self.suppressed = 0
+
+    def allow(self):
+        second = int(time.monotonic())
+        if second != self.second:
+            self.second, self.logged = second, 0
+        if self.logged < self.rate:
+            self.logged += 1
+            return True
+        self.suppressed += 1
+        return False
+
+
+class SyslogWorker:
+    """Drain one UDP socket, many datagrams per wakeup, and handle the matching messages."""
+
+    def __init__(self, sock, coalescer: EventCoalescer, forwarder: WebhookForwarder = None, worker_id=0,
+                 matcher=pattern, state_cache: DeviceStateCache = None, log_rate=LOG_RATE):
+        self.sock = sock
+        self.coalescer = coalescer
+        self.forwarder = forwarder
+        self.state_cache = state_cache
+        # SQLite writes can wait on the agent's lock, so they run off the event loop, one at a time
+        self._state_writer = ThreadPoolExecutor(1) if state_cache is not None else None
+        self.worker_id = worker_id
+        self.matcher = matcher
+        self.parser = SyslogParser()
+        self.packets = 0
+        self.matched = 0
+        self.matched_by_tag = {}
+        self.decode_errors = 0
+        self.sampler = LogSampler(log_rate)
+        self.drain_sizes = Histogram(DRAIN_BUCKETS)
+        # One receive buffer reused for every datagram of this worker
+        self._buffer = bytearray(MAX_DATAGRAM_SIZE)
+        self._view = memoryview(self._buffer)
+
+    def start(self, loop):
+        # asyncio's DatagramProtocol transport does a single recvfrom() per readiness
+        # event; reading the fd ourselves lets us drain up to BATCH_SIZE datagrams
+        # per wakeup, which is what recvmmsg() would give us in C.
+        loop.add_reader(self.sock.fileno(), self._drain)
 
-    async with aiohttp.ClientSession() as session:
+    def stop(self, loop):
+        loop.remove_reader(self.sock.fileno())
+
+    def close(self):
+        """Wait for the queued state cache writes; call before closing the cache."""
+        if self._state_writer is not None:
+            self._state_writer.shutdown(wait=True)
+
+    def _drain(self):
+        recvfrom_into = self.sock.recvfrom_into
+        view = self._view
+        packets = self.packets
+        for _ in range(BATCH_SIZE):
+            try:
+                nbytes, addr = recvfrom_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            self.packets += 1
+            self.handle_datagram(view[:nbytes], addr)
+        self.drain_sizes.observe(self.packets - packets)
+
+    def handle_datagram(self, data, addr):
+        # Match on the raw bytes first; only the few interesting datagrams get decoded
+        match = self.matcher.search(data)
+        if match is None:
+            return
+        # The receive buffer is reused, so a match gets its own copy for the parsed record
+        buffer = bytes(data)
+        try:
+            syslog_message = buffer.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            self.decode_errors += 1
+            return
+        self.matched += 1
+        sender_ip = addr[0]  # Extract the sender's IP address
+        tag = match.group(0)[1:].decode("ascii")
+        self.matched_by_tag[tag] = self.matched_by_tag.get(tag, 0) + 1
+        if self.sampler.allow():
+            log.info("%s | Client IP: %s", syslog_message, sender_ip)
+        record = self.parser.parse(buffer)
+        # One `conf t` session (or an HA pair repeating it) becomes a single event
+        opened = self.coalescer.add(sender_ip, tag, syslog_message, record)
+        if opened and tag == CONFIG_CHANGE_TAG:
+            # When the burst starts rather than when it is emitted, so the agent stops reading the old state
+            self.invalidate_state(sender_ip, record.field("hostname") if record is not None else None)
+
+    def invalidate_state(self, sender_ip, hostname=None):
+        """Drop the agent's cached state of a device, without waiting for the SQLite write."""
+        if self._state_writer is not None:
+            self._state_writer.submit(self._invalidate_state, sender_ip, hostname)
+
+    def _invalidate_state(self, sender_ip, hostname):
+        try:
+            self.state_cache.invalidate(sender_ip, hostname)
+        except Exception as e:
+            log.warning("[worker %d] device state invalidation of %s failed: %r", self.worker_id, sender_ip, e)
+
+    async def report_stats(self, interval=REPORT_INTERVAL):
+        """Periodically print packets/sec and the kernel drop counter so the worker count can be sized."""
+        last_packets = self.packets
+        last_drops = read_socket_drops(self.sock) or 0
+        last_time = time.monotonic()
         while True:
-            data, addr = await loop.sock_recvfrom(sock, 4096)
-            syslog_message = data.decode('utf-8').strip()
-            if pattern.search(syslog_message):
-                sender_ip = addr[0]  # Extract the sender's IP address
-                print(syslog_message, f'| Client IP: {sender_ip}')
-                # asyncio.create_task(send_event(syslog_message, sender_ip, session))
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            drops = read_socket_drops(self.sock)
+            rate = (self.packets - last_packets) / (now - last_time)
+            drop_info = "n/a" if drops is None else f"+{drops - last_drops} (total {drops})"
+            log.info("[worker %d] %.1f pkt/s, packets %d, matched %d, decode errors %d, malformed %d, drops %s, "
+                     "lines not logged %d", self.worker_id, rate, self.packets, self.matched, self.decode_errors,
+                     self.parser.malformed, drop_info, self.sampler.suppressed)
+            log.info("[worker %d] open bursts %d, %s", self.worker_id, len(self.coalescer.bursts), self.coalescer.stats)
+            if self.forwarder is not None:
+                log.info("[worker %d] webhook queue %d, %s", self.worker_id, self.forwarder.queue.qsize(),
+                         self.forwarder.stats)
+            if self.state_cache is not None:
+                log.info("[worker %d] device state invalidations %d", self.worker_id,
+                         self.state_cache.stats["invalidations"])
+            last_packets, last_time = self.packets, now
+            last_drops = drops if drops is not None else last_drops
 
 
-if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
+def worker_metrics(worker: SyslogWorker, worker_id=0):
+    """The worker's counters as a Prometheus registry; nothing is computed until a scrape."""
+    registry = Registry(dict(worker=worker_id))
+    registry.counter("syslog_packets_received_total", "Datagrams read from the socket.", lambda: worker.packets)
+    registry.counter("syslog_matched_total", "Datagrams carrying a forwarded mnemonic, by tag.",
+                     lambda: [(dict(tag=tag), count) for tag, count in sorted(worker.matched_by_tag.items())])
+    registry.counter("syslog_decode_errors_total", "Matching datagrams that were not valid UTF-8.",
+                     lambda: worker.decode_errors)
+    registry.counter("syslog_malformed_total", "Matching datagrams the parser could not split into fields.",
+                     lambda: worker.parser.malformed)
+    registry.counter("syslog_kernel_drops_total", "Datagrams dropped by the kernel because the socket buffer was full.",
+                     lambda: read_socket_drops(worker.sock))
+    registry.counter("syslog_log_suppressed_total", "Matched lines not logged because of the log rate limit.",
+                     lambda: worker.sampler.suppressed)
+    registry.histogram("syslog_drain_batch_size", "Datagrams read per event loop wakeup.", worker.drain_sizes)
+    registry.counter("syslog_coalesced_events_total", "Matched lines added to the coalescer.",
+                     lambda: worker.coalescer.stats["events"])
+    registry.counter("syslog_emitted_events_total", "Bursts emitted by the coalescer.",
+                     lambda: worker.coalescer.stats["emitted"])
+    registry.gauge("syslog_open_bursts", "Bursts waiting for their device to go quiet.",
+                   lambda: len(worker.coalescer.bursts))
+    if worker.state_cache is not None:
+        registry.counter("syslog_state_invalidations_total", "Device state cache invalidations.",
+                         lambda: worker.state_cache.stats["invalidations"])
+    forwarder = worker.forwarder
+    if forwarder is not None:
+        registry.gauge("webhook_queue_depth", "Events waiting to be posted.", forwarder.queue.qsize)
+        registry.counter("webhook_events_total", "Events by what became of them.",
+                         lambda: [(dict(outcome=outcome), forwarder.stats[outcome])
+                                  for outcome in ("forwarded", "dropped", "spilled", "replayed", "failed")])
+        registry.counter("webhook_batches_total", "Batches posted, not counting retries.",
+                         lambda: forwarder.stats["batches"])
+        registry.counter("webhook_retries_total", "POSTs retried.", lambda: forwarder.stats["retries"])
+        registry.histogram("webhook_post_seconds", "Seconds per POST that got a response.", forwarder.post_seconds)
+        registry.histogram("webhook_batch_size", "Events per posted batch.", forwarder.batch_sizes)
+    return registry
+
+
+async def start_metrics_server(registry: Registry, host=METRICS_IP, port=METRICS_PORT):
+    """Serve registry on http://host:port/metrics and return the runner (call runner.cleanup() to stop)."""
+    async def metrics(request):
+        return web.Response(body=registry.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def listen_for_syslog_messages(loop, listen_ip=LISTEN_IP, listen_port=LISTEN_PORT, worker_id=0,
+                                     mnemonics=MNEMONICS, webhook_url=None, overflow_policy=OVERFLOW_POLICY,
+                                     journal_dir=JOURNAL_DIR, quiet_period=QUIET_PERIOD, max_wait=MAX_WAIT,
+                                     state_path=STATE_PATH, metrics_ip=METRICS_IP, metrics_port=METRICS_PORT,
+                                     log_rate=LOG_RATE):
+    """Listen for incoming syslog messages and forward them along with the sender's IP address."""
+    sock = create_listen_socket(listen_ip, listen_port)
+    rcvbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    log.info("[worker %d] pid %d listening on %s:%d (SO_RCVBUF %d)", worker_id, os.getpid(), listen_ip, listen_port,
+             rcvbuf)
+
+    async with create_session() as session:
+        forwarder = None
+        if webhook_url:
+            # Each worker owns its journal; a restarted worker replays what it left behind
+            journal_dir = os.path.join(journal_dir, f"worker-{worker_id}")
+            forwarder = WebhookForwarder(session, webhook_url, overflow_policy=overflow_policy, journal_dir=journal_dir)
+            forwarder.start()
+            deliver = forwarder.submit
+        else:
+            def deliver(event):
+                log.info("%s x%d from %s", event["tag"], event["count"], event["ip_address"])
+
+        def emit(event):
+            if event["tag"] == CONFIG_CHANGE_TAG:
+                # Again once the burst is over: a snapshot taken while it went on may already be stale
+                worker.invalidate_state(event["ip_address"], event.get("hostname"))
+            deliver(event)
+
+        coalescer = EventCoalescer(emit, quiet_period, max_wait)
+        coalescer_task = asyncio.create_task(coalescer.run())
+        state_cache = DeviceStateCache(state_path) if state_path else None
+        worker = SyslogWorker(sock, coalescer, forwarder, worker_id, compile_matcher(mnemonics), state_cache, log_rate)
+        worker.start(loop)
+        metrics = None
+        if metrics_port:
+            port = metrics_port + worker_id
+            metrics = await start_metrics_server(worker_metrics(worker, worker_id), metrics_ip, port)
+            log.info("[worker %d] metrics on http://%s:%d/metrics", worker_id, metrics_ip, port)
+        try:
+            await worker.report_stats()
+        finally:
+            if metrics is not None:
+                await metrics.cleanup()
+            worker.stop(loop)
+            sock.close()
+            coalescer_task.cancel()
+            await asyncio.gather(coalescer_task, return_exceptions=True)
+            coalescer.flush()
+            if forwarder is not None:
+                await forwarder.stop()
+            worker.close()
+            if state_cache is not None:
+                state_cache.close()
+
+
+def run_worker(worker_id, args):
+    """Entry point of a worker process: run one event loop with its own socket until SIGINT or SIGTERM."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    webhook_url = args.webhook_url if args.forward else None
+    logging_thread = start_logging()
+    main = loop.create_task(listen_for_syslog_messages(
+        loop, args.listen_ip, args.listen_port, worker_id, args.mnemonics, webhook_url, args.overflow_policy,
+        args.journal_dir, args.quiet_period, args.max_wait, args.state_cache, args.metrics_ip, args.metrics_port,
+        args.log_rate))
+
+    def shut_down():
+        # Cancelling the task runs its cleanup: open bursts are flushed and the forwarder
+        # spills what it could not post to the journal. A second signal must not cut that short.
+        for signum in SHUTDOWN_SIGNALS:
+            loop.add_signal_handler(signum, lambda: None)
+        main.cancel()
+
+    for signum in SHUTDOWN_SIGNALS:
+        loop.add_signal_handler(signum, shut_down)
     try:
-        print(f"Listening for syslog messages on {LISTEN_IP}:{LISTEN_PORT}")
-        loop.run_until_complete(listen_for_syslog_messages(loop))
-    except KeyboardInterrupt:
+        loop.run_until_complete(main)
+    except asyncio.CancelledError:
         pass
     finally:
         loop.close()
+        # Closing the loop restored the default handlers; the log still has to be written out
+        for signum in SHUTDOWN_SIGNALS:
+            signal.signal(signum, signal.SIG_IGN)
+        logging_thread.stop()
+
+
+def run_workers(args):
+    """Run args.workers worker processes; SIGINT and SIGTERM are passed on to them and waited for."""
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(i, args), daemon=True)
+        for i in range(args.workers)
+    ]
+    for process in workers:
+        process.start()
+
+    # Installed after the workers started, so they do not inherit it
+    def pass_on(signum, frame):
+        for process in workers:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    for signum in SHUTDOWN_SIGNALS:
+        signal.signal(signum, pass_on)
+    for process in workers:
+        process.join()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Listen for Cisco syslog messages and forward configuration changes.")
+    parser.add_argument("--listen-ip", default=LISTEN_IP)
+    parser.add_argument("--listen-port", type=int, default=LISTEN_PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Number of processes sharing the port through SO_REUSEPORT.")
+    parser.add_argument("--mnemonic", action="append", dest="mnemonics",
+                        help="Mnemonic to forward, e.g. SYS-5-CONFIG_I. Repeat for more; defaults to MNEMONICS.")
+    parser.add_argument("--webhook-url", default=WEBHOOK_URL)
+    parser.add_argument("--forward", action="store_true", default=FORWARD_EVENTS,
+                        help="Forward matched events to --webhook-url in batches.")
+    parser.add_argument("--overflow-policy", choices=OVERFLOW_POLICIES, default=OVERFLOW_POLICY,
+                        help="What to do with new events when the webhook queue is full.")
+    parser.add_argument("--journal-dir", default=JOURNAL_DIR,
+                        help="Where the spill policy journals events the webhook could not take.")
+    parser.add_argument("--quiet-period", type=float, default=QUIET_PERIOD,
+                        help="Seconds a device must be quiet before its burst of events is emitted.")
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT,
+                        help="Emit a burst at the latest this many seconds after its first event.")
+    parser.add_argument("--state-cache", default=STATE_PATH,
+                        help=f"Device state cache to invalidate on {CONFIG_CHANGE_TAG} (which must be among the "
+                             f"mnemonics); pass an empty string to turn it off.")
+    parser.add_argument("--metrics-ip", default=METRICS_IP)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Worker N serves Prometheus metrics on this port + N at /metrics; 0 turns them off.")
+    parser.add_argument("--log-rate", type=int, default=LOG_RATE,
+                        help="Matched lines each worker logs per second; the rest are counted. 0 logs none.")
+    args = parser.parse_args()
+    args.mnemonics = args.mnemonics or MNEMONICS
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"Listening for syslog messages on {args.listen_ip}:{args.listen_port} with {args.workers} worker(s)")
+    if args.workers <= 1:
+        run_worker(0, args)
+    else:
+        run_workers(args)
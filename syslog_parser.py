@@ -0,0 +1,121 @@
+import re
+
+# One pass over the raw bytes handles RFC 5424, RFC 3164 and the bare Cisco format
+# (`<189>12: *Mar  1 00:01:02.345: %SYS-5-CONFIG_I: ...`, optionally with a
+# `logging origin-id` hostname after the sequence number).
+SYSLOG_PATTERN = re.compile(
+    rb"<(?P<pri>\d{1,3})>"
+    rb"(?:"
+    rb"1 (?P<ts5424>\S+) (?P<host5424>\S+) \S+ \S+ \S+ (?:-|(?:\[(?:[^\]\\]|\\.)*\])+) ?"
+    rb"|"
+    rb"(?:(?P<ts3164>[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d) (?P<host3164>\S+):? )?"
+    rb"(?:\d+: )?"
+    rb"(?:(?P<hostc>[A-Za-z][\w.-]*): )?"
+    rb"(?:[*.]?(?P<tsc>[A-Z][a-z]{2} +\d+ (?:\d{4} )?\d\d:\d\d:\d\d(?:\.\d+)?(?: [A-Za-z]{3,4})?): )?"
+    rb")"
+    rb"%(?P<tag>(?P<facility>[A-Z0-9_]+(?:-[A-Z0-9_]+)*?)-(?P<severity>[0-7])-(?P<mnemonic>[A-Z0-9_]+))"
+    rb": ?(?P<message>.*)",
+    re.DOTALL,
+)
+
+# "Configured from console by admin on vty0 (10.0.0.5)" / "Configured from memory by console"
+CONFIG_I_PATTERN = re.compile(
+    rb"Configured from (?P<source>\S+) by (?P<user>\S+)(?: on (?P<line>\S+))?(?: \((?P<peer>[^)]+)\))?"
+)
+
+WHITESPACE = b" \t\r\n"
+
+# Group numbers, looked up once instead of by name on every match
+_G = SYSLOG_PATTERN.groupindex
+TIMESTAMP_GROUPS = (_G["ts5424"], _G["ts3164"], _G["tsc"])
+HOSTNAME_GROUPS = (_G["host5424"], _G["host3164"], _G["hostc"])
+TAG, FACILITY, SEVERITY, MNEMONIC, MESSAGE = (_G[n] for n in ("tag", "facility", "severity", "mnemonic", "message"))
+
+FIELDS = ("timestamp", "hostname", "tag", "facility", "severity", "mnemonic", "message", "user", "line", "peer")
+
+
+class SyslogRecord:
+    """A parsed syslog message: the PRI plus (start, end) offsets of each field into the original buffer.
+
+    Nothing is copied or decoded until a field is read.
+    """
+
+    __slots__ = ("buffer", "pri") + FIELDS
+
+    def __init__(self, buffer, pri):
+        self.buffer = buffer
+        self.pri = pri
+
+    def field(self, name):
+        span = getattr(self, name)
+        if span is None:
+            return None
+        return self.buffer[span[0]:span[1]].decode("utf-8", "replace")
+
+    @property
+    def syslog_facility(self):
+        return self.pri >> 3
+
+    @property
+    def syslog_severity(self):
+        return self.pri & 7
+
+    def to_dict(self):
+        """The record as the JSON payload sent to the webhook."""
+        payload = {name: self.field(name) for name in FIELDS}
+        payload["severity"] = int(payload["severity"])
+        payload["pri"] = self.pri
+        payload["syslog_facility"] = self.syslog_facility
+        payload["syslog_severity"] = self.syslog_severity
+        return payload
+
+
+class SyslogParser:
+    """Parse raw syslog datagrams into SyslogRecords and count the ones that do not parse."""
+
+    def __init__(self):
+        self.parsed = 0
+        self.malformed = 0
+
+    def parse(self, buffer):
+        """Return a SyslogRecord for `buffer` (bytes), or None if it is malformed."""
+        match = SYSLOG_PATTERN.match(buffer)
+        pri = int(match.group("pri")) if match is not None else 999
+        if pri > 191:
+            self.malformed += 1
+            return None
+        span = match.span
+        record = SyslogRecord(buffer, pri)
+        record.timestamp = _first_span(span, TIMESTAMP_GROUPS)
+        record.hostname = _first_span(span, HOSTNAME_GROUPS)
+        record.tag = span(TAG)
+        record.facility = span(FACILITY)
+        record.severity = span(SEVERITY)
+        record.mnemonic = span(MNEMONIC)
+        start, end = span(MESSAGE)
+        # Trailing newline/padding is trimmed by moving the offset, not by copying
+        while end > start and buffer[end - 1] in WHITESPACE:
+            end -= 1
+        record.message = (start, end)
+        record.user = record.line = record.peer = None
+        if buffer[record.mnemonic[0]:record.mnemonic[1]] == b"CONFIG_I":
+            config = CONFIG_I_PATTERN.match(buffer, *record.message)
+            if config is not None:
+                record.user = config.span("user")
+                record.line = _span(config, "line")
+                record.peer = _span(config, "peer")
+        self.parsed += 1
+        return record
+
+
+def _first_span(span, groups):
+    for group in groups:
+        result = span(group)
+        if result[0] >= 0:
+            return result
+    return None
+
+
+def _span(match, group):
+    start, end = match.span(group)
+    return None if start < 0 else (start, end)
@@ -1,35 +1,54 @@
-from langchain_community.llms import Ollama
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
-from langchain_community.document_loaders import TextLoader
-from langchain_community.document_loaders import UnstructuredMarkdownLoader
-import sys
+import hashlib
+import time
 import streamlit as st
 from PIL import Image
+from module_utils.cli_chunker import metadata_filter
+from module_utils.index_cache import build_index, embedding_model_name
+from module_utils.embedding_cache import CachedEmbeddings
+from module_utils.llm_tasks import CHUNK_SIZE, CHUNK_OVERLAP, PROVIDERS, TaskError, provider_for, stream_text
+from module_utils.streaming_loader import iter_documents, loader_name
 
+# Indexes of uploaded documents kept in memory, shared by all sessions; the least
+# recently used one is dropped first
+INDEX_CACHE_ENTRIES = 8
 
-def chat(input):
-    return chain.invoke({'input': f'{input}'})
 
+# Streamlit reruns this script on every interaction; clients and indexes live across reruns
+@st.cache_resource
+def llm_client(model, temperature):
+    return PROVIDERS[provider_for(model)]['llm'](model, temperature)
 
-def document_from_file(document, p):
-    if document.endswith('.md'):
-        loader = UnstructuredMarkdownLoader(document)
-    else:
-        loader = TextLoader(document)
 
-    docs = loader.load()
+@st.cache_resource
+def embeddings_client(provider):
+    embeddings = PROVIDERS[provider]['embeddings']()
+    # Shares the on-disk cache with the redhat_one_demo module
+    return CachedEmbeddings(embeddings, embedding_model_name(embeddings))
 
-    text_splitter = RecursiveCharacterTextSplitter()
-    documents = text_splitter.split_documents(docs)
-    vector = FAISS.from_documents(documents, embeddings)
+
+@st.cache_resource(max_entries=INDEX_CACHE_ENTRIES, show_spinner='Indexing the document...')
+def document_index(digest, loader, embedding_model, _name, _data, _embeddings):
+    """The FAISS index of an upload, keyed by the hash of its bytes (the _ arguments are not hashed)."""
+    vector, _ = build_index(iter_documents(_name, CHUNK_SIZE, CHUNK_OVERLAP, _data), _embeddings)
+    return vector
+
+
+# Answers are streamed into the page as they are generated; timing gets the first-token
+# and total latency of the request
+def chat(input, timing, started):
+    return stream_text(chain.stream({'input': f'{input}'}), timing, started)
+
+
+def document_from_file(uploaded_file, p, timing, started):
+    data = uploaded_file.getvalue()
+    vector = document_index(hashlib.sha256(data).hexdigest(), loader_name(uploaded_file.name),
+                            embeddings.model, uploaded_file.name, data, embeddings)
+    stats = embeddings.stats()
+    st.caption(f"Embedding cache: {stats['hit_ratio']:.0%} hits, {stats['seconds_saved']}s of embedding saved")
 
     prompt = ChatPromptTemplate.from_template('''Answer the following question based only on the provided context:
 
@@ -41,14 +60,18 @@ def document_from_file(document, p):
 
     document_chain = create_stuff_documents_chain(llm, prompt)
 
-    retriever = vector.as_retriever()
+    search_kwargs = {}
+    search_filter = metadata_filter(vector, p)
+    if search_filter:
+        search_kwargs.update(filter=search_filter, fetch_k=vector.index.ntotal)
+    retriever = vector.as_retriever(search_kwargs=search_kwargs)
     retrieval_chain = create_retrieval_chain(retriever, document_chain)
 
-    response = retrieval_chain.invoke(
+    response = retrieval_chain.stream(
         {
             'input': p}
         )
-    return response['answer']
+    return stream_text(response, timing, started, key='answer')
 
 
 image = Image.open('images/Asset-Red_Hat-Logo_page-General-This-RGB.png')
@@ -66,14 +89,12 @@ llm_chain = st.radio(
         horizontal=True
     )
 
-if llm_chain in ['llama-pro', 'llama2']:
-    llm = Ollama(model=llm_chain, temperature=t_value)
-    embeddings = OllamaEmbeddings()
-elif llm_chain in ['gpt-3.5-turbo', 'gpt-4']:
-    llm = ChatOpenAI(model=llm_chain, temperature=t_value)
-    embeddings = OpenAIEmbeddings()
-else:
-    sys.exit('Error: Model not found!')
+try:
+    llm = llm_client(llm_chain, t_value)
+    embeddings = embeddings_client(provider_for(llm_chain))
+except TaskError as e:
+    st.error(str(e))
+    st.stop()
 
 prompt = ChatPromptTemplate.from_messages([
     ('system', '''
@@ -97,10 +118,12 @@ uploaded_file = st.file_uploader('Choose a file')
 user_prompt = st.text_area(label='Prompt')
 
 if user_prompt:
+    timing = {}
+    started = time.time()
     with st.spinner('Working on it...'):
         if uploaded_file is not None:
-            output = document_from_file(uploaded_file.name, user_prompt)
-            st.write(output)
+            output = document_from_file(uploaded_file, user_prompt, timing, started)
         else:
-            output = chat(user_prompt)
-            st.write(output)
+            output = chat(user_prompt, timing, started)
+        st.write_stream(output)
+    st.caption(f"First token after {timing['first_token']:.2f}s, complete after {timing['total']:.2f}s")
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+from aiohttp import ClientSession
+
+from event_journal import EventJournal
+from module_utils.metrics import Histogram
+
+# Events waiting to be posted. When it is full OVERFLOW_POLICY decides what happens.
+QUEUE_SIZE = 10000
+
+# A batch is posted as one JSON array once it holds BATCH_SIZE events or
+# BATCH_INTERVAL seconds have passed since its first event, whichever comes first
+BATCH_SIZE = 100
+BATCH_INTERVAL = 1.0
+
+# Concurrent POSTs, which is also the connection limit of the session
+POOL_SIZE = 4
+KEEPALIVE_TIMEOUT = 30
+
+# Retries use exponential backoff with full jitter: sleep uniform(0, min(cap, base * 2 ** attempt))
+MAX_RETRIES = 5
+RETRY_BASE = 0.5
+RETRY_CAP = 30.0
+REQUEST_TIMEOUT = 10
+
+# "drop-oldest" discards the oldest queued event, "spill" appends the new event to the
+# on-disk journal in JOURNAL_DIR. With "spill", batches that still fail after all
+# retries are journaled as well, so nothing is lost while the webhook is down.
+OVERFLOW_POLICIES = ("drop-oldest", "spill")
+OVERFLOW_POLICY = "drop-oldest"
+JOURNAL_DIR = "syslog_journal"
+
+# Events/sec replayed from the journal once the webhook accepts posts again, so a
+# long outage does not turn into a thundering herd when the endpoint comes back
+REPLAY_RATE = 200
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# What post_batch() made of a batch. A rejected batch (any other 4xx or 5xx) would be
+# rejected again, so it is counted as failed and never journaled or replayed.
+FORWARDED, REJECTED, FAILED = "forwarded", "rejected", "failed"
+
+# Histogram buckets of the events per POST
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+# A child of the listener's logger, so its messages go through the same queue and never block the loop
+log = logging.getLogger("syslog_listener.webhook_forwarder")
+
+
+def create_session(pool_size=POOL_SIZE, keepalive_timeout=KEEPALIVE_TIMEOUT):
+    """Create the ClientSession used for forwarding, with a capped keep-alive connection pool."""
+    connector = aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size, keepalive_timeout=keepalive_timeout)
+    return ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
+
+class WebhookForwarder:
+    """Queue events and post them to the webhook in batches, with bounded memory and retries."""
+
+    def __init__(self, session: ClientSession, url, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 batch_interval=BATCH_INTERVAL, concurrency=POOL_SIZE, max_retries=MAX_RETRIES,
+                 overflow_policy=OVERFLOW_POLICY, journal_dir=JOURNAL_DIR, replay_rate=REPLAY_RATE):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}, got {overflow_policy!r}")
+        self.session = session
+        self.url = url
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.overflow_policy = overflow_policy
+        self.replay_rate = replay_rate
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.journal = EventJournal(journal_dir) if overflow_policy == "spill" else None
+        # Cleared when a batch fails for good, set again by the next successful post
+        self.healthy = True
+        self._senders = []
+        self.stats = dict(queued=0, forwarded=0, batches=0, retries=0, dropped=0, spilled=0, replayed=0, failed=0)
+        # Seconds per POST attempt and events per batch, for the listener's /metrics
+        self.post_seconds = Histogram()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+
+    def start(self):
+        self._senders = [asyncio.create_task(self._sender()) for _ in range(self.concurrency)]
+        if self.journal is not None:
+            self._senders.append(asyncio.create_task(self._replay_journal()))
+
+    async def stop(self, drain_timeout=5.0):
+        """Give queued events a chance to go out, then cancel the senders."""
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._senders:
+            task.cancel()
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        if self.journal is not None:
+            # Whatever is still queued survives the restart in the journal
+            while not self.queue.empty():
+                self._spill([self.queue.get_nowait()])
+                self.queue.task_done()
+            self.journal.close()
+
+    def submit(self, event):
+        """Queue one event without blocking the receive path. Returns False if it was not queued."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            if self.overflow_policy == "spill":
+                self._spill([event])
+                return False
+            # drop-oldest: the newest state of the network is the one worth keeping
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.stats["dropped"] += 1
+            self.queue.put_nowait(event)
+        self.stats["queued"] += 1
+        return True
+
+    async def _next_batch(self, batch):
+        """Fill batch (in place, so a cancelled sender still knows what it holds) from the queue."""
+        batch.append(await self.queue.get())
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _sender(self):
+        while True:
+            batch = []
+            try:
+                await self._next_batch(batch)
+                outcome = await self.post_batch(batch)
+                if outcome == FORWARDED:
+                    self.stats["forwarded"] += len(batch)
+                elif outcome == FAILED and self.journal is not None:
+                    self._spill(batch)
+                else:
+                    self.stats["failed"] += len(batch)
+            except asyncio.CancelledError:
+                # stop() gave up waiting: the batch is off the queue, so its drain cannot see it
+                if self.journal is not None:
+                    self._spill(batch)
+                else:
+                    self.stats["failed"] += len(batch)
+                raise
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def post_batch(self, batch):
+        """POST one batch as a JSON array, retrying with jittered backoff. Returns FORWARDED, REJECTED or FAILED."""
+        self.stats["batches"] += 1
+        self.batch_sizes.observe(len(batch))
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                async with self.session.post(self.url, json=batch) as response:
+                    self.post_seconds.observe(time.monotonic() - started)
+                    if response.status < 300:
+                        self.healthy = True
+                        return FORWARDED
+                    if response.status not in RETRY_STATUSES:
+                        log.warning("Webhook rejected a batch of %d events. Response status: %d", len(batch),
+                                    response.status)
+                        return REJECTED
+                    error = f"status {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            if attempt == self.max_retries:
+                log.warning("Error sending a batch of %d events after %d attempts: %s", len(batch), attempt + 1, error)
+                self.healthy = False
+                return FAILED
+            self.stats["retries"] += 1
+            await asyncio.sleep(random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** attempt)))
+        return FAILED
+
+    def _spill(self, events):
+        for event in events:
+            self.journal.append(event)
+        self.stats["spilled"] += len(events)
+
+    async def _replay_journal(self, interval=1.0):
+        """Drain the journal at replay_rate events/sec whenever the webhook is healthy."""
+        while True:
+            self.journal.sync(force=False)
+            if not self.healthy or not self.journal.pending:
+                await asyncio.sleep(interval)
+                if not self.healthy and self.journal.pending:
+                    # Probe the endpoint with one journaled batch so recovery is noticed
+                    # even when no live traffic is flowing
+                    self.healthy = True
+                continue
+            events, position = self.journal.read(min(self.batch_size, max(1, int(self.replay_rate))))
+            if not events:
+                await asyncio.sleep(interval)
+                continue
+            started = time.monotonic()
+            outcome = await self.post_batch(events)
+            if outcome == FAILED:
+                # Left in the journal; healthy is cleared, so the next pass waits and probes again
+                await asyncio.sleep(interval)
+                continue
+            self.journal.commit(position, len(events))
+            if outcome == REJECTED:
+                # A batch the webhook refuses would block the journal forever
+                self.stats["failed"] += len(events)
+                await asyncio.sleep(interval)
+                continue
+            self.stats["replayed"] += len(events)
+            await asyncio.sleep(max(0.0, len(events) / self.replay_rate - (time.monotonic() - started)))